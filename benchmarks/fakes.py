@@ -0,0 +1,180 @@
+from types import SimpleNamespace
+from typing import Optional
+import asyncio
+import hashlib
+import numpy as np
+
+
+def fake_embedding(text: str, dim: int) -> np.ndarray:
+    """deterministic unit vector derived from the text"""
+    seed = int.from_bytes(hashlib.sha256(text.encode()).digest()[:8], "big")
+    vector = np.random.default_rng(seed).standard_normal(dim).astype(np.float32)
+    return vector / np.linalg.norm(vector)
+
+
+class FakeEmbeddings:
+    """stand-in for `AsyncOpenAI().embeddings` with a configurable latency"""
+
+    def __init__(self, dim: int, latency_ms: float, per_input_ms: float):
+        self.dim = dim
+        self.latency = latency_ms / 1000
+        self.per_input = per_input_ms / 1000
+        self.calls = 0
+        self.inputs = 0
+
+    async def create(self, input, model, **kwargs):
+        texts = [input] if isinstance(input, str) else list(input)
+        dim = kwargs.get("dimensions") or self.dim
+        self.calls += 1
+        self.inputs += len(texts)
+        await asyncio.sleep(self.latency + self.per_input * len(texts))
+        return SimpleNamespace(
+            data=[
+                SimpleNamespace(index=i, embedding=fake_embedding(text, dim).tolist())
+                for i, text in enumerate(texts)
+            ],
+            usage=SimpleNamespace(
+                prompt_tokens=sum(len(text) // 4 + 1 for text in texts),
+                total_tokens=sum(len(text) // 4 + 1 for text in texts),
+            ),
+        )
+
+
+class FakeAsyncOpenAI:
+    """stand-in for `openai.AsyncOpenAI`"""
+
+    def __init__(
+        self,
+        dim: int = 1536,
+        latency_ms: float = 150.0,
+        per_input_ms: float = 0.5,
+        **kwargs,
+    ):
+        self.embeddings = FakeEmbeddings(dim, latency_ms, per_input_ms)
+
+    async def close(self) -> None:
+        pass
+
+
+class FakeAsyncMilvusClient:
+    """
+    Stand-in for `pymilvus.AsyncMilvusClient` serving one in-memory collection
+    of random entities of a single tenant, with brute-force cosine search and a
+    configurable latency. Search filters are ignored.
+    """
+
+    def __init__(
+        self,
+        uri: Optional[str] = None,
+        collection_name: str = "data_dictionary_columns",
+        num_entities: int = 2000,
+        dim: int = 1536,
+        latency_ms: float = 5.0,
+        tenant: str = "group_iii",
+        channel_concurrency: int = 0,
+        **kwargs,
+    ):
+        self.collection_name = collection_name
+        self.tenant = tenant
+        self.latency = latency_ms / 1000
+        # calls served at once by the client connection, unlimited if 0
+        self.channel = (
+            asyncio.Semaphore(channel_concurrency) if channel_concurrency else None
+        )
+        self.ids = np.arange(num_entities, dtype=np.int64)
+        self.texts = [
+            f"\n  name: Column{i}\n  type: string\n  description: column {i}\n"
+            f"  from table: group_iii.silver.table_{i % 100}\n"
+            for i in range(num_entities)
+        ]
+        rng = np.random.default_rng(0)
+        vectors = rng.standard_normal((num_entities, dim)).astype(np.float32)
+        self.vectors = vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+
+    async def _wait(self) -> None:
+        if self.channel is None:
+            await asyncio.sleep(self.latency)
+            return
+        async with self.channel:
+            await asyncio.sleep(self.latency)
+
+    async def get_server_version(self, **kwargs) -> str:
+        await self._wait()
+        return "fake"
+
+    async def list_collections(self, **kwargs) -> list[str]:
+        await self._wait()
+        return [self.collection_name]
+
+    async def get_collection_stats(self, collection_name: str, **kwargs) -> dict:
+        await self._wait()
+        return {"row_count": len(self.ids)}
+
+    async def describe_collection(self, collection_name: str, **kwargs) -> dict:
+        await self._wait()
+        return {"collection_name": collection_name, "properties": {}}
+
+    async def load_collection(self, collection_name: str, **kwargs) -> None:
+        await self._wait()
+
+    def _entity(self, row: int, output_fields: Optional[list[str]]) -> dict:
+        entity = {"id": int(self.ids[row])}
+        fields = output_fields or ["text"]
+        if "text" in fields:
+            entity["text"] = self.texts[row]
+        if "embeddings" in fields:
+            entity["embeddings"] = self.vectors[row].tolist()
+        if "tenant" in fields:
+            entity["tenant"] = self.tenant
+        if "table_name" in fields:
+            entity["table_name"] = f"group_iii.silver.table_{row % 100}"
+        return entity
+
+    async def get(self, collection_name: str, ids: list[int], **kwargs) -> list[dict]:
+        await self._wait()
+        # every field by default, vector included, like Milvus
+        output_fields = kwargs.get("output_fields") or [
+            "text",
+            "embeddings",
+            "tenant",
+            "table_name",
+        ]
+        return [self._entity(i, output_fields) for i in ids if 0 <= i < len(self.ids)]
+
+    async def query(
+        self, collection_name: str, filter: str = "", limit: int = 16384, **kwargs
+    ) -> list[dict]:
+        await self._wait()
+        start = int(filter.split(">")[1]) + 1 if filter.startswith("id >") else 0
+        rows = range(start, min(start + limit, len(self.ids)))
+        return [self._entity(row, kwargs.get("output_fields")) for row in rows]
+
+    async def search(
+        self, collection_name: str, data: list, limit: int = 10, **kwargs
+    ) -> list[list[dict]]:
+        await self._wait()
+        scores = np.asarray(data, dtype=np.float32) @ self.vectors.T
+        results = []
+        for row_scores in scores:
+            top = np.argpartition(-row_scores, min(limit, len(row_scores) - 1))[:limit]
+            top = top[np.argsort(-row_scores[top])]
+            results.append(
+                [
+                    {
+                        "id": int(self.ids[row]),
+                        "distance": float(row_scores[row]),
+                        "entity": {
+                            field: value
+                            for field, value in self._entity(
+                                row, kwargs.get("output_fields")
+                            ).items()
+                            if field != "id"
+                        },
+                    }
+                    for row in top
+                ]
+            )
+        return results
+
+    async def close(self) -> None:
+        pass
@@ -0,0 +1,266 @@
+from datetime import datetime, timezone
+from functools import partial
+from pathlib import Path
+from typing import Optional
+import argparse
+import asyncio
+import json
+import logging
+import random
+import subprocess
+import time
+
+import httpx
+import numpy as np
+
+from benchmarks.fakes import FakeAsyncMilvusClient, FakeAsyncOpenAI
+from src import startup
+from src.app import app
+from src.config.settings import settings
+from src.services import openai_service, vectordb_service
+
+DEFAULT_RESULTS_DIR = Path(__file__).parent / "results"
+
+
+def current_commit() -> Optional[str]:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            capture_output=True,
+            text=True,
+            check=True,
+        ).stdout.strip()
+    except Exception:
+        return None
+
+
+def make_requests(args) -> dict:
+    """request factories of each benchmarked endpoint"""
+    queries = [f"Column{i} description" for i in range(args.query_pool)]
+    return {
+        "search_doc": lambda: (
+            "POST",
+            "/api/v1/vectordb/search_doc",
+            {
+                "query": random.choice(queries),
+                "tenant": args.tenant,
+                "top_k": args.top_k,
+            },
+        ),
+        "get_entity": lambda: (
+            "POST",
+            "/api/v1/vectordb/get_entity",
+            {"id": random.randrange(args.num_entities), "tenant": args.tenant},
+        ),
+        "get_entities": lambda: (
+            "POST",
+            "/api/v1/vectordb/get_entities",
+            {
+                "ids": random.sample(range(args.num_entities), args.top_k),
+                "tenant": args.tenant,
+            },
+        ),
+        "collections": lambda: ("GET", "/api/v1/vectordb/collections", None),
+    }
+
+
+async def run_level(
+    client: httpx.AsyncClient, make_request, concurrency: int, num_requests: int
+) -> dict:
+    """send `num_requests` requests from `concurrency` concurrent workers"""
+    latencies: list[float] = []
+    errors = 0
+    remaining = num_requests
+
+    async def worker():
+        nonlocal remaining, errors
+        while remaining > 0:
+            remaining -= 1
+            method, url, body = make_request()
+            start = time.perf_counter()
+            try:
+                response = await client.request(method, url, json=body)
+                if response.status_code >= 400:
+                    errors += 1
+            except Exception:
+                errors += 1
+            latencies.append(time.perf_counter() - start)
+
+    start = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - start
+
+    latencies_ms = np.array(latencies) * 1000
+    return {
+        "concurrency": concurrency,
+        "requests": len(latencies),
+        "errors": errors,
+        "throughput_rps": len(latencies) / elapsed,
+        "mean_ms": float(latencies_ms.mean()),
+        "p50_ms": float(np.percentile(latencies_ms, 50)),
+        "p95_ms": float(np.percentile(latencies_ms, 95)),
+        "p99_ms": float(np.percentile(latencies_ms, 99)),
+    }
+
+
+def use_fakes(args) -> None:
+    """make the startup manager create the local stand-ins instead of real clients"""
+    settings.MILVUS_CLIENT_COLLECTION = args.collection
+    settings.MILVUS_POOL_SIZE = args.milvus_pool_size
+    settings.MILVUS_POOL_STRATEGY = args.milvus_pool_strategy
+    if args.snapshot_dir:
+        settings.SNAPSHOT_ENABLED = True
+        settings.SNAPSHOT_DIR = args.snapshot_dir
+    if args.milvus_uri:
+        settings.MILVUS_CLIENT_URL = args.milvus_uri
+    else:
+        startup.AsyncMilvusClient = partial(
+            FakeAsyncMilvusClient,
+            collection_name=args.collection,
+            num_entities=args.num_entities,
+            dim=args.dim,
+            latency_ms=args.milvus_latency_ms,
+            tenant=args.tenant,
+            channel_concurrency=args.milvus_channel_concurrency,
+        )
+    startup.AsyncOpenAI = partial(
+        FakeAsyncOpenAI, dim=args.dim, latency_ms=args.openai_latency_ms
+    )
+
+
+def disable_caches() -> None:
+    openai_service.embedding_cache.max_size = 0
+    vectordb_service.search_cache.max_size = 0
+    vectordb_service.entity_cache.max_size = 0
+    settings.IDENTIFIER_INDEX_ENABLED = False
+
+
+async def run_benchmark(args) -> dict:
+    use_fakes(args)
+    if args.disable_caches:
+        disable_caches()
+    requests = make_requests(args)
+
+    results = []
+    async with app.router.lifespan_context(app):
+        while not startup.startup_manager.warmup_complete:
+            await asyncio.sleep(0.01)
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(
+            transport=transport, base_url="http://benchmark"
+        ) as client:
+            for endpoint in args.endpoints:
+                # warm-up, not measured
+                await run_level(client, requests[endpoint], 4, 20)
+                for concurrency in args.concurrency:
+                    level = await run_level(
+                        client, requests[endpoint], concurrency, args.requests
+                    )
+                    results.append({"endpoint": endpoint, **level})
+                    print_row(results[-1])
+
+    return {
+        "commit": current_commit(),
+        "timestamp": datetime.now(timezone.utc).isoformat(),
+        "config": {
+            key: value for key, value in vars(args).items() if key not in {"output"}
+        },
+        "results": results,
+    }
+
+
+def print_row(row: dict, baseline: Optional[dict] = None) -> None:
+    line = (
+        f"{row['endpoint']:<12} c={row['concurrency']:<4} "
+        f"{row['throughput_rps']:>9.1f} req/s  p50 {row['p50_ms']:>8.2f} ms  "
+        f"p95 {row['p95_ms']:>8.2f} ms  p99 {row['p99_ms']:>8.2f} ms  "
+        f"errors {row['errors']}"
+    )
+    if baseline is not None:
+        line += (
+            f"  | vs baseline: throughput "
+            f"{row['throughput_rps'] / baseline['throughput_rps'] - 1:+.1%}, "
+            f"p99 {row['p99_ms'] / baseline['p99_ms'] - 1:+.1%}"
+        )
+    print(line)
+
+
+def compare(current: dict, baseline_path: str) -> None:
+    """print the results next to the ones of an earlier run"""
+    baseline = json.loads(Path(baseline_path).read_text())
+    rows = {(r["endpoint"], r["concurrency"]): r for r in baseline["results"]}
+    print(f"\ncompared with {baseline_path} (commit {baseline.get('commit')})")
+    for row in current["results"]:
+        print_row(row, rows.get((row["endpoint"], row["concurrency"])))
+
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(
+        description="load test the search API against local stand-ins"
+    )
+    parser.add_argument(
+        "--endpoints",
+        nargs="+",
+        choices=["search_doc", "get_entity", "get_entities", "collections"],
+        default=["search_doc", "get_entity", "collections"],
+    )
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 8, 32, 128])
+    parser.add_argument(
+        "--requests", type=int, default=500, help="requests per concurrency level"
+    )
+    parser.add_argument(
+        "--query-pool", type=int, default=200, help="number of distinct queries"
+    )
+    parser.add_argument("--top-k", type=int, default=3)
+    parser.add_argument("--openai-latency-ms", type=float, default=150.0)
+    parser.add_argument("--milvus-latency-ms", type=float, default=5.0)
+    parser.add_argument(
+        "--milvus-channel-concurrency",
+        type=int,
+        default=0,
+        help="calls served at once by each fake Milvus client, unlimited if 0",
+    )
+    parser.add_argument(
+        "--milvus-pool-size", type=int, default=settings.MILVUS_POOL_SIZE
+    )
+    parser.add_argument(
+        "--milvus-pool-strategy",
+        choices=["round_robin", "least_busy"],
+        default=settings.MILVUS_POOL_STRATEGY,
+    )
+    parser.add_argument("--num-entities", type=int, default=2000)
+    parser.add_argument("--dim", type=int, default=1536)
+    parser.add_argument("--collection", default="data_dictionary_columns")
+    parser.add_argument("--tenant", default="group_iii")
+    parser.add_argument(
+        "--milvus-uri",
+        help="benchmark against this Milvus (server or Milvus Lite file) instead "
+        "of the in-memory fake; the collection must already be fed",
+    )
+    parser.add_argument(
+        "--snapshot-dir",
+        help="serve the searches from a local snapshot exported to this directory",
+    )
+    parser.add_argument("--disable-caches", action="store_true")
+    parser.add_argument("--output", help="JSON results file")
+    parser.add_argument("--compare", help="JSON results of an earlier run")
+    parser.add_argument("--log-level", default="WARNING")
+    return parser
+
+
+if __name__ == "__main__":
+    args = build_parser().parse_args()
+    logging.getLogger().setLevel(args.log_level)
+    report = asyncio.run(run_benchmark(args))
+
+    output = Path(
+        args.output
+        or DEFAULT_RESULTS_DIR
+        / f"{report['commit'] or 'local'}-{int(time.time())}.json"
+    )
+    output.parent.mkdir(parents=True, exist_ok=True)
+    output.write_text(json.dumps(report, indent=2))
+    print(f"\nresults saved to {output}")
+
+    if args.compare:
+        compare(report, args.compare)
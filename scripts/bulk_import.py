@@ -0,0 +1,225 @@
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from pymilvus import MilvusClient
+from typing import Optional, Union
+import httpx
+import os
+import time
+import numpy as np
+
+
+def column_array(values: list) -> np.ndarray:
+    """the values of one field as the array of its NumPy import file
+
+    Float vectors are float32 rows; float16 and binary vectors are the uint8
+    rows of their bytes; VARCHAR fields are unicode arrays.
+    """
+    first = values[0]
+    if isinstance(first, bytes):
+        return np.frombuffer(b"".join(values), np.uint8).reshape(len(values), -1)
+    if isinstance(first, np.ndarray) and first.dtype == np.float16:
+        return np.stack(values).view(np.uint8)
+    if isinstance(first, (list, np.ndarray)):
+        return np.asarray(values, np.float32)
+    if isinstance(first, int):
+        return np.asarray(values, np.int64)
+    return np.asarray(values, np.str_)
+
+
+class ShardWriter:
+    """
+    Columnar shards of the entities of one collection, in the NumPy layout of
+    Milvus bulk import: one `shard-NNNNN` directory per `shard_size` rows,
+    holding one `<field>.npy` file per field.
+
+    Rows are buffered until a shard is full, so at most one shard is held in
+    memory: the vectors are copied into a block preallocated for a shard, the
+    scalar fields kept as lists. The files of a shard are written under
+    temporary names first, a shard is only listed once all of them are complete.
+    """
+
+    def __init__(self, directory: str, shard_size: int = 50000):
+        self.directory = Path(directory)
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self.shard_size = shard_size
+        self.columns: dict[str, Union[np.ndarray, list]] = {}
+        self.size = 0
+        self.shards: list[list[str]] = []
+
+    def add(self, rows: list[dict]) -> None:
+        while rows:
+            block, rows = (
+                rows[: self.shard_size - self.size],
+                rows[self.shard_size - self.size :],
+            )
+            self._append(block)
+            if self.size == self.shard_size:
+                self._write_shard()
+
+    def _append(self, rows: list[dict]) -> None:
+        for field in rows[0]:
+            values = [row[field] for row in rows]
+            if not isinstance(values[0], (bytes, list, np.ndarray)):
+                self.columns.setdefault(field, []).extend(values)
+                continue
+            vectors = column_array(values)
+            column = self.columns.get(field)
+            if column is None:
+                # reused by the next shards, rows are overwritten in place
+                column = np.empty((self.shard_size, *vectors.shape[1:]), vectors.dtype)
+                self.columns[field] = column
+            column[self.size : self.size + len(rows)] = vectors
+        self.size += len(rows)
+
+    def _write_shard(self) -> None:
+        shard = self.directory / f"shard-{len(self.shards):05d}"
+        shard.mkdir(exist_ok=True)
+        files = []
+        for field, column in self.columns.items():
+            tmp = shard / f"{field}.npy.tmp"
+            with open(tmp, "wb") as f:
+                if isinstance(column, np.ndarray):
+                    np.save(f, column[: self.size])
+                else:
+                    np.save(f, column_array(column))
+                    column.clear()
+            os.replace(tmp, shard / f"{field}.npy")
+            files.append(f"{shard.name}/{field}.npy")
+        self.shards.append(files)
+        print(f"{self.directory}: wrote shard {shard.name} of {self.size} rows")
+        self.size = 0
+
+    def close(self) -> list[list[str]]:
+        """write the last rows, the files of each shard relative to the directory"""
+        if self.size:
+            self._write_shard()
+        return self.shards
+
+
+class BulkImporter:
+    """
+    Client of the import jobs of the Milvus REST API.
+
+    Milvus reads the files of an import from its own object storage, the
+    shards have to be written to a directory of that bucket (e.g. a mounted
+    one) and their paths given relative to the bucket with `remote_prefix`.
+    """
+
+    def __init__(
+        self,
+        uri: str,
+        remote_prefix: str = "",
+        timeout_s: float = 3600.0,
+        poll_s: float = 5.0,
+        http_client: Optional[httpx.Client] = None,
+    ):
+        self.remote_prefix = remote_prefix
+        self.timeout = timeout_s
+        self.poll = poll_s
+        self.http = http_client or httpx.Client(base_url=uri, timeout=30.0)
+
+    def _post(self, path: str, body: dict) -> dict:
+        response = self.http.post(f"/v2/vectordb/jobs/import/{path}", json=body)
+        response.raise_for_status()
+        result = response.json()
+        if result.get("code", 0) != 0:
+            raise RuntimeError(f"Milvus import {path} failed: {result.get('message')}")
+        return result.get("data") or {}
+
+    def run(self, collection_name: str, shards: list[list[str]]) -> None:
+        """import the shards into the collection and wait for the job to complete"""
+        files = [
+            [os.path.join(self.remote_prefix, path) for path in shard]
+            for shard in shards
+        ]
+        job_id = self._post(
+            "create", {"collectionName": collection_name, "files": files}
+        )["jobId"]
+        print(f"{collection_name}: import job {job_id} of {len(files)} shards")
+        deadline = time.monotonic() + self.timeout
+        while True:
+            progress = self._post("get_progress", {"jobId": job_id})
+            state = progress.get("state")
+            if state == "Completed":
+                print(
+                    f"{collection_name}: imported {progress.get('importedRows')} rows"
+                )
+                return
+            if state == "Failed":
+                raise RuntimeError(
+                    f"Milvus import job {job_id} failed: {progress.get('reason')}"
+                )
+            if time.monotonic() > deadline:
+                raise TimeoutError(f"Milvus import job {job_id} did not complete")
+            print(f"{collection_name}: import {state} {progress.get('progress', 0)}%")
+            time.sleep(self.poll)
+
+
+def insert_chunked(
+    client: MilvusClient,
+    collection_name: str,
+    data: list[dict],
+    upsert: bool = False,
+    batch_size: int = 500,
+    max_workers: int = 4,
+) -> None:
+    """insert or upsert the rows in batches, at most `max_workers` at a time
+
+    Small requests keep each call under the gRPC message size limit, the
+    bounded concurrency overlaps their round trips without flooding Milvus.
+    """
+    write = client.upsert if upsert else client.insert
+    batches = [data[i : i + batch_size] for i in range(0, len(data), batch_size)]
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        # list() re-raises the first failed batch
+        list(
+            executor.map(
+                lambda batch: write(collection_name=collection_name, data=batch),
+                batches,
+            )
+        )
+
+
+def add_write_arguments(parser) -> None:
+    """add the options of how the entities are written to Milvus"""
+    parser.add_argument(
+        "--write-mode",
+        choices=["insert", "bulk"],
+        default=os.getenv("WRITE_MODE", "insert"),
+        help="chunked inserts, or NumPy shards loaded with a Milvus bulk import "
+        "(full runs of new tenants only, other runs upsert)",
+    )
+    parser.add_argument(
+        "--insert-batch-size",
+        type=int,
+        default=500,
+        help="rows per insert or upsert request",
+    )
+    parser.add_argument(
+        "--insert-workers",
+        type=int,
+        default=4,
+        help="max number of concurrent insert or upsert requests",
+    )
+    parser.add_argument(
+        "--bulk-dir",
+        default=os.getenv("BULK_IMPORT_DIR", ".bulk_import"),
+        help="directory of the shards, in the object storage bucket of Milvus",
+    )
+    parser.add_argument(
+        "--bulk-remote-prefix",
+        default=os.getenv("BULK_IMPORT_REMOTE_PREFIX", ""),
+        help="path of --bulk-dir in the Milvus bucket",
+    )
+    parser.add_argument(
+        "--bulk-shard-size",
+        type=int,
+        default=50000,
+        help="rows per shard",
+    )
+    parser.add_argument(
+        "--bulk-timeout-s",
+        type=float,
+        default=3600.0,
+        help="max wait for an import job to complete",
+    )
@@ -0,0 +1,198 @@
+from pymilvus import MilvusClient
+from pymilvus import DataType
+from src.config.vector_profiles import VectorProfile, get_vector_profile
+from typing import Optional
+
+
+def make_column_context(inputs: list[dict]) -> list[str]:
+    """parse data dictionaries and format column data
+
+    Args:
+        inputs (list[dict]): _description_
+
+    Returns:
+        str: _description_
+    """
+    res = []
+    for datadict in inputs:
+        for col in datadict.get("columns"):
+            examples = col.get("examples")
+            vals = ",".join([str(x) if x is not None else "None" for x in examples])
+            ctx: str = ""
+            ctx += f"""
+            name: {col["column_name"]}
+            type: {col["column_type"]}
+            description: {col["description"]}
+            number_of_rows: {col["number_of_rows"]}
+            examples: {vals}
+            null_rows: {col["null_rows"]}
+            distinct_rows: {col["distinct_rows"]}
+            from table: {datadict["catalog"]}.{datadict["schema"]}.{datadict["table"]}
+            """
+            res.append(ctx)
+    return res
+
+
+def make_column_keys(inputs: list[dict]) -> list[str]:
+    """stable key `catalog.schema.table.column` of each column, in the same order
+    as `make_column_context`"""
+    return [
+        f"{datadict['catalog']}.{datadict['schema']}.{datadict['table']}.{col['column_name']}"
+        for datadict in inputs
+        for col in datadict.get("columns")
+    ]
+
+
+def make_table_context(inputs: list[dict]) -> list[str]:
+    """format table data
+    Args:
+        inputs (list[dict]): _description_
+
+    Returns:
+        str: _description_
+    """
+    res = []
+    for datadict in inputs:
+        ctx = ""
+        table_name = f"{datadict['catalog']}.{datadict['schema']}.{datadict['table']}"
+        table_description = f"{datadict['description']}"
+        table_analysis = f"{','.join([x for x in datadict['table_analysis']])}"
+        ctx = f"table name:{table_name}\ntable description: {table_description}\ntable analysis:{table_analysis}\n"
+        cols = ",".join([x.get("column_name") for x in datadict.get("columns")])
+        ctx += f"columns available:{cols}"
+        res.append(ctx)
+    return res
+
+
+def make_table_keys(inputs: list[dict]) -> list[str]:
+    """stable key `catalog.schema.table` of each table, in the same order as
+    `make_table_context`"""
+    return [
+        f"{datadict['catalog']}.{datadict['schema']}.{datadict['table']}"
+        for datadict in inputs
+    ]
+
+
+class ContextBuilder:
+    """
+    Turns a data dictionary into the entities of one target collection.
+
+    Subclasses set the collection name and the max length of the text field,
+    and implement `keys` and `contexts`; adding a new kind of context only
+    takes a new builder registered in `BUILDERS`. The vector field is stored
+    and indexed as described by the builder's `profile`.
+    """
+
+    collection_name: str
+    text_max_length: int = 65535
+    table_name_max_length: int = 1024
+    tenant_max_length: int = 256
+    embedding_dim: int = 1536  # should be the same dimension of the embedding model
+
+    def __init__(self, profile: Optional[VectorProfile] = None):
+        self.profile = profile or get_vector_profile(None)
+
+    def keys(self, datadict: dict) -> list[str]:
+        """stable key of each entity of the data dictionary"""
+        raise NotImplementedError
+
+    def contexts(self, datadict: dict) -> list[str]:
+        """text to embed for each entity, in the same order as `keys`"""
+        raise NotImplementedError
+
+    def fields(self, datadict: dict) -> dict:
+        """scalar fields stored with every entity of the data dictionary
+
+        `table_name` lets the API restrict a column search to a few tables.
+        """
+        return {"table_name": make_table_keys(inputs=[datadict])[0]}
+
+    def entities(self, datadict: dict) -> list[tuple[str, str, dict]]:
+        fields = self.fields(datadict)
+        return [
+            (key, text, fields)
+            for key, text in zip(self.keys(datadict), self.contexts(datadict))
+        ]
+
+    def create_schema(self):
+        """the schema of the target collection"""
+        schema = MilvusClient.create_schema(
+            auto_id=False,  # will create ID manually
+            enable_dynamic_field=True,  # allows you to insert entities with flexible, evolving structures
+        )
+        # https://milvus.io/docs/primary-field.md
+        schema.add_field(field_name="id", datatype=DataType.INT64, is_primary=True)
+        schema.add_field(
+            field_name="embeddings",
+            datatype=getattr(DataType, self.profile.vector_type),
+            dim=self.profile.dim(self.embedding_dim),
+        )
+        schema.add_field(
+            field_name="text",
+            datatype=DataType.VARCHAR,
+            max_length=self.text_max_length,
+        )
+        schema.add_field(
+            field_name="table_name",
+            datatype=DataType.VARCHAR,
+            max_length=self.table_name_max_length,
+        )
+        # https://milvus.io/docs/use-partition-key.md
+        # searches filtered on the tenant only touch the partitions holding it
+        schema.add_field(
+            field_name="tenant",
+            datatype=DataType.VARCHAR,
+            max_length=self.tenant_max_length,
+            is_partition_key=True,
+        )
+        return schema
+
+    def prepare_index_params(self):
+        """the index built on the vector field once the collection is loaded"""
+        index_params = MilvusClient.prepare_index_params()
+        index_params.add_index(
+            field_name="embeddings",
+            metric_type=self.profile.metric_type,
+            index_type=self.profile.index_type,
+            index_name="vector_index",
+            params=self.profile.index_params,
+        )
+        # scalar index serving the `table_name in [...]` filters
+        index_params.add_index(
+            field_name="table_name",
+            index_type="INVERTED",
+            index_name="table_name_index",
+        )
+        return index_params
+
+
+class ColumnContextBuilder(ContextBuilder):
+    """one entity per column of each data dictionary"""
+
+    collection_name = "data_dictionary_columns"
+
+    def keys(self, datadict: dict) -> list[str]:
+        return make_column_keys(inputs=[datadict])
+
+    def contexts(self, datadict: dict) -> list[str]:
+        return make_column_context(inputs=[datadict])
+
+
+class TableContextBuilder(ContextBuilder):
+    """one entity per data dictionary"""
+
+    collection_name = "data_dictionary_tables"
+    text_max_length = 8192  # max length of a single table formatted text is ~5000 chars
+
+    def keys(self, datadict: dict) -> list[str]:
+        return make_table_keys(inputs=[datadict])
+
+    def contexts(self, datadict: dict) -> list[str]:
+        return make_table_context(inputs=[datadict])
+
+
+# context builders selectable with `--targets`
+BUILDERS = {
+    "columns": ColumnContextBuilder,
+    "tables": TableContextBuilder,
+}
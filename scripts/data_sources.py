@@ -0,0 +1,128 @@
+from google.cloud import storage
+from google.oauth2.service_account import Credentials
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from itertools import islice
+from pathlib import Path
+from typing import Iterable, Iterator, Optional
+import json
+import os
+
+DEFAULT_BUCKET_NAME = "data-platform-intermediate-outputs"
+DEFAULT_TENANT = "group_iii"
+TENANT_FOLDER_PREFIX = "tenants/{tenant}/silver/data_dict"
+
+
+def iter_bucket_documents(
+    bucket_name: str,
+    folder_prefix: str,
+    max_workers: int = 8,
+    max_in_flight: Optional[int] = None,
+) -> Iterator[dict]:
+    """Streams the data dictionaries of a GCS bucket folder
+
+    Blobs are listed page by page and downloaded on a thread pool; at most
+    `max_in_flight` downloads are pending at any time, so memory does not
+    grow with the size of the bucket. Documents are yielded in listing order.
+
+    Args:
+        bucket_name (str): the GCS bucket
+        folder_prefix (str): the folder holding the data dictionaries
+        max_workers (int, optional): number of parallel downloads. Defaults to 8.
+        max_in_flight (int, optional): max pending downloads. Defaults to 2 * max_workers.
+
+    Yields:
+        dict: one parsed data dictionary per blob
+    """
+    # GCS credentials
+    credentials = Credentials.from_service_account_file(
+        os.getenv("GOOGLE_APPLICATION_CREDENTIALS")
+    )
+    storage_client = storage.Client(credentials=credentials)
+    bucket = storage_client.bucket(bucket_name)
+    max_in_flight = max_in_flight or 2 * max_workers
+
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        pending = deque()
+        for blob in bucket.list_blobs(prefix=folder_prefix):
+            pending.append((blob.name, executor.submit(blob.download_as_bytes)))
+            if len(pending) >= max_in_flight:
+                yield from _parse_next(pending)
+        while pending:
+            yield from _parse_next(pending)
+
+
+def _parse_next(pending: deque) -> Iterator[dict]:
+    """parse the oldest pending download, skipping the ones that failed"""
+    name, future = pending.popleft()
+    try:
+        document = json.loads(future.result())
+    except Exception as e:
+        print(f"failed to download {name} with {e}")
+        return
+    yield document
+
+
+def iter_local_documents(directory: str, pattern: str = "*.json") -> Iterator[dict]:
+    """Streams the data dictionaries stored as JSON files under a local directory
+
+    Args:
+        directory (str): the directory to walk, recursively
+        pattern (str, optional): the file name pattern. Defaults to "*.json".
+
+    Yields:
+        dict: one parsed data dictionary per file
+    """
+    for path in sorted(Path(directory).rglob(pattern)):
+        try:
+            with open(path, "rb") as f:
+                document = json.load(f)
+        except Exception as e:
+            print(f"failed to read {path} with {e}")
+            continue
+        yield document
+
+
+def chunked(iterable: Iterable, size: int) -> Iterator[list]:
+    """split an iterable into lists of at most `size` items"""
+    iterator = iter(iterable)
+    while chunk := list(islice(iterator, size)):
+        yield chunk
+
+
+def add_source_arguments(parser) -> None:
+    """add the data dictionaries source options to an argparse parser"""
+    parser.add_argument("--source", choices=["gcs", "local"], default="gcs")
+    parser.add_argument("--bucket", default=DEFAULT_BUCKET_NAME)
+    parser.add_argument(
+        "--tenant",
+        default=DEFAULT_TENANT,
+        help="tenant the data dictionaries belong to, stored with every entity",
+    )
+    parser.add_argument(
+        "--prefix",
+        help=f"bucket folder of the data dictionaries, {TENANT_FOLDER_PREFIX} by default",
+    )
+    parser.add_argument("--local-dir", help="directory of JSON data dictionaries")
+    parser.add_argument(
+        "--download-workers", type=int, default=8, help="parallel GCS downloads"
+    )
+    parser.add_argument(
+        "--chunk-size",
+        type=int,
+        default=1000,
+        help="number of rows embedded and inserted at a time",
+    )
+
+
+def iter_documents(args) -> Iterator[dict]:
+    """streams the data dictionaries from the source selected on the command line"""
+    if args.source == "local":
+        if not args.local_dir:
+            raise ValueError("--local-dir is required with --source local")
+        return iter_local_documents(args.local_dir)
+    return iter_bucket_documents(
+        bucket_name=args.bucket,
+        folder_prefix=args.prefix or TENANT_FOLDER_PREFIX.format(tenant=args.tenant),
+        max_workers=args.download_workers,
+    )
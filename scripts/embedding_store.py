@@ -0,0 +1,173 @@
+from contextlib import contextmanager
+from hashlib import sha256
+from pathlib import Path
+from typing import Iterator, Optional
+import fcntl
+import json
+import numpy as np
+
+DIGEST_SIZE = 32
+
+
+class EmbeddingStore:
+    """
+    Content-addressed on-disk store of embeddings, keyed by (model, sha256(text)).
+
+    Each model has its own directory holding:
+    - `vectors.bin`: the vectors, row after row, read through a memory map
+    - `index.bin`: the 32-byte sha256 digest of the text of each row
+    - `meta.json`: the dimension and dtype (float32 or float16) of the vectors
+
+    Rows are only ever appended, vectors before their digest; the files are
+    cut back to their last complete row when opened, so an interrupted run
+    loses at worst the rows it was appending. The store can be shared by
+    concurrent feeders: appends hold an exclusive lock on `store.lock`, and
+    the rows appended by other processes are picked up before each lookup.
+    """
+
+    def __init__(self, directory: str, model: str, dtype: str = "float32"):
+        self.directory = Path(directory) / model.replace("/", "_")
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self.vectors_path = self.directory / "vectors.bin"
+        self.index_path = self.directory / "index.bin"
+        self.meta_path = self.directory / "meta.json"
+        self.lock_path = self.directory / "store.lock"
+
+        self.dim: Optional[int] = None
+        self.dtype = np.dtype(dtype)
+        self._rows: dict[bytes, int] = {}
+        self._num_rows = 0
+        self._vectors: Optional[np.memmap] = None
+        with self._locked():
+            self._load_meta()
+            self._truncate()
+            self._load_index()
+
+    @contextmanager
+    def _locked(self) -> Iterator[None]:
+        """exclusive lock of the store, held by one process at a time"""
+        with open(self.lock_path, "a") as f:
+            fcntl.flock(f, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(f, fcntl.LOCK_UN)
+
+    def _load_meta(self) -> None:
+        if self.dim is None and self.meta_path.exists():
+            meta = json.loads(self.meta_path.read_text())
+            self.dim, self.dtype = meta["dim"], np.dtype(meta["dtype"])
+
+    def _load_index(self) -> None:
+        """read the digests appended since the last load, by any process
+
+        A digest is written after its vector, so every complete digest has
+        its row in the vectors file.
+        """
+        if not self.index_path.exists():
+            return
+        with open(self.index_path, "rb") as f:
+            f.seek(self._num_rows * DIGEST_SIZE)
+            index = f.read()
+        if len(index) < DIGEST_SIZE:
+            return
+        self._load_meta()
+        for i in range(len(index) // DIGEST_SIZE):
+            digest = index[i * DIGEST_SIZE : (i + 1) * DIGEST_SIZE]
+            self._rows.setdefault(digest, self._num_rows)
+            self._num_rows += 1
+
+    def _truncate(self) -> None:
+        """drop the rows of an interrupted append, and a torn last digest
+
+        Only the rows with both their vector and their complete digest are
+        kept, so the next append starts aligned in both files.
+        """
+
+        def size(path: Path) -> int:
+            return path.stat().st_size if path.exists() else 0
+
+        row_size = (self.dim or 0) * self.dtype.itemsize
+        rows = 0
+        if row_size:
+            rows = min(
+                size(self.index_path) // DIGEST_SIZE,
+                size(self.vectors_path) // row_size,
+            )
+        for path, rows_size in (
+            (self.index_path, rows * DIGEST_SIZE),
+            (self.vectors_path, rows * row_size),
+        ):
+            if size(path) > rows_size:
+                with open(path, "r+b") as f:
+                    f.truncate(rows_size)
+
+    def __len__(self) -> int:
+        self._load_index()
+        return len(self._rows)
+
+    @staticmethod
+    def digest(text: str) -> bytes:
+        return sha256(text.encode()).digest()
+
+    def _memmap(self) -> np.memmap:
+        """memory map of the vectors file, re-opened when rows were appended"""
+        if self._vectors is None or len(self._vectors) < self._num_rows:
+            self._vectors = np.memmap(
+                self.vectors_path,
+                dtype=self.dtype,
+                mode="r",
+                shape=(self._num_rows, self.dim),
+            )
+        return self._vectors
+
+    def get_many(self, texts: list[str]) -> list[Optional[list[float]]]:
+        """the stored embedding of each text, None when it was never embedded"""
+        self._load_index()
+        rows = [self._rows.get(self.digest(text)) for text in texts]
+        if all(row is None for row in rows):
+            return [None] * len(texts)
+        vectors = self._memmap()
+        return [
+            None if row is None else vectors[row].astype(np.float32).tolist()
+            for row in rows
+        ]
+
+    def put_many(self, texts: list[str], embeddings: list[list[float]]) -> None:
+        """append the embeddings of texts not yet in the store
+
+        The rows are numbered after the size of the vectors file under the
+        lock, so the rows appended meanwhile by other processes are skipped.
+        """
+        with self._locked():
+            # the rows of an append interrupted in another process are cut back
+            self._load_meta()
+            self._truncate()
+            self._load_index()
+            new = {}
+            for text, embedding in zip(texts, embeddings):
+                digest = self.digest(text)
+                if digest not in self._rows:
+                    new[digest] = embedding
+            if not new:
+                return
+
+            if self.dim is None:
+                self.dim = len(next(iter(new.values())))
+                self.meta_path.write_text(
+                    json.dumps({"dim": self.dim, "dtype": self.dtype.name})
+                )
+            vectors = np.asarray(list(new.values()), dtype=self.dtype)
+            if vectors.shape[1] != self.dim:
+                raise ValueError(
+                    f"embedding dimension {vectors.shape[1]} does not match the store ({self.dim})"
+                )
+            row_size = self.dim * self.dtype.itemsize
+            with open(self.vectors_path, "ab") as f:
+                start = f.tell() // row_size
+                f.write(vectors.tobytes())
+            with open(self.index_path, "ab") as f:
+                f.write(b"".join(new))
+            for row, digest in enumerate(new, start):
+                self._rows[digest] = row
+            self._num_rows = start + len(new)
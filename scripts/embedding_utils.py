@@ -0,0 +1,191 @@
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from openai import (
+    OpenAI,
+    APIConnectionError,
+    APITimeoutError,
+    InternalServerError,
+    RateLimitError,
+)
+from scripts.embedding_store import EmbeddingStore
+from typing import Optional
+import os
+import random
+import time
+
+try:
+    import tiktoken
+except ImportError:  # token counts fall back to a conservative estimate
+    tiktoken = None
+
+# per-request limits of the OpenAI embeddings endpoint
+MAX_INPUTS_PER_REQUEST = 2048
+MAX_TOKENS_PER_REQUEST = 300_000
+
+RETRYABLE_ERRORS = (
+    RateLimitError,
+    APIConnectionError,
+    APITimeoutError,
+    InternalServerError,
+)
+
+
+def count_tokens(text: str, model: str = "text-embedding-3-small") -> int:
+    """number of tokens of `text`, estimated from its length when tiktoken is missing"""
+    if tiktoken is None:
+        # ~4 characters per token in English, over-estimated to stay under the limits
+        return len(text) // 3 + 1
+    try:
+        encoding = tiktoken.encoding_for_model(model)
+    except KeyError:
+        encoding = tiktoken.get_encoding("cl100k_base")
+    return len(encoding.encode(text))
+
+
+def make_batches(
+    texts: list[str],
+    model: str = "text-embedding-3-small",
+    max_inputs: int = MAX_INPUTS_PER_REQUEST,
+    max_tokens: int = MAX_TOKENS_PER_REQUEST,
+) -> list[list[int]]:
+    """pack texts into batches staying under the per-request input and token limits
+
+    Args:
+        texts (list[str]): the texts to embed
+        model (str, optional): the embedding model. Defaults to "text-embedding-3-small".
+        max_inputs (int, optional): max number of texts per request.
+        max_tokens (int, optional): max number of tokens per request.
+
+    Returns:
+        list[list[int]]: the indices of `texts` in each batch
+    """
+    batches = []
+    batch, batch_tokens = [], 0
+    for i, text in enumerate(texts):
+        tokens = count_tokens(text, model)
+        if batch and (len(batch) >= max_inputs or batch_tokens + tokens > max_tokens):
+            batches.append(batch)
+            batch, batch_tokens = [], 0
+        batch.append(i)
+        batch_tokens += tokens
+    if batch:
+        batches.append(batch)
+    return batches
+
+
+def embed_batch(
+    client: OpenAI,
+    texts: list[str],
+    model: str = "text-embedding-3-small",
+    max_retries: int = 8,
+    backoff: float = 1.0,
+) -> list[list[float]]:
+    """embed one batch, retrying with exponential backoff on 429s and transient errors"""
+    for attempt in range(max_retries + 1):
+        try:
+            response = client.embeddings.create(input=texts, model=model)
+            return [item.embedding for item in response.data]
+        except RETRYABLE_ERRORS as e:
+            if attempt == max_retries:
+                raise
+            delay = backoff * 2**attempt * (1 + random.random())
+            retry_after = getattr(getattr(e, "response", None), "headers", {}).get(
+                "retry-after"
+            )
+            if retry_after is not None:
+                try:
+                    delay = max(delay, float(retry_after))
+                except ValueError:
+                    pass
+            print(
+                f"{type(e).__name__} on batch of {len(texts)}, retrying in {delay:.1f}s"
+            )
+            time.sleep(delay)
+
+
+def embed_texts(
+    client: OpenAI,
+    texts: list[str],
+    model: str = "text-embedding-3-small",
+    max_workers: int = 4,
+    max_inputs: int = MAX_INPUTS_PER_REQUEST,
+    max_tokens: int = MAX_TOKENS_PER_REQUEST,
+    store: Optional[EmbeddingStore] = None,
+) -> list[list[float]]:
+    """embed many texts with token-aware batching and bounded concurrency
+
+    Identical texts are embedded once, and texts already in `store` are not
+    sent to OpenAI at all; new embeddings are added to the store.
+
+    Args:
+        client (OpenAI): the OpenAI client, retries are handled here
+        texts (list[str]): the texts to embed
+        model (str, optional): the embedding model. Defaults to "text-embedding-3-small".
+        max_workers (int, optional): max number of concurrent requests. Defaults to 4.
+        store (EmbeddingStore, optional): on-disk store consulted before OpenAI.
+
+    Returns:
+        list[list[float]]: the embeddings, in the same order as `texts`
+    """
+    unique_texts = list(dict.fromkeys(texts))
+    if store is not None:
+        stored = dict(zip(unique_texts, store.get_many(unique_texts)))
+    else:
+        stored = dict.fromkeys(unique_texts)
+    to_embed = [text for text, embedding in stored.items() if embedding is None]
+
+    client = client.with_options(max_retries=0)
+    batches = make_batches(
+        to_embed, model, max_inputs=max_inputs, max_tokens=max_tokens
+    )
+    done = 0
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        futures = {
+            executor.submit(
+                embed_batch, client, [to_embed[i] for i in batch], model
+            ): batch
+            for batch in batches
+        }
+        for future in as_completed(futures):
+            batch_texts = [to_embed[i] for i in futures[future]]
+            batch_embeddings = future.result()
+            stored.update(zip(batch_texts, batch_embeddings))
+            if store is not None:
+                store.put_many(batch_texts, batch_embeddings)
+            done += len(batch_texts)
+            print(f"embedded {done}/{len(to_embed)} texts")
+
+    print(
+        f"{len(texts)} texts: {len(texts) - len(unique_texts)} duplicates, "
+        f"{len(unique_texts) - len(to_embed)} from the embedding store, "
+        f"{len(to_embed)} embedded"
+    )
+    return [stored[text] for text in texts]
+
+
+def add_embedding_arguments(parser) -> None:
+    """add the embedding options to an argparse parser"""
+    parser.add_argument(
+        "--embedding-workers",
+        type=int,
+        default=int(os.getenv("EMBEDDING_WORKERS", "4")),
+        help="max number of concurrent embedding requests",
+    )
+    parser.add_argument(
+        "--embedding-store",
+        default=os.getenv("EMBEDDING_STORE_DIR", ".embedding_store"),
+        help="directory of the on-disk embedding store, empty to disable it",
+    )
+    parser.add_argument(
+        "--embedding-store-dtype", choices=["float32", "float16"], default="float32"
+    )
+
+
+def open_embedding_store(
+    args, model: str = "text-embedding-3-small"
+) -> Optional[EmbeddingStore]:
+    """the embedding store selected on the command line, if any"""
+    if not args.embedding_store:
+        return None
+    return EmbeddingStore(
+        args.embedding_store, model=model, dtype=args.embedding_store_dtype
+    )
@@ -0,0 +1,356 @@
+from pymilvus import MilvusClient
+from openai import OpenAI
+from pathlib import Path
+from scripts.bulk_import import (
+    BulkImporter,
+    ShardWriter,
+    add_write_arguments,
+    insert_chunked,
+)
+from scripts.context_builders import BUILDERS, ContextBuilder
+from scripts.data_sources import add_source_arguments, iter_documents
+from scripts.embedding_utils import (
+    add_embedding_arguments,
+    embed_batch,
+    embed_texts,
+    open_embedding_store,
+)
+from scripts.embedding_store import EmbeddingStore
+from scripts.manifest import DEFAULT_MANIFEST_DIR, Manifest, content_hash, stable_id
+from src.config.vector_profiles import DEFAULT_PROFILE, VECTOR_PROFILES
+from typing import Optional
+import argparse
+import json
+import os
+import shutil
+import time
+
+
+class CollectionTarget:
+    """
+    Ingestion state of one tenant in one target collection: its manifest, the
+    IDs seen in the source so far and the rows waiting to be embedded.
+
+    The embedded rows are inserted in chunks, or with `--write-mode bulk`
+    written to NumPy shards imported at once by `finish`. A full run over an
+    existing tenant upserts its rows and deletes the stale ones at the end, so
+    the tenant keeps being served while it is fed again.
+    """
+
+    def __init__(self, client: MilvusClient, builder: ContextBuilder, args):
+        self.client = client
+        self.builder = builder
+        self.collection_name = builder.collection_name
+        self.profile = builder.profile
+        self.tenant = args.tenant
+        self.incremental = args.incremental
+        self.recreate = args.recreate
+        self.manifest = Manifest(
+            os.path.join(args.manifest_dir, self.collection_name, f"{self.tenant}.json")
+        )
+        if self.recreate or not self.incremental:
+            self.manifest.clear()
+        self.created = False
+        self.replaced = False
+        self.seen_ids: set[int] = set()
+        self.pending: list[tuple[int, str, str, dict]] = []
+        self.num_written = 0
+        self.insert_batch_size = args.insert_batch_size
+        self.insert_workers = args.insert_workers
+        self.shards: Optional[ShardWriter] = None
+        if args.write_mode == "bulk" and self.incremental:
+            print(f"{self.collection_name}: incremental runs upsert, not bulk import")
+        elif args.write_mode == "bulk":
+            # a new directory per run, the shards of a failed run are not imported
+            run_dir = Path(self.collection_name, self.tenant, str(int(time.time())))
+            self.shards = ShardWriter(
+                os.path.join(args.bulk_dir, run_dir), shard_size=args.bulk_shard_size
+            )
+            self.importer = BulkImporter(
+                args.milvus_uri,
+                remote_prefix=os.path.join(args.bulk_remote_prefix, run_dir),
+                timeout_s=args.bulk_timeout_s,
+            )
+
+    def setup(self) -> None:
+        """create the collection, or list the tenant rows of an existing one
+
+        The collection is shared by all tenants: a full run only replaces the
+        rows of its own tenant, unless `--recreate` drops the whole collection.
+        """
+        if self.recreate and self.client.has_collection(self.collection_name):
+            print(f"dropping collection {self.collection_name}")
+            self.client.drop_collection(collection_name=self.collection_name)
+            # the other tenants have to be fed again in full
+            for path in self.manifest.path.parent.glob("*.json"):
+                path.unlink()
+        if self.client.has_collection(self.collection_name):
+            properties = (
+                self.client.describe_collection(collection_name=self.collection_name)
+                or {}
+            ).get("properties") or {}
+            profile = properties.get("vector_profile", DEFAULT_PROFILE)
+            if profile != self.profile.name:
+                raise ValueError(
+                    f"{self.collection_name} is stored with the {profile} vector "
+                    f"profile, feed it with --recreate to switch to {self.profile.name}"
+                )
+            if self.incremental:
+                print(f"updating {self.tenant} in collection {self.collection_name}")
+            else:
+                print(f"replacing {self.tenant} in collection {self.collection_name}")
+                self._track_tenant_rows()
+            return
+        self.client.create_collection(
+            collection_name=self.collection_name,
+            schema=self.builder.create_schema(),
+        )
+        self.created = True
+
+    def _track_tenant_rows(self) -> None:
+        """record the stored rows of the tenant in the cleared manifest
+
+        Their empty digest never matches, so every row of the source is
+        rewritten, and the rows missing from it are deleted by `finish` once
+        the new ones are written.
+        """
+        iterator = self.client.query_iterator(
+            collection_name=self.collection_name,
+            filter=f"tenant == {json.dumps(self.tenant)}",
+            output_fields=["id"],
+        )
+        try:
+            while rows := iterator.next():
+                for row in rows:
+                    self.manifest.update(row["id"], "")
+        finally:
+            iterator.close()
+        if not len(self.manifest):
+            return
+        self.replaced = True
+        if self.shards is not None:
+            # an import cannot overwrite the stored rows of the same IDs
+            print(f"{self.collection_name}: {self.tenant} is stored, upserting")
+            shutil.rmtree(self.shards.directory, ignore_errors=True)
+            self.shards = None
+
+    def add(self, datadict: dict) -> None:
+        """queue the new or changed entities of a data dictionary"""
+        for key, text, fields in self.builder.entities(datadict):
+            fields = {**fields, "tenant": self.tenant}
+            # tenants may share catalog, schema and table names
+            entity_id = stable_id(f"{self.tenant}/{key}")
+            if entity_id in self.seen_ids:
+                print(f"skipping duplicated entity {key}")
+                continue
+            self.seen_ids.add(entity_id)
+            digest = content_hash(text, fields)
+            if self.manifest.changed(entity_id, digest):
+                self.pending.append((entity_id, digest, text, fields))
+
+    def write(self, rows: list[tuple[int, str, str, dict]], embeddings: list) -> None:
+        data_to_collection = [
+            {
+                "id": entity_id,
+                "embeddings": self.profile.encode(embedding),
+                "text": text,
+                **fields,
+            }
+            for (entity_id, _, text, fields), embedding in zip(rows, embeddings)
+        ]
+        if self.shards is not None:
+            self.shards.add(data_to_collection)
+        else:
+            insert_chunked(
+                self.client,
+                self.collection_name,
+                data_to_collection,
+                upsert=self.incremental or self.replaced,
+                batch_size=self.insert_batch_size,
+                max_workers=self.insert_workers,
+            )
+        for entity_id, digest, _, _ in rows:
+            self.manifest.update(entity_id, digest)
+        self.num_written += len(rows)
+        print(f"{self.collection_name}: wrote {self.num_written} entities")
+
+    def finish(self) -> None:
+        """delete the removed entities, then flush, index and load the collection"""
+        if self.shards is not None:
+            # imported before the manifest is saved, a failed import is fed again
+            shards = self.shards.close()
+            if shards:
+                self.importer.run(self.collection_name, shards)
+            shutil.rmtree(self.shards.directory, ignore_errors=True)
+        removed_ids = self.manifest.removed(self.seen_ids)
+        if removed_ids:
+            self.client.delete(collection_name=self.collection_name, ids=removed_ids)
+            self.manifest.discard(removed_ids)
+            print(f"{self.collection_name}: deleted {len(removed_ids)} entities")
+        self.manifest.save()
+
+        # After final entity is inserted, it is best to call flush to have no growing segments left in memory
+        # https://milvus.io/api-reference/pymilvus/v2.2.x/MilvusClient/Collection/flush().md
+        self.client.flush(collection_name=self.collection_name)
+
+        # build the index once, on the complete data
+        if self.created:
+            self.client.create_index(
+                collection_name=self.collection_name,
+                index_params=self.builder.prepare_index_params(),
+                sync=True,  # Whether to wait for index creation to complete before returning. Defaults to True.
+            )
+
+        # bump the data version so the API search cache drops stale results,
+        # the vector profile tells the API how to embed and search the queries
+        if self.created or self.num_written or removed_ids or self.replaced:
+            self.client.alter_collection_properties(
+                collection_name=self.collection_name,
+                properties={
+                    "data_version": str(int(time.time())),
+                    "vector_profile": self.profile.name,
+                },
+            )
+
+        # load the collection to make it available
+        self.client.load_collection(collection_name=self.collection_name)
+        print(
+            f"{self.collection_name}: {self.num_written} new or changed entities, "
+            f"{len(self.seen_ids)} in total"
+        )
+
+
+def embed_pending(
+    openai_client: OpenAI,
+    targets: list[CollectionTarget],
+    max_workers: int,
+    store: Optional[EmbeddingStore],
+) -> None:
+    """embed the pending rows of all targets together, then write each collection"""
+    texts = [text for target in targets for _, _, text, _ in target.pending]
+    if not texts:
+        return
+    embeddings = embed_texts(openai_client, texts, max_workers=max_workers, store=store)
+    start = 0
+    for target in targets:
+        rows, target.pending = target.pending, []
+        if rows:
+            target.write(rows, embeddings[start : start + len(rows)])
+            start += len(rows)
+
+
+def smoke_test(
+    client: MilvusClient,
+    openai_client: OpenAI,
+    target: CollectionTarget,
+    query: str,
+) -> None:
+    """print the top matches of a test query among the tenant entities"""
+    query_vector = embed_batch(openai_client, [query])
+
+    # search parameters should use the same parameters as for when the index was creatied
+    search_params = target.profile.search_params_for(nprobe=50)
+    res = client.search(
+        collection_name=target.collection_name,
+        data=[target.profile.encode(vector) for vector in query_vector],
+        search_params=search_params,
+        limit=5,
+        filter=f"tenant == {json.dumps(target.tenant)}",
+        anns_field="embeddings",
+        output_fields=["text"],  # only return the text, not the whole vector embeddings
+    )
+    for hits in res:
+        for hit in hits:
+            print(f"entity: {hit.entity.get('text')}")
+            print(f"distance: {hit.get('distance')}")
+            print("####\n")
+
+
+def run_ingestion(args, builders: list[ContextBuilder]) -> None:
+    """walk the source once and feed every target collection
+
+    Args:
+        args: the parsed command line, see `build_parser`
+        builders (list[ContextBuilder]): one builder per target collection
+    """
+    openai_client = OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
+    client = MilvusClient(uri=args.milvus_uri)
+    try:
+        collections = client.list_collections()
+        print(f"Successfully connected to Milvus. Collections: {collections}")
+    except Exception as e:
+        print(f"Failed to connect to Milvus or retrieve collections: {e}")
+
+    embedding_store = open_embedding_store(args)
+    targets = [CollectionTarget(client, builder, args) for builder in builders]
+    for target in targets:
+        target.setup()
+
+    # stream the data dictionaries once; rows of all targets are embedded
+    # together every --chunk-size rows, so memory does not grow with the bucket
+    for datadict in iter_documents(args):
+        for target in targets:
+            target.add(datadict)
+        if sum(len(target.pending) for target in targets) >= args.chunk_size:
+            embed_pending(
+                openai_client, targets, args.embedding_workers, embedding_store
+            )
+    embed_pending(openai_client, targets, args.embedding_workers, embedding_store)
+
+    for target in targets:
+        target.finish()
+        if args.smoke_test_query:
+            smoke_test(client, openai_client, target, args.smoke_test_query)
+
+
+def build_parser(description: str) -> argparse.ArgumentParser:
+    """the command line shared by the ingestion entry points"""
+    parser = argparse.ArgumentParser(description=description)
+    add_source_arguments(parser)
+    add_embedding_arguments(parser)
+    add_write_arguments(parser)
+    parser.add_argument(
+        "--milvus-uri",
+        default=os.getenv("MILVUS_CLIENT_URL", "http://localhost:19530"),
+    )
+    parser.add_argument(
+        "--incremental",
+        action="store_true",
+        help="only re-embed and upsert changed rows, and delete the removed ones",
+    )
+    parser.add_argument(
+        "--recreate",
+        action="store_true",
+        help="drop and recreate the collections, for every tenant, e.g. after a schema change",
+    )
+    parser.add_argument(
+        "--vector-profile",
+        choices=sorted(VECTOR_PROFILES),
+        default=os.getenv("VECTOR_PROFILE", DEFAULT_PROFILE),
+        help="how the vectors are reduced, stored and indexed, see src/config/vector_profiles.py",
+    )
+    parser.add_argument(
+        "--manifest-dir",
+        default=DEFAULT_MANIFEST_DIR,
+        help="directory of the content hash manifests, one per collection and tenant",
+    )
+    parser.add_argument(
+        "--smoke-test-query",
+        default="OrderNbr",
+        help="query searched in each collection at the end, empty to skip it",
+    )
+    return parser
+
+
+if __name__ == "__main__":
+    parser = build_parser("feed the data dictionaries to several Milvus collections")
+    parser.add_argument(
+        "--targets",
+        nargs="+",
+        choices=sorted(BUILDERS),
+        default=sorted(BUILDERS),
+        help="the collections to build",
+    )
+    args = parser.parse_args()
+    profile = VECTOR_PROFILES[args.vector_profile]
+    run_ingestion(args, [BUILDERS[target](profile) for target in args.targets])
@@ -0,0 +1,64 @@
+from hashlib import sha256
+from pathlib import Path
+from typing import Optional
+import json
+import os
+
+DEFAULT_MANIFEST_DIR = "manifests"
+
+
+def stable_id(key: str) -> int:
+    """derive a stable int64 primary key from an entity key like `catalog.schema.table.column`"""
+    return int.from_bytes(sha256(key.encode()).digest()[:8], "big") & (2**63 - 1)
+
+
+def content_hash(text: str, fields: Optional[dict] = None) -> str:
+    """hash of the text embedded for an entity, and of its scalar fields"""
+    if fields:
+        text = f"{text}\0{json.dumps(fields, sort_keys=True)}"
+    return sha256(text.encode()).hexdigest()
+
+
+class Manifest:
+    """
+    Content hash of every entity ingested in a collection, keyed by entity ID.
+
+    It lets an incremental run re-embed only the entities whose text changed
+    and delete the ones that are no longer in the source.
+    """
+
+    def __init__(self, path: str):
+        self.path = Path(path)
+        self.entries: dict[int, str] = {}
+        if self.path.exists():
+            with open(self.path) as f:
+                self.entries = {int(k): v for k, v in json.load(f).items()}
+
+    def __len__(self) -> int:
+        return len(self.entries)
+
+    def changed(self, entity_id: int, digest: str) -> bool:
+        """whether the entity is new or its content differs from the last run"""
+        return self.entries.get(entity_id) != digest
+
+    def update(self, entity_id: int, digest: str) -> None:
+        self.entries[entity_id] = digest
+
+    def removed(self, seen_ids: set[int]) -> list[int]:
+        """IDs recorded in the manifest but not seen during this run"""
+        return [entity_id for entity_id in self.entries if entity_id not in seen_ids]
+
+    def discard(self, entity_ids: list[int]) -> None:
+        for entity_id in entity_ids:
+            self.entries.pop(entity_id, None)
+
+    def clear(self) -> None:
+        self.entries.clear()
+
+    def save(self) -> None:
+        """write the manifest atomically, so an interrupted run keeps the previous one"""
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = self.path.with_suffix(".tmp")
+        with open(tmp_path, "w") as f:
+            json.dump({str(k): v for k, v in self.entries.items()}, f)
+        os.replace(tmp_path, self.path)
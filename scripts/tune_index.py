@@ -0,0 +1,310 @@
+from pymilvus import DataType, MilvusClient
+from openai import OpenAI
+from scripts.embedding_utils import (
+    add_embedding_arguments,
+    embed_texts,
+    open_embedding_store,
+)
+from src.config.vector_profiles import VectorProfile
+from typing import Optional
+import argparse
+import json
+import os
+import time
+import numpy as np
+
+# index build parameters and search parameters swept for each index type
+INDEX_SWEEP = {
+    "IVF_FLAT": {
+        "index_params": [{"nlist": nlist} for nlist in (128, 512, 1024)],
+        "search_params": [{"nprobe": nprobe} for nprobe in (4, 8, 16, 32, 64, 128)],
+    },
+    "IVF_SQ8": {
+        "index_params": [{"nlist": nlist} for nlist in (128, 512, 1024)],
+        "search_params": [{"nprobe": nprobe} for nprobe in (4, 8, 16, 32, 64, 128)],
+    },
+    "HNSW": {
+        "index_params": [
+            {"M": m, "efConstruction": ef_construction}
+            for m in (16, 32)
+            for ef_construction in (128, 256)
+        ],
+        "search_params": [{"ef": ef} for ef in (16, 32, 64, 128, 256)],
+    },
+}
+
+TUNING_COLLECTION_SUFFIX = "_tuning"
+
+
+def load_corpus(
+    client: MilvusClient, collection_name: str, batch_size: int = 5000
+) -> tuple[np.ndarray, np.ndarray]:
+    """ids and full-precision vectors of every entity of the collection
+
+    Args:
+        client (MilvusClient): the Milvus client
+        collection_name (str): a collection stored with FLOAT_VECTORs
+        batch_size (int, optional): entities fetched per query.
+
+    Returns:
+        tuple[np.ndarray, np.ndarray]: the ids, and the vectors row by row
+    """
+    ids, vectors = [], []
+    last_id = None
+    while True:
+        res = client.query(
+            collection_name=collection_name,
+            filter="" if last_id is None else f"id > {last_id}",
+            output_fields=["id", "embeddings"],
+            limit=batch_size,
+        )
+        if not res:
+            break
+        ids += [entity["id"] for entity in res]
+        vectors += [entity["embeddings"] for entity in res]
+        last_id = max(entity["id"] for entity in res)
+        if len(res) < batch_size:
+            break
+    return np.asarray(ids, dtype=np.int64), np.asarray(vectors, dtype=np.float32)
+
+
+def exact_top_k(corpus: np.ndarray, queries: np.ndarray, k: int) -> np.ndarray:
+    """row indices of the exact `k` nearest corpus vectors of each query, by cosine"""
+    corpus = corpus / np.linalg.norm(corpus, axis=1, keepdims=True)
+    queries = queries / np.linalg.norm(queries, axis=1, keepdims=True)
+    scores = queries @ corpus.T
+    top = np.argpartition(-scores, min(k, len(corpus) - 1), axis=1)[:, :k]
+    order = np.take_along_axis(scores, top, axis=1).argsort(axis=1)[:, ::-1]
+    return np.take_along_axis(top, order, axis=1)
+
+
+def recall_at_k(found: list[list[int]], truth: list[set[int]]) -> float:
+    """mean fraction of the exact top k found by the index"""
+    return float(
+        np.mean(
+            [
+                len(set(ids) & ids_truth) / len(ids_truth)
+                for ids, ids_truth in zip(found, truth)
+            ]
+        )
+    )
+
+
+def candidate_profiles(
+    index_types: list[str], dimensions: list[Optional[int]]
+) -> list[tuple[VectorProfile, list[dict]]]:
+    """every index build to evaluate, with the search parameters swept on it"""
+    candidates = []
+    for index_type in index_types:
+        sweep = INDEX_SWEEP[index_type]
+        for dims in dimensions:
+            for index_params in sweep["index_params"]:
+                profile = VectorProfile(
+                    name="tuned",
+                    dimensions=dims,
+                    index_type=index_type,
+                    index_params=index_params,
+                    search_params=sweep["search_params"][0],
+                )
+                candidates.append((profile, sweep["search_params"]))
+    return candidates
+
+
+def evaluate(
+    client: MilvusClient,
+    collection_name: str,
+    profile: VectorProfile,
+    search_params_list: list[dict],
+    ids: np.ndarray,
+    corpus: np.ndarray,
+    query_vectors: np.ndarray,
+    truth: list[set[int]],
+    k: int,
+) -> list[dict]:
+    """build the index of `profile` on a scratch collection and time its searches
+
+    Returns:
+        list[dict]: one row per search parameters, with recall@k and latencies
+    """
+    if client.has_collection(collection_name):
+        client.drop_collection(collection_name=collection_name)
+    schema = MilvusClient.create_schema(auto_id=False)
+    schema.add_field(field_name="id", datatype=DataType.INT64, is_primary=True)
+    schema.add_field(
+        field_name="embeddings",
+        datatype=getattr(DataType, profile.vector_type),
+        dim=profile.dim(corpus.shape[1]),
+    )
+    client.create_collection(collection_name=collection_name, schema=schema)
+    for start in range(0, len(ids), 5000):
+        client.insert(
+            collection_name=collection_name,
+            data=[
+                {"id": int(entity_id), "embeddings": profile.encode(vector)}
+                for entity_id, vector in zip(
+                    ids[start : start + 5000], corpus[start : start + 5000]
+                )
+            ],
+        )
+    client.flush(collection_name=collection_name)
+
+    index_params = MilvusClient.prepare_index_params()
+    index_params.add_index(
+        field_name="embeddings",
+        metric_type=profile.metric_type,
+        index_type=profile.index_type,
+        index_name="vector_index",
+        params=profile.index_params,
+    )
+    start = time.perf_counter()
+    client.create_index(
+        collection_name=collection_name, index_params=index_params, sync=True
+    )
+    build_s = time.perf_counter() - start
+    client.load_collection(collection_name=collection_name)
+
+    rows = []
+    data = [profile.encode(vector) for vector in query_vectors]
+    for search_params in search_params_list:
+        tuned = profile.model_copy(update={"search_params": search_params})
+        # warm-up, not measured
+        client.search(
+            collection_name=collection_name,
+            data=data[:1],
+            limit=k,
+            search_params=tuned.search_params_for(),
+        )
+        found, latencies = [], []
+        for vector in data:
+            start = time.perf_counter()
+            res = client.search(
+                collection_name=collection_name,
+                data=[vector],
+                limit=k,
+                search_params=tuned.search_params_for(),
+            )
+            latencies.append(time.perf_counter() - start)
+            found.append([hit["id"] for hit in res[0]])
+        latencies_ms = np.asarray(latencies) * 1000
+        rows.append(
+            {
+                "profile": tuned,
+                "recall": recall_at_k(found, truth),
+                "p50_ms": float(np.percentile(latencies_ms, 50)),
+                "p95_ms": float(np.percentile(latencies_ms, 95)),
+                "build_s": build_s,
+            }
+        )
+        print_row(rows[-1], k)
+
+    client.drop_collection(collection_name=collection_name)
+    return rows
+
+
+def print_row(row: dict, k: int) -> None:
+    profile = row["profile"]
+    print(
+        f"{profile.index_type:<9} dim={profile.dim():<5} "
+        f"{json.dumps(profile.index_params):<36} {json.dumps(profile.search_params):<16} "
+        f"recall@{k} {row['recall']:.3f}  p50 {row['p50_ms']:7.2f} ms  "
+        f"p95 {row['p95_ms']:7.2f} ms  build {row['build_s']:6.1f} s"
+    )
+
+
+def recommend(rows: list[dict], recall_target: float) -> Optional[dict]:
+    """the fastest row reaching the recall target, the most accurate one otherwise"""
+    reaching = [row for row in rows if row["recall"] >= recall_target]
+    if reaching:
+        return min(reaching, key=lambda row: (row["p50_ms"], -row["recall"]))
+    return max(rows, key=lambda row: (row["recall"], -row["p50_ms"]), default=None)
+
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(
+        description="sweep index types and search params for recall@k vs latency"
+    )
+    add_embedding_arguments(parser)
+    parser.add_argument(
+        "--milvus-uri",
+        default=os.getenv("MILVUS_CLIENT_URL", "http://localhost:19530"),
+    )
+    parser.add_argument(
+        "--collection",
+        default="data_dictionary_columns",
+        help="collection, stored with the default profile, whose vectors are the corpus",
+    )
+    parser.add_argument(
+        "--queries", required=True, help="text file of sample queries, one per line"
+    )
+    parser.add_argument("--sample", type=int, default=200, help="max number of queries")
+    parser.add_argument("--top-k", type=int, default=10)
+    parser.add_argument("--recall-target", type=float, default=0.95)
+    parser.add_argument(
+        "--index-types",
+        nargs="+",
+        choices=sorted(INDEX_SWEEP),
+        default=sorted(INDEX_SWEEP),
+    )
+    parser.add_argument(
+        "--dimensions",
+        type=int,
+        nargs="+",
+        default=[],
+        help="reduced dimensions to evaluate besides the full ones",
+    )
+    parser.add_argument(
+        "--output",
+        default="search_profile.json",
+        help="recommended profile, loaded by the API from SEARCH_PROFILE_PATH",
+    )
+    parser.add_argument("--profile-name", default="tuned")
+    return parser
+
+
+if __name__ == "__main__":
+    args = build_parser().parse_args()
+    client = MilvusClient(uri=args.milvus_uri)
+    openai_client = OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
+
+    with open(args.queries) as f:
+        queries = list(dict.fromkeys(line.strip() for line in f if line.strip()))
+    queries = queries[: args.sample]
+    query_vectors = np.asarray(
+        embed_texts(openai_client, queries, store=open_embedding_store(args)),
+        dtype=np.float32,
+    )
+
+    ids, corpus = load_corpus(client, args.collection)
+    print(f"{len(queries)} queries against {len(ids)} entities of {args.collection}")
+    truth = [
+        set(ids[rows].tolist())
+        for rows in exact_top_k(corpus, query_vectors, args.top_k)
+    ]
+
+    rows = []
+    for profile, search_params_list in candidate_profiles(
+        args.index_types, [None] + args.dimensions
+    ):
+        rows += evaluate(
+            client,
+            args.collection + TUNING_COLLECTION_SUFFIX,
+            profile,
+            search_params_list,
+            ids,
+            corpus,
+            query_vectors,
+            truth,
+            args.top_k,
+        )
+
+    best = recommend(rows, args.recall_target)
+    if best is None:
+        raise SystemExit("nothing was evaluated")
+    if best["recall"] < args.recall_target:
+        print(f"\nno configuration reaches recall@{args.top_k} {args.recall_target}")
+    print("\nrecommended:")
+    print_row(best, args.top_k)
+    profile = best["profile"].model_copy(update={"name": args.profile_name})
+    with open(args.output, "w") as f:
+        f.write(profile.model_dump_json(indent=2))
+    print(f"profile saved to {args.output}")
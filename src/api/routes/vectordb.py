@@ -1,12 +1,28 @@
-from fastapi import APIRouter, HTTPException, status
-from src.models.response_models import Entity, SearchEntity, ResponseEntities
+from fastapi import APIRouter, HTTPException, Response, status
+from src.models.response_models import (
+    BatchResponseEntities,
+    BatchSearchEntity,
+    Entities,
+    Entity,
+    ResponseEntities,
+    SearchEntity,
+)
+from src.services.admission import AdmissionRejected
+from src.services.metrics import stage
+from src.services.resilience import CircuitOpenError
+from src.services.serialization import dumps, project_hit
+from src.services.warmup import query_log
 from src.services.vectordb_service import (
+    get_cache_stats,
     get_collection_dimension,
+    get_entities,
     get_entity,
     get_collection_from_database,
+    search_queries,
     search_query,
 )
 import logging
+import math
 
 logger = logging.getLogger(__name__)
 
@@ -16,6 +32,42 @@ vectordb_router = APIRouter(
 )
 
 
+def unavailable(e: CircuitOpenError | AdmissionRejected) -> HTTPException:
+    """fail fast while an upstream circuit breaker is open or its budget is spent"""
+    return HTTPException(
+        status_code=status.HTTP_429_TOO_MANY_REQUESTS
+        if isinstance(e, AdmissionRejected)
+        else status.HTTP_503_SERVICE_UNAVAILABLE,
+        detail=str(e),
+        headers={"Retry-After": str(math.ceil(e.retry_after))},
+    )
+
+
+def hits_response(hits: list, fields: str) -> Response:
+    """the `ResponseEntities` body of search hits, encoded directly to bytes
+
+    The hits come from the services, so they are projected to the requested
+    `fields` and encoded without a validation round-trip through the models.
+    """
+    with stage("serialization"):
+        body = dumps({"responses": [project_hit(hit, fields) for hit in hits]})
+    return Response(content=body, media_type="application/json")
+
+
+def batch_hits_response(hits: list[list], fields: str) -> Response:
+    """the `BatchResponseEntities` body of the hits of several queries"""
+    with stage("serialization"):
+        body = dumps(
+            {
+                "responses": [
+                    {"responses": [project_hit(hit, fields) for hit in query_hits]}
+                    for query_hits in hits
+                ]
+            }
+        )
+    return Response(content=body, media_type="application/json")
+
+
 @vectordb_router.get("/health", description="health check")
 async def root() -> dict[str, str]:
     logger.info("Hello from vectordb router")
@@ -54,15 +106,20 @@ async def get_number_entity() -> dict:
         )
 
 
+@vectordb_router.get("/cache_stats", description="return the in-process cache counters")
+async def cache_stats() -> dict:
+    return get_cache_stats()
+
+
 @vectordb_router.post("/get_entity")
 async def retrieve_entity(input: Entity):
-    print(f"{input}")
     input_id = input.id
-    logger.info(f"retrieving entity {input_id} from collection")
+    logger.debug("retrieving entity %s from collection", input_id)
     try:
-        entity = await get_entity(id=input_id)
-        logger.info(f"{entity=}")
+        entity = await get_entity(id=input_id, tenant=input.tenant)
         return entity
+    except CircuitOpenError as e:
+        raise unavailable(e)
     except Exception as e:
         logger.error(f"Error in retrieving entity {input_id} from collection: {str(e)}")
         raise HTTPException(
@@ -71,22 +128,69 @@ async def retrieve_entity(input: Entity):
         )
 
 
+@vectordb_router.post("/get_entities")
+async def retrieve_entities(input: Entities) -> dict:
+    logger.debug("retrieving %d entities from collection", len(input.ids))
+    try:
+        entities = await get_entities(ids=input.ids, tenant=input.tenant)
+    except CircuitOpenError as e:
+        raise unavailable(e)
+    except Exception as e:
+        logger.error(f"Error in retrieving entities from collection: {str(e)}")
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail="Error in retrieving entities from collection",
+        )
+    return {
+        "entities": [entity for entity in entities if entity is not None],
+        "missing": [i for i, entity in zip(input.ids, entities) if entity is None],
+    }
+
+
 @vectordb_router.post("/search_doc")
 async def search_entity(input: SearchEntity) -> ResponseEntities:
-    print(f"{input}")
     input_query = input.query
     input_top_k = input.top_k
     input_nprobe = input.nprobe
-    logger.info(f"searching entity {input_query} from collection")
+    logger.debug("searching entity %s from collection", input_query)
+    query_log.record(input.tenant, input_query)
     try:
         entity = await search_query(
-            query=input_query, top_k=input_top_k, nprobe=input_nprobe
+            query=input_query,
+            top_k=input_top_k,
+            nprobe=input_nprobe,
+            tenant=input.tenant,
+            collections=input.collections,
+            mode=input.mode,
         )
-        logger.info(f"{entity=}")
-        return {"responses": entity}
+        return hits_response(entity, input.fields)
+    except (CircuitOpenError, AdmissionRejected) as e:
+        raise unavailable(e)
     except Exception as e:
         logger.error(f"Error in search entity {input_query} from collection: {str(e)}")
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail=f"Error in searching entity {input_query} from collection",
         )
+
+
+@vectordb_router.post("/search_doc/batch")
+async def search_entities(input: BatchSearchEntity) -> BatchResponseEntities:
+    input_queries = input.queries
+    logger.debug("searching %d entities from collection", len(input_queries))
+    try:
+        hits = await search_queries(
+            queries=input_queries,
+            top_k=input.top_k,
+            nprobe=input.nprobe,
+            tenant=input.tenant,
+        )
+        return batch_hits_response(hits, input.fields)
+    except (CircuitOpenError, AdmissionRejected) as e:
+        raise unavailable(e)
+    except Exception as e:
+        logger.error(f"Error in batch search from collection: {str(e)}")
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail="Error in batch searching entities from collection",
+        )
@@ -11,6 +11,12 @@ from .api.routes import api_router
 from .config.settings import settings
 from .startup import startup_manager
 from .models.health_models import HealthResponse
+from .services.metrics import MetricsMiddleware, render_metrics, tracer
+from .services.vectordb_service import (
+    identifier_index_refresh_loop,
+    snapshot_refresh_loop,
+)
+from .services.warmup import save_recent_queries, warm_up
 
 # Configure logging
 logging.basicConfig(
@@ -23,8 +29,15 @@ logger = logging.getLogger(__name__)
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     """Lifespan of the app"""
-    await startup_manager.initialize_services()
+    await startup_manager.initialize_services(
+        warmup=warm_up if settings.WARMUP_ENABLED else None
+    )
+    if settings.IDENTIFIER_INDEX_ENABLED:
+        startup_manager.start_background_task(identifier_index_refresh_loop())
+    if settings.SNAPSHOT_ENABLED:
+        startup_manager.start_background_task(snapshot_refresh_loop())
     yield
+    save_recent_queries()
     await startup_manager.shutdown_services()
 
 
@@ -36,6 +49,10 @@ app = FastAPI(
     lifespan=lifespan,
 )
 
+# in-flight gauge, request latency histogram and root trace span
+if settings.METRICS_ENABLED or tracer is not None:
+    app.add_middleware(MetricsMiddleware)
+
 
 # Health check endpoint
 @app.get("/")
@@ -50,6 +67,15 @@ async def root() -> dict[str, str]:
 # MongoDB client readiness
 @app.get("/readiness", description="Milvus client readiness")
 async def readiness(response: Response) -> dict:
+    if not startup_manager.warmup_complete:
+        # connected, but the first searches would still be slow
+        response.status_code = status.HTTP_503_SERVICE_UNAVAILABLE
+        return {
+            "status": "warming_up",
+            "services_ready": False,
+            "timestamp": datetime.now(timezone.utc).isoformat(),
+            "version": settings.API_VERSION,
+        }
     try:
         response = await startup_manager.milvus_client.get_server_version()
         logger.info("Milvus connection successful!")
@@ -59,6 +85,7 @@ async def readiness(response: Response) -> dict:
             "timestamp": datetime.now(timezone.utc).isoformat(),
             "version": settings.API_VERSION,
             "milvus_version": response,
+            "pools": startup_manager.pool_stats(),
         }
         return response_data
     except Exception:
@@ -73,6 +100,14 @@ async def readiness(response: Response) -> dict:
         return HealthResponse(**response_data)
 
 
+@app.get("/metrics", description="Prometheus metrics", include_in_schema=False)
+async def metrics() -> Response:
+    if not settings.METRICS_ENABLED:
+        return Response(status_code=status.HTTP_404_NOT_FOUND)
+    body, content_type = render_metrics()
+    return Response(content=body, media_type=content_type)
+
+
 # Include the API router with all v1 endpoints
 app.include_router(api_router)
 
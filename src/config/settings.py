@@ -21,11 +21,125 @@ class Settings:
     MILVUS_CLIENT_URL: Optional[str] = os.getenv("MILVUS_CLIENT_URL")
     MILVUS_CLIENT_DATABASE: Optional[str] = os.getenv("MILVUS_CLIENT_DATABASE")
     MILVUS_CLIENT_COLLECTION: Optional[str] = os.getenv("MILVUS_CLIENT_COLLECTION")
+    MILVUS_POOL_SIZE: int = int(os.getenv("MILVUS_POOL_SIZE", "1"))
+    MILVUS_POOL_STRATEGY: str = os.getenv("MILVUS_POOL_STRATEGY", "round_robin")
 
     # OpenAI Configuration
     OPENAI_BASE_URL: Optional[str] = os.getenv("OPENAI_BASE_URL")
     OPENAI_API_KEY: Optional[str] = os.getenv("OPENAI_API_KEY")
     OPENAI_MODEL: Optional[str] = os.getenv("OPENAI_MODEL_LARGE")
+    OPENAI_MAX_CONNECTIONS: int = int(os.getenv("OPENAI_MAX_CONNECTIONS", "1000"))
+    OPENAI_MAX_KEEPALIVE_CONNECTIONS: int = int(
+        os.getenv("OPENAI_MAX_KEEPALIVE_CONNECTIONS", "100")
+    )
+    OPENAI_KEEPALIVE_EXPIRY_S: float = float(
+        os.getenv("OPENAI_KEEPALIVE_EXPIRY_S", "60")
+    )
+
+    # Embedding cache Configuration
+    EMBEDDING_CACHE_SIZE: int = int(os.getenv("EMBEDDING_CACHE_SIZE", "4096"))
+    EMBEDDING_CACHE_TTL: float = float(os.getenv("EMBEDDING_CACHE_TTL", "3600"))
+    EMBEDDING_CACHE_COMPACT: bool = (
+        os.getenv("EMBEDDING_CACHE_COMPACT", "true").lower() == "true"
+    )
+
+    # Embedding micro-batching Configuration
+    EMBEDDING_BATCH_ENABLED: bool = (
+        os.getenv("EMBEDDING_BATCH_ENABLED", "true").lower() == "true"
+    )
+    EMBEDDING_BATCH_MAX_SIZE: int = int(os.getenv("EMBEDDING_BATCH_MAX_SIZE", "64"))
+    EMBEDDING_BATCH_MAX_WAIT_MS: float = float(
+        os.getenv("EMBEDDING_BATCH_MAX_WAIT_MS", "5")
+    )
+
+    # Search result cache Configuration
+    SEARCH_CACHE_SIZE: int = int(os.getenv("SEARCH_CACHE_SIZE", "2048"))
+    SEARCH_CACHE_TTL: float = float(os.getenv("SEARCH_CACHE_TTL", "3600"))
+    SEARCH_CACHE_VERSION_CHECK_S: float = float(
+        os.getenv("SEARCH_CACHE_VERSION_CHECK_S", "5")
+    )
+
+    # Entity lookup Configuration
+    ENTITY_CACHE_SIZE: int = int(os.getenv("ENTITY_CACHE_SIZE", "4096"))
+    ENTITY_BATCH_ENABLED: bool = (
+        os.getenv("ENTITY_BATCH_ENABLED", "true").lower() == "true"
+    )
+    ENTITY_BATCH_MAX_SIZE: int = int(os.getenv("ENTITY_BATCH_MAX_SIZE", "100"))
+    ENTITY_BATCH_MAX_WAIT_MS: float = float(os.getenv("ENTITY_BATCH_MAX_WAIT_MS", "2"))
+
+    # Identifier index Configuration
+    IDENTIFIER_INDEX_ENABLED: bool = (
+        os.getenv("IDENTIFIER_INDEX_ENABLED", "true").lower() == "true"
+    )
+    IDENTIFIER_INDEX_REFRESH_S: float = float(
+        os.getenv("IDENTIFIER_INDEX_REFRESH_S", "300")
+    )
+    IDENTIFIER_FILL_WITH_ANN: bool = (
+        os.getenv("IDENTIFIER_FILL_WITH_ANN", "false").lower() == "true"
+    )
+
+    # Vector profile of the collections fed without a `vector_profile` property
+    VECTOR_PROFILE: str = os.getenv("VECTOR_PROFILE", "default")
+    # profile written by scripts.tune_index, its search params become the defaults
+    SEARCH_PROFILE_PATH: Optional[str] = os.getenv("SEARCH_PROFILE_PATH")
+
+    # Response Configuration, characters of text per hit with `fields=snippet`
+    RESPONSE_SNIPPET_CHARS: int = int(os.getenv("RESPONSE_SNIPPET_CHARS", "200"))
+
+    # Two-stage table-then-column search Configuration
+    MILVUS_TABLES_COLLECTION: str = os.getenv(
+        "MILVUS_TABLES_COLLECTION", "data_dictionary_tables"
+    )
+    HIERARCHICAL_TOP_TABLES: int = int(os.getenv("HIERARCHICAL_TOP_TABLES", "5"))
+
+    # Collections a search may name in `collections`, comma separated, the
+    # served and tables collections if unset
+    SEARCH_COLLECTIONS: list[str] = [
+        name.strip()
+        for name in os.getenv("SEARCH_COLLECTIONS", "").split(",")
+        if name.strip()
+    ]
+
+    # Embedding admission control Configuration, limits learned from OpenAI
+    ADMISSION_ENABLED: bool = os.getenv("ADMISSION_ENABLED", "true").lower() == "true"
+    OPENAI_RPM_LIMIT: float = float(os.getenv("OPENAI_RPM_LIMIT", "3000"))
+    OPENAI_TPM_LIMIT: float = float(os.getenv("OPENAI_TPM_LIMIT", "1000000"))
+    ADMISSION_MAX_WAIT_MS: float = float(os.getenv("ADMISSION_MAX_WAIT_MS", "1000"))
+
+    # Upstream hedging and circuit breaking Configuration
+    HEDGE_ENABLED: bool = os.getenv("HEDGE_ENABLED", "true").lower() == "true"
+    HEDGE_PERCENTILE: float = float(os.getenv("HEDGE_PERCENTILE", "95"))
+    HEDGE_MIN_DELAY_MS: float = float(os.getenv("HEDGE_MIN_DELAY_MS", "10"))
+    CIRCUIT_FAILURE_THRESHOLD: int = int(os.getenv("CIRCUIT_FAILURE_THRESHOLD", "5"))
+    CIRCUIT_RESET_S: float = float(os.getenv("CIRCUIT_RESET_S", "30"))
+
+    # Local snapshot search Configuration
+    SNAPSHOT_ENABLED: bool = os.getenv("SNAPSHOT_ENABLED", "false").lower() == "true"
+    SNAPSHOT_DIR: str = os.getenv("SNAPSHOT_DIR", "/tmp/vectordb_snapshots")
+    SNAPSHOT_MAX_ROWS: int = int(os.getenv("SNAPSHOT_MAX_ROWS", "200000"))
+    SNAPSHOT_REFRESH_S: float = float(os.getenv("SNAPSHOT_REFRESH_S", "300"))
+
+    # Warm-up Configuration
+    WARMUP_ENABLED: bool = os.getenv("WARMUP_ENABLED", "true").lower() == "true"
+    WARMUP_QUERIES_PATH: Optional[str] = os.getenv("WARMUP_QUERIES_PATH")
+    WARMUP_TRAFFIC_PATH: Optional[str] = os.getenv("WARMUP_TRAFFIC_PATH")
+    WARMUP_MAX_QUERIES: int = int(os.getenv("WARMUP_MAX_QUERIES", "50"))
+    WARMUP_CONCURRENCY: int = int(os.getenv("WARMUP_CONCURRENCY", "4"))
+    WARMUP_TIMEOUT_S: float = float(os.getenv("WARMUP_TIMEOUT_S", "120"))
+
+    # Observability Configuration
+    METRICS_ENABLED: bool = os.getenv("METRICS_ENABLED", "true").lower() == "true"
+    TRACING_ENABLED: bool = os.getenv("TRACING_ENABLED", "false").lower() == "true"
+
+    def searchable_collections(self) -> list[str]:
+        """the collections a search request may name"""
+        if self.SEARCH_COLLECTIONS:
+            return self.SEARCH_COLLECTIONS
+        return [
+            name
+            for name in (self.MILVUS_CLIENT_COLLECTION, self.MILVUS_TABLES_COLLECTION)
+            if name
+        ]
 
     @classmethod
     def validate(cls) -> None:
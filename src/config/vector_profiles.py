@@ -0,0 +1,168 @@
+from pydantic import BaseModel, Field, model_validator
+from src.config.settings import settings
+from typing import Literal, Optional
+import logging
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+
+class VectorProfile(BaseModel):
+    """
+    How the embeddings of a collection are stored, indexed and searched.
+
+    text-embedding-3 embeddings can be shortened by keeping their leading
+    `dimensions` and normalizing them again, which is what the `dimensions`
+    parameter of the embeddings endpoint does; the full embedding is kept in
+    the caches and reduced when stored or searched.
+    """
+
+    name: str = Field(description="stored in the `vector_profile` collection property")
+    dimensions: Optional[int] = Field(
+        default=None, description="leading dimensions kept, all of them if None"
+    )
+    vector_type: Literal["FLOAT_VECTOR", "FLOAT16_VECTOR", "BINARY_VECTOR"] = (
+        "FLOAT_VECTOR"
+    )
+    index_type: str = "IVF_FLAT"
+    metric_type: str = "COSINE"
+    index_params: dict = Field(default={"nlist": 128})
+    search_params: dict = Field(default={"nprobe": 10})
+    rerank: int = Field(
+        default=0,
+        ge=0,
+        description="candidates fetched per hit and reranked with the stored "
+        "full-precision vectors, 0 to disable",
+    )
+
+    @model_validator(mode="after")
+    def check_rerank(self) -> "VectorProfile":
+        if self.rerank and self.vector_type != "FLOAT_VECTOR":
+            raise ValueError("rerank needs the full-precision FLOAT_VECTOR storage")
+        return self
+
+    def dim(self, embedding_dim: int = 1536) -> int:
+        """dimension of the vector field, in bits for binary vectors"""
+        return self.dimensions or embedding_dim
+
+    def reduce(self, vector) -> np.ndarray:
+        """the embedding shortened to `dimensions`, as float32"""
+        vector = np.asarray(vector, dtype=np.float32)
+        if self.dimensions and self.dimensions < len(vector):
+            vector = vector[: self.dimensions]
+            vector = vector / np.linalg.norm(vector)
+        return vector
+
+    def encode(self, vector):
+        """the embedding as stored in, or searched against, the vector field"""
+        vector = self.reduce(vector)
+        if self.vector_type == "FLOAT16_VECTOR":
+            return vector.astype(np.float16)
+        if self.vector_type == "BINARY_VECTOR":
+            # one sign bit per dimension
+            return np.packbits(vector > 0).tobytes()
+        return vector.tolist()
+
+    def similarity(self, distance: float) -> float:
+        """Milvus distance as a similarity, higher is better for every metric"""
+        if self.metric_type == "HAMMING":
+            return 1 - distance / self.dim()
+        return distance
+
+    def same_storage(self, other: "VectorProfile") -> bool:
+        """whether both profiles store and index the vectors the same way"""
+        return (
+            self.dim() == other.dim()
+            and self.vector_type == other.vector_type
+            and self.index_type == other.index_type
+            and self.metric_type == other.metric_type
+            and self.index_params == other.index_params
+        )
+
+    def search_params_for(self, nprobe: Optional[int] = None) -> dict:
+        """Milvus search parameters, with the requested `nprobe` for IVF indexes"""
+        params = dict(self.search_params)
+        if nprobe is not None and "nprobe" in params:
+            params["nprobe"] = nprobe
+        return {"metric_type": self.metric_type, "params": params}
+
+
+DEFAULT_PROFILE = "default"
+
+# memory per 1536-d embedding: 6 KiB stored as 1536 float32
+VECTOR_PROFILES = {
+    profile.name: profile
+    for profile in [
+        VectorProfile(name=DEFAULT_PROFILE),
+        # 1 KiB, 6x smaller
+        VectorProfile(
+            name="float16_512",
+            dimensions=512,
+            vector_type="FLOAT16_VECTOR",
+        ),
+        # 512 B of index, 12x smaller, reranked with the raw vectors
+        VectorProfile(
+            name="sq8_512_rerank",
+            dimensions=512,
+            index_type="IVF_SQ8",
+            rerank=4,
+        ),
+        # 32 B of index, 192x smaller, reranked with the raw vectors
+        VectorProfile(
+            name="pq_256_rerank",
+            dimensions=256,
+            index_type="IVF_PQ",
+            index_params={"nlist": 128, "m": 32, "nbits": 8},
+            rerank=8,
+        ),
+        # 192 B, 32x smaller, Hamming distance on the sign bits
+        VectorProfile(
+            name="binary_1536",
+            vector_type="BINARY_VECTOR",
+            index_type="BIN_IVF_FLAT",
+            metric_type="HAMMING",
+        ),
+    ]
+}
+
+
+def load_vector_profile(path: str) -> Optional[VectorProfile]:
+    """read a profile written by `scripts.tune_index` and register it"""
+    try:
+        with open(path) as f:
+            profile = VectorProfile.model_validate_json(f.read())
+    except (OSError, ValueError) as e:
+        logger.warning(f"⚠️  Could not load the search profile {path}: {e}")
+        return None
+    VECTOR_PROFILES[profile.name] = profile
+    logger.info(f"search profile {profile.name} loaded from {path}")
+    return profile
+
+
+# tuned search parameters, the default ones of every collection indexed alike
+search_profile = (
+    load_vector_profile(settings.SEARCH_PROFILE_PATH)
+    if settings.SEARCH_PROFILE_PATH
+    else None
+)
+
+
+def get_vector_profile(name: Optional[str]) -> VectorProfile:
+    """the profile registered under `name`, the default one if unknown
+
+    When a tuned `search_profile` was loaded for the same storage, its search
+    parameters replace the ones of the profile.
+    """
+    profile = VECTOR_PROFILES.get(name or DEFAULT_PROFILE)
+    if profile is None:
+        logger.warning(f"⚠️  Unknown vector profile {name}, using {DEFAULT_PROFILE}")
+        profile = VECTOR_PROFILES[DEFAULT_PROFILE]
+    if (
+        search_profile is not None
+        and profile is not search_profile
+        and profile.same_storage(search_profile)
+    ):
+        return profile.model_copy(
+            update={"search_params": search_profile.search_params}
+        )
+    return profile
@@ -1,29 +1,106 @@
-from pydantic import BaseModel, Field
+from pydantic import BaseModel, Field, field_validator
+from src.config.settings import settings
+from typing import Literal, Optional
 
 
 class Entity(BaseModel):
     """model to hold an input ID for a Milvus Collection"""
 
     id: int = Field(description="the ID of the entity")
+    tenant: str = Field(description="the tenant the entity belongs to")
+
+
+class Entities(BaseModel):
+    """model to hold the input IDs of entities fetched together"""
+
+    ids: list[int] = Field(
+        description="the IDs of the entities", min_length=1, max_length=100
+    )
+    tenant: str = Field(description="the tenant the entities belong to")
 
 
 class SearchEntity(BaseModel):
     """model to hold a user query"""
 
     query: str = Field(description="the string of character to search")
+    tenant: str = Field(description="the tenant whose data dictionaries are searched")
+    top_k: int = Field(
+        default=3, description="the number of semantic search matches", ge=1, le=10
+    )
+    nprobe: Optional[int] = Field(
+        default=None,
+        description="the nprobe params in the searhc parameters, the tuned one if omitted",
+        ge=1,
+    )
+    fields: Literal["ids", "snippet", "text"] = Field(
+        default="text",
+        description="`ids` returns ids and distances only, `snippet` a truncated text",
+    )
+    collections: Optional[list[str]] = Field(
+        default=None,
+        description="the collections searched together, the served collection if omitted",
+        min_length=1,
+        max_length=8,
+    )
+    mode: Literal["flat", "hierarchical"] = Field(
+        default="flat",
+        description="`hierarchical` searches the best tables first, then their columns only",
+    )
+
+    @field_validator("collections")
+    @classmethod
+    def check_collections(cls, collections: Optional[list[str]]):
+        """only the served collections can be searched"""
+        if collections is None:
+            return collections
+        allowed = settings.searchable_collections()
+        unknown = [name for name in collections if name not in allowed]
+        if unknown:
+            raise ValueError(
+                f"unknown collections {unknown}, expected some of {allowed}"
+            )
+        return collections
+
+
+class BatchSearchEntity(BaseModel):
+    """model to hold a list of user queries searched together"""
+
+    queries: list[str] = Field(
+        description="the strings of characters to search",
+        min_length=1,
+        max_length=100,
+    )
+    tenant: str = Field(description="the tenant whose data dictionaries are searched")
     top_k: int = Field(
         default=3, description="the number of semantic search matches", ge=1, le=10
     )
-    nprobe: int = Field(
-        default=10, description="the nprobe params in the searhc parameters"
+    nprobe: Optional[int] = Field(
+        default=None,
+        description="the nprobe params in the searhc parameters, the tuned one if omitted",
+        ge=1,
+    )
+    fields: Literal["ids", "snippet", "text"] = Field(
+        default="text",
+        description="`ids` returns ids and distances only, `snippet` a truncated text",
     )
 
 
 class ResponseEntity(BaseModel):
     id: int = Field(description="the id")
     distance: float = Field(description="metric")
-    entity: dict[str, str] = Field(description="the text output of the search")
+    entity: Optional[dict[str, str]] = Field(
+        default=None, description="the text output of the search, unless only ids"
+    )
+    collection: Optional[str] = Field(
+        default=None, description="the collection of the hit, when searching several"
+    )
 
 
 class ResponseEntities(BaseModel):
     responses: list[ResponseEntity]
+
+
+class BatchResponseEntities(BaseModel):
+    """per-query hit lists, in the same order as the input queries"""
+
+    responses: list[ResponseEntities]
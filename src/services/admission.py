@@ -0,0 +1,151 @@
+from src.config.settings import settings
+from typing import Optional
+import asyncio
+import logging
+import re
+import time
+
+logger = logging.getLogger(__name__)
+
+# durations of the `x-ratelimit-reset-*` headers, e.g. `1s`, `6m0s`, `20ms`
+DURATION_PATTERN = re.compile(r"(\d+(?:\.\d+)?)(ms|s|m|h)")
+DURATION_UNITS = {"ms": 0.001, "s": 1.0, "m": 60.0, "h": 3600.0}
+
+
+def parse_duration(value: Optional[str]) -> Optional[float]:
+    """seconds of an OpenAI rate limit reset duration, None if unparsable"""
+    if not value:
+        return None
+    parts = DURATION_PATTERN.findall(value)
+    if not parts:
+        return None
+    return sum(float(amount) * DURATION_UNITS[unit] for amount, unit in parts)
+
+
+class AdmissionRejected(Exception):
+    """raised when a call would wait longer than the admission budget"""
+
+    def __init__(self, retry_after: float):
+        super().__init__(f"embedding rate budget exhausted for {retry_after:.1f}s")
+        self.retry_after = retry_after
+
+
+class TokenBucket:
+    """
+    Budget of `limit` units per minute, refilled continuously.
+
+    The level can go negative: a reservation is granted at once and its
+    caller waits until the level it found is paid back, so waiting callers
+    are served in order.
+    """
+
+    def __init__(self, limit: float):
+        self.limit = limit
+        self.level = float(limit)
+        self.updated_at = time.monotonic()
+
+    @property
+    def rate(self) -> float:
+        return self.limit / 60
+
+    def refill(self) -> None:
+        now = time.monotonic()
+        self.level = min(self.limit, self.level + (now - self.updated_at) * self.rate)
+        self.updated_at = now
+
+    def wait_for(self, amount: float) -> float:
+        """seconds until `amount` units are available, after the queued reservations"""
+        self.refill()
+        return max(0.0, (amount - self.level) / self.rate) if self.limit else 0.0
+
+
+class EmbeddingAdmission:
+    """
+    Admission control of the calls to the OpenAI embeddings endpoint.
+
+    Every call reserves one request and its estimated tokens from the
+    requests-per-minute and tokens-per-minute buckets, then waits for them.
+    A call that would wait more than `max_wait_ms` is rejected at once with
+    `AdmissionRejected`, instead of piling up until OpenAI answers 429s. The
+    limits and remaining budgets are learned from the `x-ratelimit-*` headers
+    of the responses.
+    """
+
+    def __init__(self, rpm: float, tpm: float, max_wait_ms: float = 1000.0):
+        self.requests = TokenBucket(rpm)
+        self.tokens = TokenBucket(tpm)
+        self.max_wait = max_wait_ms / 1000
+        self.admitted = 0
+        self.rejected = 0
+        self.waited = 0.0
+
+    @staticmethod
+    def estimate_tokens(texts: list[str]) -> int:
+        # ~4 characters per token in English, over-estimated
+        return sum(len(text) // 3 + 1 for text in texts)
+
+    async def acquire(self, tokens: int) -> None:
+        """wait for the budget of one call of `tokens` tokens"""
+        wait = max(self.requests.wait_for(1), self.tokens.wait_for(tokens))
+        if wait > self.max_wait:
+            self.rejected += 1
+            raise AdmissionRejected(max(wait, 1.0))
+        self.requests.level -= 1
+        self.tokens.level -= tokens
+        self.admitted += 1
+        if wait > 0:
+            self.waited += wait
+            await asyncio.sleep(wait)
+
+    def record_usage(self, estimated: int, total_tokens: Optional[int]) -> None:
+        """charge the tokens actually used instead of the estimate"""
+        if total_tokens:
+            self.tokens.level -= total_tokens - estimated
+
+    def observe_headers(self, headers) -> None:
+        """align the buckets with the rate limit state reported by OpenAI"""
+        for bucket, name in ((self.requests, "requests"), (self.tokens, "tokens")):
+            limit = headers.get(f"x-ratelimit-limit-{name}")
+            remaining = headers.get(f"x-ratelimit-remaining-{name}")
+            try:
+                if limit is not None and float(limit) != bucket.limit:
+                    logger.info(f"OpenAI {name} per minute limit is {limit}")
+                    bucket.limit = float(limit)
+                if remaining is not None:
+                    bucket.refill()
+                    bucket.level = min(bucket.level, float(remaining))
+            except ValueError:
+                continue
+
+    def observe_rate_limited(self, headers) -> None:
+        """pause the admissions until OpenAI accepts calls again after a 429"""
+        delay = parse_duration(headers.get("retry-after-ms", "") + "ms") or (
+            parse_duration(headers.get("retry-after", "") + "s")
+        )
+        delay = max(
+            delay or 1.0,
+            parse_duration(headers.get("x-ratelimit-reset-requests")) or 0.0,
+        )
+        self.requests.refill()
+        self.requests.level = min(self.requests.level, -delay * self.requests.rate)
+
+    def stats(self) -> dict:
+        self.requests.refill()
+        self.tokens.refill()
+        return {
+            "rpm_limit": self.requests.limit,
+            "tpm_limit": self.tokens.limit,
+            "requests_available": self.requests.level,
+            "tokens_available": self.tokens.level,
+            "admitted": self.admitted,
+            "rejected": self.rejected,
+            "waited_s": self.waited,
+        }
+
+
+# admission control of the OpenAI embeddings calls
+embedding_admission = EmbeddingAdmission(
+    rpm=settings.OPENAI_RPM_LIMIT,
+    tpm=settings.OPENAI_TPM_LIMIT,
+    max_wait_ms=settings.ADMISSION_MAX_WAIT_MS,
+)
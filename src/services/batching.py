@@ -0,0 +1,75 @@
+from typing import Any, Hashable
+import asyncio
+
+
+class MicroBatcher:
+    """
+    Coalesces concurrent lookups of the same group into a single upstream call.
+
+    Keys submitted within `max_wait_ms` of each other for the same group are
+    fetched together (at most `max_batch_size` per call) and each result is
+    routed back to its callers. Identical keys waiting in the same batch share
+    one upstream input. Subclasses implement `fetch`.
+    """
+
+    def __init__(self, max_batch_size: int = 64, max_wait_ms: float = 5.0):
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait_ms / 1000
+        self.upstream_calls = 0
+        self._pending: dict[Hashable, dict[Hashable, asyncio.Future]] = {}
+        self._timers: dict[Hashable, asyncio.TimerHandle] = {}
+        self._tasks: set[asyncio.Task] = set()
+
+    async def fetch(self, group: Any, keys: list) -> list:
+        """single upstream call, one result per key"""
+        raise NotImplementedError
+
+    async def submit(self, group: Hashable, keys: list) -> list:
+        """the results of `keys`, in order, fetched with the concurrent lookups"""
+        loop = asyncio.get_running_loop()
+        futures = []
+        for key in keys:
+            pending = self._pending.setdefault(group, {})
+            future = pending.get(key)
+            if future is None:
+                future = loop.create_future()
+                pending[key] = future
+                if len(pending) >= self.max_batch_size:
+                    self._flush(group)
+                elif group not in self._timers:
+                    self._timers[group] = loop.call_later(
+                        self.max_wait, self._flush, group
+                    )
+            futures.append(future)
+        # shield the shared futures so a cancelled caller does not cancel the others
+        return list(await asyncio.gather(*(asyncio.shield(f) for f in futures)))
+
+    def _flush(self, group: Hashable) -> None:
+        timer = self._timers.pop(group, None)
+        if timer is not None:
+            timer.cancel()
+        pending = self._pending.pop(group, None)
+        if pending:
+            task = asyncio.ensure_future(self._send(pending, group))
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+
+    async def _send(self, pending: dict[Hashable, asyncio.Future], group) -> None:
+        self.upstream_calls += 1
+        try:
+            results = await self.fetch(group, list(pending))
+        except Exception as e:
+            for future in pending.values():
+                if not future.done():
+                    future.set_exception(e)
+            return
+        for future, result in zip(pending.values(), results):
+            if not future.done():
+                future.set_result(result)
+
+    def stats(self) -> dict:
+        return {
+            "max_batch_size": self.max_batch_size,
+            "max_wait_ms": self.max_wait * 1000,
+            "upstream_calls": self.upstream_calls,
+        }
@@ -0,0 +1,95 @@
+from array import array
+from collections import OrderedDict
+from typing import Any, Hashable, Optional
+import time
+
+
+class LRUCache:
+    """
+    Bounded in-process LRU cache with an optional time-to-live per entry.
+    """
+
+    def __init__(self, max_size: int = 1024, ttl: Optional[float] = None):
+        self.max_size = max_size
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._data: OrderedDict[Hashable, tuple[float, Any]] = OrderedDict()
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        """returns the cached value for `key`, or `default` on a miss or expired entry"""
+        item = self._data.get(key)
+        if item is None:
+            self.misses += 1
+            return default
+        stored_at, value = item
+        if self.ttl is not None and time.monotonic() - stored_at > self.ttl:
+            # kept for `get_stale` until it is replaced or evicted
+            self.misses += 1
+            return default
+        self._data.move_to_end(key)
+        self.hits += 1
+        return value
+
+    def get_stale(self, key: Hashable, default: Any = None) -> Any:
+        """returns the value stored for `key` even if it expired"""
+        item = self._data.get(key)
+        return default if item is None else item[1]
+
+    def set(self, key: Hashable, value: Any) -> None:
+        """stores `value` under `key`, evicting the least recently used entries"""
+        if self.max_size <= 0:
+            return
+        self._data[key] = (time.monotonic(), value)
+        self._data.move_to_end(key)
+        while len(self._data) > self.max_size:
+            self._data.popitem(last=False)
+
+    def clear(self) -> None:
+        self._data.clear()
+
+    def stats(self) -> dict:
+        """returns the size and hit/miss counters of the cache"""
+        lookups = self.hits + self.misses
+        return {
+            "size": len(self._data),
+            "max_size": self.max_size,
+            "ttl": self.ttl,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+        }
+
+
+class EmbeddingCache(LRUCache):
+    """
+    LRU/TTL cache for query embeddings keyed by (model, normalized text).
+
+    When `compact` is set, vectors are stored as float32 arrays (4 bytes per
+    dimension) instead of lists of Python floats (~32 bytes per dimension).
+    """
+
+    def __init__(
+        self, max_size: int = 1024, ttl: Optional[float] = None, compact: bool = True
+    ):
+        super().__init__(max_size=max_size, ttl=ttl)
+        self.compact = compact
+
+    @staticmethod
+    def make_key(text: str, model: str) -> tuple[str, str]:
+        """normalize the text so that trivially different queries share an entry"""
+        return model, " ".join(text.split())
+
+    def get_embedding(self, text: str, model: str) -> Optional[list[float]]:
+        vector = self.get(self.make_key(text, model))
+        if vector is None:
+            return None
+        return vector.tolist() if self.compact else vector
+
+    def set_embedding(self, text: str, model: str, vector: list[float]) -> None:
+        self.set(
+            self.make_key(text, model), array("f", vector) if self.compact else vector
+        )
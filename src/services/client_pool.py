@@ -0,0 +1,64 @@
+from typing import Any
+import asyncio
+import inspect
+import itertools
+
+
+class MilvusClientPool:
+    """
+    Spreads the calls of the services over several `AsyncMilvusClient`s.
+
+    Each client owns its gRPC channel, so concurrent requests no longer queue
+    on a single connection. The pool exposes the coroutine methods of the
+    clients, e.g. `pool.search(...)`, each call going to the next client
+    (`round_robin`) or to the one with the fewest calls in flight
+    (`least_busy`).
+    """
+
+    STRATEGIES = ("round_robin", "least_busy")
+
+    def __init__(self, clients: list, strategy: str = "round_robin"):
+        if not clients:
+            raise ValueError("a client pool needs at least one client")
+        if strategy not in self.STRATEGIES:
+            raise ValueError(f"unknown client pool strategy {strategy}")
+        self.clients = clients
+        self.strategy = strategy
+        self.in_flight = [0] * len(clients)
+        self.calls = [0] * len(clients)
+        self._round_robin = itertools.cycle(range(len(clients)))
+
+    def __len__(self) -> int:
+        return len(self.clients)
+
+    def _select(self) -> int:
+        if self.strategy == "least_busy":
+            return min(range(len(self.clients)), key=self.in_flight.__getitem__)
+        return next(self._round_robin)
+
+    def __getattr__(self, name: str) -> Any:
+        attribute = getattr(self.clients[0], name)
+        if not inspect.iscoroutinefunction(attribute):
+            return attribute
+
+        async def call(*args, **kwargs):
+            i = self._select()
+            self.in_flight[i] += 1
+            self.calls[i] += 1
+            try:
+                return await getattr(self.clients[i], name)(*args, **kwargs)
+            finally:
+                self.in_flight[i] -= 1
+
+        return call
+
+    async def close(self) -> None:
+        await asyncio.gather(*(client.close() for client in self.clients))
+
+    def stats(self) -> dict:
+        return {
+            "size": len(self.clients),
+            "strategy": self.strategy,
+            "in_flight": list(self.in_flight),
+            "calls": list(self.calls),
+        }
@@ -0,0 +1,139 @@
+from typing import Optional
+import re
+
+# column and table names as formatted by the feeders' context builders
+COLUMN_NAME_PATTERN = re.compile(r"^\s*name: (.+?)\s*$", re.MULTILINE)
+COLUMN_TABLE_PATTERN = re.compile(r"^\s*from table: (.+?)\s*$", re.MULTILINE)
+TABLE_NAME_PATTERN = re.compile(r"^\s*table name:\s*(.+?)\s*$", re.MULTILINE)
+
+# queries looking like a literal identifier: `OrderNbr`, `catalog.schema.table`
+IDENTIFIER_PATTERN = re.compile(r"^[\w$#.\-]+$")
+
+
+def entity_identifiers(text: str) -> list[str]:
+    """the names under which an entity can be looked up, parsed from its text
+
+    A column is found by `column`, `table.column` and `catalog.schema.table.column`,
+    a table by `table` and `catalog.schema.table`.
+    """
+    names = []
+    table = TABLE_NAME_PATTERN.search(text)
+    if table:
+        full_name = table.group(1)
+        names += [full_name, full_name.rsplit(".", 1)[-1]]
+    column = COLUMN_NAME_PATTERN.search(text)
+    if column:
+        names.append(column.group(1))
+        column_table = COLUMN_TABLE_PATTERN.search(text)
+        if column_table:
+            full_name = column_table.group(1)
+            names += [
+                f"{full_name}.{column.group(1)}",
+                f"{full_name.rsplit('.', 1)[-1]}.{column.group(1)}",
+            ]
+    return names
+
+
+def _tenant_scope(tenant: Optional[str]) -> str:
+    """prefix of the index keys of a tenant, so tenants never see each other"""
+    return f"{tenant}\0" if tenant else ""
+
+
+class IdentifierIndex:
+    """
+    In-process index of column and table names, answering literal identifier
+    queries without an embedding or an ANN search.
+
+    Names are matched case-insensitively, exactly through a hash map or by
+    prefix through a trie. Entities holding a `tenant` are only found by the
+    lookups of that tenant.
+    """
+
+    def __init__(self):
+        self.entities: dict[int, str] = {}
+        self._exact: dict[str, list[int]] = {}
+        self._trie: dict = {}
+        self.version: Optional[tuple] = None
+
+    def __len__(self) -> int:
+        return len(self.entities)
+
+    def build(self, entities: list[dict], version: Optional[tuple] = None) -> None:
+        """(re)build the index from entities holding an `id`, a `text` and a `tenant`"""
+        index = IdentifierIndex()
+        for entity in entities:
+            entity_id, text = entity["id"], entity["text"]
+            index.entities[entity_id] = text
+            scope = _tenant_scope(entity.get("tenant"))
+            for name in entity_identifiers(text):
+                index._add(scope + name.lower(), entity_id)
+        # swap at once, concurrent lookups keep seeing a complete index
+        self.entities, self._exact, self._trie = (
+            index.entities,
+            index._exact,
+            index._trie,
+        )
+        self.version = version
+
+    def _add(self, name: str, entity_id: int) -> None:
+        ids = self._exact.setdefault(name, [])
+        if entity_id in ids:
+            return
+        ids.append(entity_id)
+        node = self._trie
+        for char in name:
+            node = node.setdefault(char, {})
+        node.setdefault("", []).append(entity_id)
+
+    def _prefixed(self, prefix: str, limit: int) -> list[tuple[str, int]]:
+        """(name, id) of the names starting with `prefix`, shortest names first"""
+        node = self._trie
+        for char in prefix:
+            node = node.get(char)
+            if node is None:
+                return []
+        found = []
+        level = [(prefix, node)]
+        while level and len(found) < limit:
+            next_level = []
+            for name, node in level:
+                for key, child in node.items():
+                    if key == "":
+                        found += [(name, entity_id) for entity_id in child]
+                    else:
+                        next_level.append((name + key, child))
+            level = next_level
+        return found
+
+    def lookup(
+        self, query: str, limit: int, tenant: Optional[str] = None
+    ) -> list[dict]:
+        """exact then prefix matches of `query`, shaped like Milvus search hits
+
+        Exact matches get a distance of 1, prefix matches the fraction of the
+        name covered by the query.
+        """
+        query = query.strip()
+        if not self.entities or not IDENTIFIER_PATTERN.match(query):
+            return []
+        scope = _tenant_scope(tenant)
+        key = scope + query.lower()
+        hits: dict[int, float] = {}
+        for entity_id in self._exact.get(key, []):
+            hits.setdefault(entity_id, 1.0)
+        if len(hits) < limit:
+            for name, entity_id in self._prefixed(key, limit * 4):
+                hits.setdefault(entity_id, len(query) / (len(name) - len(scope)))
+        ranked = sorted(hits.items(), key=lambda hit: -hit[1])[:limit]
+        return [
+            {
+                "id": entity_id,
+                "distance": distance,
+                "entity": {"text": self.entities[entity_id]},
+            }
+            for entity_id, distance in ranked
+        ]
+
+
+# identifier index of the served collection
+identifier_index = IdentifierIndex()
@@ -0,0 +1,157 @@
+from contextlib import nullcontext
+from prometheus_client import (
+    CONTENT_TYPE_LATEST,
+    Counter,
+    Gauge,
+    Histogram,
+    generate_latest,
+)
+from src.config.settings import settings
+import time
+
+try:
+    from opentelemetry import trace
+except ImportError:  # tracing is optional
+    trace = None
+
+# latency buckets from 1ms to 10s
+LATENCY_BUCKETS = (
+    0.001,
+    0.0025,
+    0.005,
+    0.01,
+    0.025,
+    0.05,
+    0.1,
+    0.25,
+    0.5,
+    1.0,
+    2.5,
+    5.0,
+    10.0,
+)
+
+STAGE_SECONDS = Histogram(
+    "vectordb_stage_duration_seconds",
+    "time spent in each stage of a request",
+    ["stage"],
+    buckets=LATENCY_BUCKETS,
+)
+REQUEST_SECONDS = Histogram(
+    "vectordb_http_request_duration_seconds",
+    "time spent serving a request",
+    ["method", "path", "status"],
+    buckets=LATENCY_BUCKETS,
+)
+IN_FLIGHT = Gauge(
+    "vectordb_http_requests_in_flight",
+    "requests being served",
+)
+OPENAI_TOKENS = Counter(
+    "vectordb_openai_embedding_tokens_total",
+    "tokens sent to the OpenAI embeddings endpoint",
+    ["model"],
+)
+OPENAI_INPUTS = Counter(
+    "vectordb_openai_embedding_inputs_total",
+    "texts sent to the OpenAI embeddings endpoint",
+    ["model"],
+)
+
+# no-op spans unless an OpenTelemetry SDK is configured by the deployment
+tracer = (
+    trace.get_tracer("src") if trace is not None and settings.TRACING_ENABLED else None
+)
+
+_DISABLED = nullcontext()
+
+
+class _Stage:
+    """times a stage into `STAGE_SECONDS` and wraps it in a trace span"""
+
+    __slots__ = ("name", "start", "span")
+
+    def __init__(self, name: str):
+        self.name = name
+        self.span = None
+
+    def __enter__(self):
+        if tracer is not None:
+            self.span = tracer.start_as_current_span(self.name)
+            self.span.__enter__()
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        if settings.METRICS_ENABLED:
+            STAGE_SECONDS.labels(self.name).observe(time.perf_counter() - self.start)
+        if self.span is not None:
+            return self.span.__exit__(*exc_info)
+        return False
+
+
+def stage(name: str):
+    """context manager measuring one stage of a request, e.g. `embedding`
+
+    When both metrics and tracing are disabled it is a shared no-op.
+    """
+    if tracer is None and not settings.METRICS_ENABLED:
+        return _DISABLED
+    return _Stage(name)
+
+
+def record_embedding_usage(model: str, num_inputs: int, usage) -> None:
+    """count the inputs and tokens of an OpenAI embeddings call"""
+    if not settings.METRICS_ENABLED:
+        return
+    OPENAI_INPUTS.labels(model).inc(num_inputs)
+    total_tokens = getattr(usage, "total_tokens", None)
+    if total_tokens:
+        OPENAI_TOKENS.labels(model).inc(total_tokens)
+
+
+def render_metrics() -> tuple[bytes, str]:
+    """the metrics in the Prometheus text format, with their content type"""
+    return generate_latest(), CONTENT_TYPE_LATEST
+
+
+class MetricsMiddleware:
+    """
+    ASGI middleware tracking the in-flight requests and the request latency
+    of each route.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        status_code = 500
+
+        async def send_with_status(message):
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+            await send(message)
+
+        span = (
+            tracer.start_as_current_span(f"{scope['method']} {scope['path']}")
+            if tracer is not None
+            else _DISABLED
+        )
+        IN_FLIGHT.inc()
+        start = time.perf_counter()
+        try:
+            with span:
+                await self.app(scope, receive, send_with_status)
+        finally:
+            IN_FLIGHT.dec()
+            # the router stores the matched route in the shared scope; the API
+            # paths have no path parameters, unmatched ones share one label
+            path = scope["path"] if scope.get("route") is not None else "unmatched"
+            REQUEST_SECONDS.labels(scope["method"], path, str(status_code)).observe(
+                time.perf_counter() - start
+            )
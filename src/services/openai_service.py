@@ -1,39 +1,248 @@
+from openai import RateLimitError
 from src.startup import startup_manager
+from src.config.settings import settings
+from src.config.vector_profiles import VectorProfile, get_vector_profile
+from src.services.admission import embedding_admission
+from src.services.batching import MicroBatcher
+from src.services.cache import EmbeddingCache
+from src.services.metrics import record_embedding_usage, stage
+from src.services.resilience import milvus_upstream, openai_upstream
+from src.services.snapshot import snapshots
+from typing import Optional
+import asyncio
 import logging
+import numpy as np
 
 logger = logging.getLogger(__name__)
 
+# in-process cache of query embeddings, shared by all requests
+embedding_cache = EmbeddingCache(
+    max_size=settings.EMBEDDING_CACHE_SIZE,
+    ttl=settings.EMBEDDING_CACHE_TTL,
+    compact=settings.EMBEDDING_CACHE_COMPACT,
+)
 
-async def embed_text(texts, model="text-embedding-3-small"):
+
+async def _request_embeddings(texts: list[str], model: str):
+    """`embeddings.create`, learning the rate limits from the response headers"""
+    embeddings = startup_manager.openai_client.embeddings
+    raw = getattr(embeddings, "with_raw_response", None)
+    if raw is None:  # stand-ins of the tests and benchmarks
+        return await embeddings.create(input=texts, model=model)
+    response = await raw.create(input=texts, model=model)
+    embedding_admission.observe_headers(response.headers)
+    return response.parse()
+
+
+async def _create_embeddings(texts: list[str], model: str) -> list[list[float]]:
+    """single upstream call to the OpenAI embeddings endpoint
+
+    The call waits for its share of the rate limits, or is rejected with
+    `AdmissionRejected` when that would take longer than the admission budget.
+    """
+    tokens = embedding_admission.estimate_tokens(texts)
+    if settings.ADMISSION_ENABLED:
+        await embedding_admission.acquire(tokens)
+    with stage("openai_embeddings"):
+        try:
+            # not hedged, a second request would not be charged to the budget
+            response = await openai_upstream.call(
+                lambda: _request_embeddings(texts, model), hedge=False
+            )
+        except RateLimitError as e:
+            embedding_admission.observe_rate_limited(e.response.headers)
+            raise
+    usage = getattr(response, "usage", None)
+    embedding_admission.record_usage(tokens, getattr(usage, "total_tokens", None))
+    record_embedding_usage(model, len(texts), usage)
+    return [item.embedding for item in response.data]
+
+
+class EmbeddingBatcher(MicroBatcher):
+    """
+    Coalesces concurrent embedding requests into a single `embeddings.create` call.
+
+    Texts of the same model submitted within `max_wait_ms` of each other are
+    sent together and each vector is routed back to its caller.
+    """
+
+    async def embed(self, texts: list[str], model: str) -> list[list[float]]:
+        return await self.submit(model, texts)
+
+    async def fetch(self, model: str, texts: list[str]) -> list[list[float]]:
+        return await _create_embeddings(texts, model)
+
+
+# micro-batcher gathering concurrent query embeddings into one upstream call
+embedding_batcher = EmbeddingBatcher(
+    max_batch_size=settings.EMBEDDING_BATCH_MAX_SIZE,
+    max_wait_ms=settings.EMBEDDING_BATCH_MAX_WAIT_MS,
+)
+
+
+async def embed_text(texts, model="text-embedding-3-small", coalesce=True):
     """
     Convert raw text into embedding vectors using OpenAI embeddings.
+
+    Embeddings already in `embedding_cache` are served from memory, only the
+    misses are sent to OpenAI, coalesced with concurrent requests by
+    `embedding_batcher` when batching is enabled and `coalesce` is set.
     """
     if isinstance(texts, str):
         texts = [texts]  # Convert single string to list for consistency
 
-    response = await startup_manager.openai_client.embeddings.create(
-        input=texts, model=model
-    )
-    return [item.embedding for item in response.data]
+    embeddings = [embedding_cache.get_embedding(text, model) for text in texts]
+    misses = [i for i, embedding in enumerate(embeddings) if embedding is None]
+    if not misses:
+        return embeddings
+
+    miss_texts = [texts[i] for i in misses]
+    if settings.EMBEDDING_BATCH_ENABLED and coalesce:
+        vectors = await embedding_batcher.embed(miss_texts, model)
+    else:
+        vectors = await _create_embeddings(miss_texts, model)
+    for i, vector in zip(misses, vectors):
+        embeddings[i] = vector
+        embedding_cache.set_embedding(texts[i], model, vector)
+    return embeddings
+
+
+def _rerank(
+    query_vector: np.ndarray, hits: list, top_k: int, output_fields: list[str]
+) -> list[dict]:
+    """reorder candidate hits by cosine similarity with their stored vectors"""
+    vectors = np.asarray([hit["entity"]["embeddings"] for hit in hits], np.float32)
+    scores = vectors @ query_vector
+    scores /= np.linalg.norm(vectors, axis=1) * np.linalg.norm(query_vector) + 1e-12
+    return [
+        {
+            "id": hits[i]["id"],
+            "distance": float(scores[i]),
+            "entity": {field: hits[i]["entity"][field] for field in output_fields},
+        }
+        for i in np.argsort(-scores)[:top_k]
+    ]
+
+
+async def _search_vectors(
+    query_vectors: list,
+    top_k: int,
+    nprobe: Optional[int],
+    collection_name: Optional[str],
+    filter: str,
+    profile: Optional[VectorProfile],
+    output_fields: Optional[list[str]] = None,
+) -> list:
+    """search full-size query embeddings in a collection stored with `profile`
+
+    The embeddings are reduced and encoded like the stored vectors, and with
+    `profile.rerank` more candidates are fetched and reranked. Collections with
+    a local snapshot are searched in process unless the filter is unsupported.
+    The hits hold the `output_fields` of their entity, the text by default.
+    """
+    output_fields = output_fields or ["text"]
+    collection_name = collection_name or startup_manager.milvus_collection
+    snapshot = snapshots.get(collection_name) if settings.SNAPSHOT_ENABLED else None
+    if snapshot is not None:
+        try:
+            with stage("snapshot_search"):
+                # numpy releases the GIL, the event loop keeps serving meanwhile
+                res = await asyncio.to_thread(
+                    snapshot.search, query_vectors, top_k, filter, output_fields
+                )
+            if res is not None:
+                return res
+        except Exception as e:
+            logger.warning(f"⚠️  Snapshot search failed, searching Milvus: {e}")
 
+    profile = profile or get_vector_profile(None)
+    search_fields = list(output_fields)
+    limit = top_k
+    if profile.rerank:
+        search_fields.append("embeddings")
+        limit = top_k * profile.rerank
 
-async def search_doc(query: str, top_k: int, nprobe: int):
-    """ "semantic search for document in collection"""
-    logger.info(f"document: {query}")
-    query_vector = await embed_text(texts=query)
+    with stage("milvus_search"):
+        data = [profile.encode(vector) for vector in query_vectors]
+        res = await milvus_upstream.call(
+            lambda: startup_manager.milvus_client.search(
+                collection_name=collection_name,
+                data=data,
+                limit=limit,
+                filter=filter,
+                search_params=profile.search_params_for(nprobe),  # Search parameters
+                output_fields=search_fields,
+            )
+        )
 
-    search_params = {"metric_type": "COSINE", "params": {"nprobe": nprobe}}
+    if profile.rerank:
+        with stage("rerank"):
+            return [
+                _rerank(profile.reduce(vector), hits, top_k, output_fields)
+                for vector, hits in zip(query_vectors, res)
+            ]
+    if profile.metric_type != "COSINE":
+        for hits in res:
+            for hit in hits:
+                hit["distance"] = profile.similarity(hit["distance"])
+    return list(res)
+
+
+async def search_doc(
+    query: str,
+    top_k: int,
+    nprobe: Optional[int],
+    collection_name: Optional[str] = None,
+    query_vector: Optional[list[float]] = None,
+    filter: str = "",
+    profile: Optional[VectorProfile] = None,
+    output_fields: Optional[list[str]] = None,
+):
+    """ "semantic search for document in collection
+
+    Searches the served collection unless `collection_name` is given, and
+    embeds the query unless its `query_vector` is given. `filter` is a Milvus
+    boolean expression restricting the searched entities, `profile` the
+    vector profile the collection was fed with, `output_fields` the entity
+    fields of the hits, the text by default.
+    """
+    logger.debug("document: %s", query)
+    if query_vector is None:
+        with stage("embedding"):
+            query_vector = (await embed_text(texts=query))[0]
 
     # Single vector search
-    res = await startup_manager.milvus_client.search(
-        collection_name=startup_manager.milvus_collection,  # Replace with the actual name of your collection
-        # Replace with your query vector
-        data=query_vector,
-        limit=top_k,
-        search_params=search_params,  # Search parameters
-        output_fields=["text"],
+    res = await _search_vectors(
+        [query_vector],
+        top_k=top_k,
+        nprobe=nprobe,
+        collection_name=collection_name,
+        filter=filter,
+        profile=profile,
+        output_fields=output_fields,
     )
 
-    print(res[0])
-
     return res[0]
+
+
+async def search_docs(
+    queries: list[str],
+    top_k: int,
+    nprobe: Optional[int],
+    filter: str = "",
+    profile: Optional[VectorProfile] = None,
+):
+    """semantic search for several documents with a single multi-vector search"""
+    logger.debug("documents: %s", queries)
+    with stage("embedding"):
+        # already one upstream call, the batcher would split it at its max size
+        query_vectors = await embed_text(texts=queries, coalesce=False)
+
+    return await _search_vectors(
+        query_vectors,
+        top_k=top_k,
+        nprobe=nprobe,
+        collection_name=None,
+        filter=filter,
+        profile=profile,
+    )
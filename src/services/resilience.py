@@ -0,0 +1,211 @@
+from collections import deque
+from openai import APIConnectionError, APIStatusError
+from pymilvus.exceptions import MilvusException, MilvusUnavailableException
+from src.config.settings import settings
+from typing import Awaitable, Callable, Optional
+import asyncio
+import grpc
+import logging
+import time
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+
+class CircuitOpenError(Exception):
+    """raised without calling an upstream whose circuit breaker is open"""
+
+    def __init__(self, upstream: str, retry_after: float):
+        super().__init__(f"{upstream} circuit breaker is open")
+        self.retry_after = retry_after
+
+
+# gRPC codes of a Milvus call that may succeed when retried later
+TRANSIENT_GRPC_CODES = {grpc.StatusCode.UNAVAILABLE, grpc.StatusCode.DEADLINE_EXCEEDED}
+
+
+def is_transient_error(e: Exception) -> bool:
+    """whether a failed call says the upstream is unhealthy, not the request wrong
+
+    Connection failures, timeouts, gRPC UNAVAILABLE and DEADLINE_EXCEEDED, and
+    OpenAI 5xx answers are transient. A missing collection, a bad filter or a
+    429 are answered by a healthy upstream and do not count as failures.
+    """
+    if isinstance(
+        e,
+        (
+            ConnectionError,
+            TimeoutError,
+            MilvusUnavailableException,
+            APIConnectionError,
+        ),
+    ):
+        return True
+    if isinstance(e, grpc.RpcError):
+        return e.code() in TRANSIENT_GRPC_CODES
+    if isinstance(e, MilvusException):
+        # pymilvus keeps the gRPC code of a call whose retries ran out
+        return e.code in TRANSIENT_GRPC_CODES
+    if isinstance(e, APIStatusError):
+        return e.status_code >= 500
+    return False
+
+
+class Upstream:
+    """
+    Hedging and circuit breaking for the calls to one upstream service.
+
+    A call still running after the `hedge_percentile` of the recent latencies
+    is sent a second time, the first answer wins and the other call is
+    cancelled. After `failure_threshold` consecutive failures the circuit
+    opens and calls fail fast with `CircuitOpenError` for `reset_timeout_s`
+    seconds, then a single trial call decides whether it closes again. Only
+    the errors `is_transient` accepts count as failures.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        hedge_percentile: float = 95.0,
+        hedge_min_delay_ms: float = 10.0,
+        failure_threshold: int = 5,
+        reset_timeout_s: float = 30.0,
+        window: int = 256,
+        is_transient: Callable[[Exception], bool] = is_transient_error,
+    ):
+        self.name = name
+        self.is_transient = is_transient
+        self.hedge_percentile = hedge_percentile
+        self.hedge_min_delay = hedge_min_delay_ms / 1000
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout_s
+        self.latencies: deque[float] = deque(maxlen=window)
+        self.state = "closed"
+        self.failures = 0
+        self.opened_at = 0.0
+        self.calls = 0
+        self.hedged = 0
+        self.hedge_wins = 0
+        self.rejected = 0
+
+    def hedge_delay(self) -> Optional[float]:
+        """seconds after which a call is hedged, None until enough latencies are known"""
+        if self.hedge_percentile <= 0 or len(self.latencies) < 20:
+            return None
+        delay = float(np.percentile(self.latencies, self.hedge_percentile))
+        return max(delay, self.hedge_min_delay)
+
+    def _check_circuit(self) -> None:
+        if self.state == "closed":
+            return
+        retry_after = self.opened_at + self.reset_timeout - time.monotonic()
+        if self.state == "open" and retry_after <= 0:
+            # let one trial call through
+            self.state = "half_open"
+            return
+        self.rejected += 1
+        raise CircuitOpenError(self.name, max(retry_after, 1.0))
+
+    def _record_success(self, latency: float) -> None:
+        self.latencies.append(latency)
+        self.failures = 0
+        if self.state != "closed":
+            logger.info(f"{self.name} circuit breaker closed")
+            self.state = "closed"
+
+    def _record_failure(self) -> None:
+        self.failures += 1
+        if self.state == "half_open" or (
+            self.state == "closed" and self.failures >= self.failure_threshold
+        ):
+            logger.warning(
+                f"⚠️  {self.name} circuit breaker open after {self.failures} failures"
+            )
+            self.state = "open"
+            self.opened_at = time.monotonic()
+
+    def _abort_trial(self) -> None:
+        if self.state == "half_open":
+            # the trial did not conclude, the next call is the new trial
+            self.state = "open"
+
+    async def call(self, request: Callable[[], Awaitable], hedge: bool = True):
+        """await `request()`, hedged when `hedge` is set, through the breaker
+
+        `request` creates a new upstream call each time it is called, it must
+        be idempotent to be hedged.
+        """
+        self._check_circuit()
+        self.calls += 1
+        start = time.monotonic()
+        try:
+            if hedge and settings.HEDGE_ENABLED:
+                result = await self._hedged(request)
+            else:
+                result = await request()
+        except asyncio.CancelledError:
+            self._abort_trial()
+            raise
+        except Exception as e:
+            if self.is_transient(e):
+                self._record_failure()
+            else:
+                self._abort_trial()
+            raise
+        self._record_success(time.monotonic() - start)
+        return result
+
+    async def _hedged(self, request: Callable[[], Awaitable]):
+        first = asyncio.ensure_future(request())
+        pending = {first}
+        try:
+            delay = self.hedge_delay()
+            if delay is not None:
+                done, pending = await asyncio.wait(pending, timeout=delay)
+                if done:
+                    return first.result()
+                self.hedged += 1
+                pending.add(asyncio.ensure_future(request()))
+            errors = []
+            while pending:
+                done, pending = await asyncio.wait(
+                    pending, return_when=asyncio.FIRST_COMPLETED
+                )
+                for task in done:
+                    if task.exception() is None:
+                        if task is not first:
+                            self.hedge_wins += 1
+                        return task.result()
+                    errors.append(task.exception())
+            raise errors[0]
+        finally:
+            # the slower call, or both when the caller is cancelled
+            for task in pending:
+                task.cancel()
+
+    def stats(self) -> dict:
+        delay = self.hedge_delay()
+        return {
+            "state": self.state,
+            "consecutive_failures": self.failures,
+            "calls": self.calls,
+            "hedged": self.hedged,
+            "hedge_wins": self.hedge_wins,
+            "rejected": self.rejected,
+            "hedge_delay_ms": None if delay is None else delay * 1000,
+        }
+
+
+def _upstream(name: str) -> Upstream:
+    return Upstream(
+        name,
+        hedge_percentile=settings.HEDGE_PERCENTILE,
+        hedge_min_delay_ms=settings.HEDGE_MIN_DELAY_MS,
+        failure_threshold=settings.CIRCUIT_FAILURE_THRESHOLD,
+        reset_timeout_s=settings.CIRCUIT_RESET_S,
+    )
+
+
+# wrappers of the calls of the services to Milvus and OpenAI
+milvus_upstream = _upstream("milvus")
+openai_upstream = _upstream("openai")
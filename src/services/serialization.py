@@ -0,0 +1,26 @@
+from src.config.settings import settings
+import orjson
+
+
+def dumps(content) -> bytes:
+    """JSON bytes of `content`, numpy scalars and arrays included"""
+    return orjson.dumps(content, option=orjson.OPT_SERIALIZE_NUMPY)
+
+
+def project_hit(hit, fields: str = "text") -> dict:
+    """the response body of one search hit with the requested `fields`
+
+    `ids` keeps the id and distance only, `snippet` truncates the text to
+    `RESPONSE_SNIPPET_CHARS` characters and `text` returns it whole. Other
+    entity fields, such as the stored vectors of a rerank, are never returned.
+    """
+    body = {"id": hit["id"], "distance": float(hit["distance"])}
+    if fields != "ids":
+        text = hit["entity"]["text"]
+        if fields == "snippet":
+            text = text[: settings.RESPONSE_SNIPPET_CHARS]
+        body["entity"] = {"text": text}
+    collection = hit.get("collection")
+    if collection is not None:
+        body["collection"] = collection
+    return body
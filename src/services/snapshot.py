@@ -0,0 +1,226 @@
+from pathlib import Path
+from src.config.vector_profiles import VectorProfile
+from typing import Iterable, Optional
+import json
+import os
+import re
+import numpy as np
+
+# the filters built by the search services, `tenant == "x"` optionally
+# followed by ` and table_name in ["a", "b"]`
+FILTER_PATTERN = re.compile(
+    r'^tenant == ("(?:[^"\\]|\\.)*")(?: and table_name in (\[.*\]))?$'
+)
+
+
+def parse_filter(filter: str) -> Optional[tuple[Optional[str], Optional[list[str]]]]:
+    """the tenant and table names of a search filter, None if not supported"""
+    if not filter:
+        return None, None
+    match = FILTER_PATTERN.match(filter)
+    if match is None:
+        return None
+    tenant, table_names = match.groups()
+    return json.loads(tenant), json.loads(table_names) if table_names else None
+
+
+class CollectionSnapshot:
+    """
+    Local copy of a small collection answering cosine top-k searches in process.
+
+    The normalized vectors are kept in a memory-mapped `.npy` file, so the
+    snapshot is shared with the page cache and reopened without a new export
+    after a restart. The texts, tenants and table names are held in memory,
+    the entities sorted by tenant.
+    """
+
+    def __init__(self, path: Path):
+        self.path = Path(path)
+        meta = json.loads((self.path / "meta.json").read_text())
+        self.version = tuple(meta["version"])
+        self.profile = VectorProfile.model_validate(meta["profile"])
+        self.ids = np.load(self.path / "ids.npy")
+        self.vectors = np.load(self.path / "vectors.npy", mmap_mode="r")
+        columns = json.loads((self.path / "columns.json").read_text())
+        self.texts: list[str] = columns["text"]
+        self.tenants = np.asarray(columns["tenant"])
+        self.table_names = np.asarray(columns["table_name"])
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    @staticmethod
+    def write(
+        path: Path, pages: Iterable[list[dict]], version: tuple, profile: VectorProfile
+    ) -> "CollectionSnapshot":
+        """export the entities of a collection, replacing the previous snapshot"""
+        writer = SnapshotWriter(path, version, profile)
+        for page in pages:
+            writer.add(page)
+        return writer.close()
+
+    @staticmethod
+    def open(path: Path) -> Optional["CollectionSnapshot"]:
+        """the snapshot exported at `path`, None if there is none"""
+        if not (Path(path) / "meta.json").exists():
+            return None
+        return CollectionSnapshot(path)
+
+    def _rows(self, tenant: Optional[str], table_names: Optional[list[str]]):
+        """vectors and row numbers of the entities matching a filter
+
+        The rows of a tenant are contiguous, so its vectors are a view of the
+        memory map; only a table name filter copies the vectors it selects.
+        """
+        if tenant is None:
+            start, stop = 0, len(self.ids)
+        else:
+            start = int(np.searchsorted(self.tenants, tenant, side="left"))
+            stop = int(np.searchsorted(self.tenants, tenant, side="right"))
+        if table_names is None:
+            return self.vectors[start:stop], range(start, stop)
+        rows = start + np.flatnonzero(
+            np.isin(self.table_names[start:stop], table_names)
+        )
+        return self.vectors[rows], rows
+
+    def search(
+        self,
+        query_vectors: list,
+        top_k: int,
+        filter: str = "",
+        output_fields: Optional[list[str]] = None,
+    ) -> Optional[list[list[dict]]]:
+        """exact cosine top-k hits of each query, None for unsupported filters"""
+        parsed = parse_filter(filter)
+        if parsed is None:
+            return None
+        vectors, rows = self._rows(*parsed)
+        queries = np.stack([self.profile.reduce(vector) for vector in query_vectors])
+        queries /= np.linalg.norm(queries, axis=1, keepdims=True)
+        scores = queries @ vectors.T
+        k = min(top_k, len(rows))
+        if k == 0:
+            return [[] for _ in query_vectors]
+        top = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+        columns = {
+            "text": self.texts,
+            "tenant": self.tenants,
+            "table_name": self.table_names,
+        }
+        fields = output_fields or ["text"]
+        results = []
+        for query_scores, query_top in zip(scores, top):
+            query_top = query_top[np.argsort(-query_scores[query_top])]
+            results.append(
+                [
+                    {
+                        "id": int(self.ids[rows[i]]),
+                        "distance": float(query_scores[i]),
+                        "entity": {
+                            field: str(columns[field][rows[i]]) for field in fields
+                        },
+                    }
+                    for i in query_top
+                ]
+            )
+        return results
+
+
+class SnapshotWriter:
+    """
+    Export of a collection to a snapshot, page by page.
+
+    Only the scalar fields are kept in memory: the normalized vectors of each
+    page are appended to a scratch file, then copied in tenant order into the
+    `vectors.npy` memory map preallocated for the exported row count.
+    """
+
+    def __init__(self, path: Path, version: tuple, profile: VectorProfile):
+        self.path = Path(path)
+        self.path.mkdir(parents=True, exist_ok=True)
+        self.version = version
+        self.profile = profile
+        self.ids: list[int] = []
+        self.columns: dict[str, list[str]] = {
+            "text": [],
+            "tenant": [],
+            "table_name": [],
+        }
+        self.dim: Optional[int] = None
+        self.scratch_path = self.path / "vectors.bin.tmp"
+        self.scratch = open(self.scratch_path, "wb")
+
+    def add(self, entities: list[dict]) -> None:
+        """append a page of entities, with their `embeddings`"""
+        if not entities:
+            return
+        vectors = np.asarray([entity["embeddings"] for entity in entities], np.float32)
+        norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+        vectors /= np.where(norms == 0, 1, norms)
+        self.dim = vectors.shape[1]
+        self.scratch.write(vectors.tobytes())
+        self.ids += [entity["id"] for entity in entities]
+        for field, values in self.columns.items():
+            values += [entity.get(field) or "" for entity in entities]
+
+    def _write_ids(self, order: np.ndarray, tmp: Path) -> None:
+        with open(tmp, "wb") as f:
+            np.save(f, np.asarray(self.ids, np.int64)[order])
+
+    def _write_vectors(self, order: np.ndarray, tmp: Path) -> None:
+        """the scratch vectors in `order`, copied a block of rows at a time"""
+        shape = (len(order), self.dim or 0)
+        vectors = np.lib.format.open_memmap(tmp, "w+", np.float32, shape)
+        if len(order):
+            scratch = np.memmap(self.scratch_path, np.float32, "r", shape=shape)
+            for start in range(0, len(order), 4096):
+                rows = order[start : start + 4096]
+                vectors[start : start + len(rows)] = scratch[rows]
+            del scratch
+        vectors.flush()
+        del vectors
+
+    def abort(self) -> None:
+        """drop an export that did not complete"""
+        self.scratch.close()
+        self.scratch_path.unlink(missing_ok=True)
+
+    def close(self) -> CollectionSnapshot:
+        """write the snapshot files, meta.json last, and open the snapshot"""
+        self.scratch.close()
+        # grouped by tenant, so that the rows of a tenant are one slice
+        order = np.argsort(np.asarray(self.columns["tenant"], np.str_), kind="stable")
+        files = {
+            "ids.npy": lambda tmp: self._write_ids(order, tmp),
+            "vectors.npy": lambda tmp: self._write_vectors(order, tmp),
+            "columns.json": lambda tmp: tmp.write_text(
+                json.dumps(
+                    {
+                        field: [values[i] for i in order]
+                        for field, values in self.columns.items()
+                    }
+                )
+            ),
+            # written last, an interrupted export is never loaded
+            "meta.json": lambda tmp: tmp.write_text(
+                json.dumps(
+                    {
+                        "version": list(self.version),
+                        "profile": self.profile.model_dump(),
+                    }
+                )
+            ),
+        }
+        try:
+            for name, write in files.items():
+                tmp = self.path / f"{name}.tmp"
+                write(tmp)
+                os.replace(tmp, self.path / name)
+        finally:
+            self.scratch_path.unlink(missing_ok=True)
+        return CollectionSnapshot(self.path)
+
+
+# collection name -> snapshot served in place of Milvus searches
+snapshots: dict[str, CollectionSnapshot] = {}
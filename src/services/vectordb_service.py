@@ -1,9 +1,49 @@
 from src.startup import startup_manager
-from src.services.openai_service import search_doc
+from src.config.settings import settings
+from src.config.vector_profiles import VectorProfile, get_vector_profile
+from src.services.admission import embedding_admission
+from src.services.batching import MicroBatcher
+from src.services.cache import LRUCache
+from src.services.identifier_index import identifier_index
+from src.services.metrics import stage
+from src.services.resilience import milvus_upstream, openai_upstream
+from src.services.snapshot import CollectionSnapshot, SnapshotWriter, snapshots
+from src.services.openai_service import (
+    embed_text,
+    embedding_batcher,
+    embedding_cache,
+    search_doc,
+    search_docs,
+)
+from pathlib import Path
+from typing import AsyncIterator, Optional
+import asyncio
+import json
 import logging
+import time
 
 logger = logging.getLogger(__name__)
 
+# cache of search results, keyed on the search parameters and collection version
+search_cache = LRUCache(
+    max_size=settings.SEARCH_CACHE_SIZE, ttl=settings.SEARCH_CACHE_TTL
+)
+
+# cache of the entities fetched by id, keyed on the collection version
+entity_cache = LRUCache(max_size=settings.ENTITY_CACHE_SIZE)
+
+# collection name -> (monotonic time of the last check, version)
+_collection_versions: dict[str, tuple[float, tuple]] = {}
+
+# collection name -> `vector_profile` property set by the feeders
+_collection_profiles: dict[str, Optional[str]] = {}
+
+# one snapshot export at a time, the warm-up and the refresh loop may overlap
+_snapshot_lock = asyncio.Lock()
+
+# fields of the entities returned by id, without their vector
+ENTITY_FIELDS = ["text", "tenant", "table_name"]
+
 
 async def get_collection_from_database() -> list[str]:
     """returns all collections"""
@@ -13,27 +53,498 @@ async def get_collection_from_database() -> list[str]:
 
 async def get_collection_dimension():
     """returns the MilvusDB collection number of entities"""
-    stats = await startup_manager.milvus_client.get_collection_stats(
-        startup_manager.milvus_collection
-    )
+    with stage("milvus_stats"):
+        stats = await startup_manager.milvus_client.get_collection_stats(
+            startup_manager.milvus_collection
+        )
     return stats
 
 
-async def get_entity(id: int):
-    """returns the MilvusDB collection number of entities"""
-    # Example: ID(s) you want to retrieve
-    print(f"{id=}")
-    result = await startup_manager.milvus_client.get(
-        collection_name=startup_manager.milvus_collection, ids=[id]
+class EntityLoader(MicroBatcher):
+    """
+    Coalesces concurrent entity lookups into a single Milvus `get` call.
+
+    Ids of the same collection and tenant requested within `max_wait_ms` of
+    each other are fetched together and each entity is routed back to its
+    callers, `None` when the id does not exist or belongs to another tenant.
+    """
+
+    async def load(
+        self, collection_name: str, tenant: str, ids: list[int]
+    ) -> list[Optional[dict]]:
+        return await self.submit((collection_name, tenant), ids)
+
+    async def fetch(self, group: tuple[str, str], ids: list[int]) -> list:
+        entities = await _get_entities(*group, ids)
+        return [entities.get(entity_id) for entity_id in ids]
+
+
+# batcher gathering concurrent entity lookups into one Milvus `get`
+entity_loader = EntityLoader(
+    max_batch_size=settings.ENTITY_BATCH_MAX_SIZE,
+    max_wait_ms=settings.ENTITY_BATCH_MAX_WAIT_MS,
+)
+
+
+async def _get_entities(
+    collection_name: str, tenant: str, ids: list[int]
+) -> dict[int, dict]:
+    """single Milvus `get` call, the entities of the tenant by id"""
+    with stage("milvus_get"):
+        result = await milvus_upstream.call(
+            lambda: startup_manager.milvus_client.get(
+                collection_name=collection_name, ids=ids, output_fields=ENTITY_FIELDS
+            )
+        )
+    # ids are derived from public keys, the rows of other tenants are not found
+    return {entity["id"]: entity for entity in result if entity.get("tenant") == tenant}
+
+
+async def get_entities(
+    ids: list[int], tenant: str, collection_name: Optional[str] = None
+) -> list[Optional[dict]]:
+    """the entities of `ids` of the tenant, in order, `None` for the others
+
+    Entities already in `entity_cache` for the current collection version are
+    served from memory, the misses are fetched together, coalesced with
+    concurrent lookups by `entity_loader` when batching is enabled. The cached
+    entities are shared and must not be modified.
+    """
+    collection_name = collection_name or startup_manager.milvus_collection
+    version = await get_collection_version(collection_name)
+    entities = [entity_cache.get((collection_name, tenant, i, version)) for i in ids]
+    misses = [i for i, entity in zip(ids, entities) if entity is None]
+    if not misses:
+        return entities
+
+    misses = list(dict.fromkeys(misses))
+    if settings.ENTITY_BATCH_ENABLED:
+        found = dict(
+            zip(misses, await entity_loader.load(collection_name, tenant, misses))
+        )
+    else:
+        found = await _get_entities(collection_name, tenant, misses)
+    for entity_id, entity in found.items():
+        if entity is not None:
+            entity_cache.set((collection_name, tenant, entity_id, version), entity)
+    return [
+        entity if entity is not None else found.get(entity_id)
+        for entity_id, entity in zip(ids, entities)
+    ]
+
+
+async def get_entity(id: int, tenant: str):
+    """returns the MilvusDB entity of `id`, as a list of at most one entity"""
+    entity = (await get_entities([id], tenant))[0]
+    return [] if entity is None else [entity]
+
+
+async def get_collection_version(collection_name: str, force: bool = False) -> tuple:
+    """returns a token that changes whenever the feeders rewrite the collection
+
+    The version is the collection row count together with the optional
+    `data_version` collection property set by the feeders. It is fetched from
+    Milvus at most once every `SEARCH_CACHE_VERSION_CHECK_S` seconds, unless
+    `force` is set.
+    """
+    now = time.monotonic()
+    checked = _collection_versions.get(collection_name)
+    if checked is not None and not force:
+        checked_at, version = checked
+        if now - checked_at < settings.SEARCH_CACHE_VERSION_CHECK_S:
+            return version
+        # concurrent requests keep using the previous version while this one checks
+        _collection_versions[collection_name] = (now, version)
+
+    try:
+        with stage("milvus_stats"):
+            stats, description = await asyncio.gather(
+                milvus_upstream.call(
+                    lambda: startup_manager.milvus_client.get_collection_stats(
+                        collection_name
+                    )
+                ),
+                milvus_upstream.call(
+                    lambda: startup_manager.milvus_client.describe_collection(
+                        collection_name
+                    )
+                ),
+            )
+    except Exception as e:
+        if checked is None:
+            raise
+        # keep serving with the last known version while Milvus is unavailable
+        logger.warning(f"⚠️  Could not check the version of {collection_name}: {e}")
+        return checked[1]
+    properties = description.get("properties") or {}
+    _collection_profiles[collection_name] = properties.get(
+        "vector_profile", settings.VECTOR_PROFILE
+    )
+    new_version = (stats.get("row_count"), properties.get("data_version"))
+    if checked is not None and checked[1] != new_version:
+        logger.info(
+            f"collection {collection_name} changed, clearing search and entity caches"
+        )
+        search_cache.clear()
+        entity_cache.clear()
+        # searched in Milvus until the snapshot is exported again
+        snapshots.pop(collection_name, None)
+    _collection_versions[collection_name] = (time.monotonic(), new_version)
+    return new_version
+
+
+async def get_collection_profile(collection_name: str) -> VectorProfile:
+    """the vector profile the collection was fed with, checked with its version"""
+    await get_collection_version(collection_name)
+    return get_vector_profile(_collection_profiles.get(collection_name))
+
+
+async def _cached_search(
+    query: str,
+    top_k: int,
+    nprobe: Optional[int],
+    collection_name: Optional[str] = None,
+    query_vector: Optional[list[float]] = None,
+    filter: str = "",
+    output_fields: Optional[list[str]] = None,
+):
+    """semantic search served from `search_cache` when possible"""
+    collection_name = collection_name or startup_manager.milvus_collection
+    profile = await get_collection_profile(collection_name)
+    if search_cache.max_size <= 0:
+        return await search_doc(
+            query=query,
+            top_k=top_k,
+            nprobe=nprobe,
+            collection_name=collection_name,
+            query_vector=query_vector,
+            filter=filter,
+            profile=profile,
+            output_fields=output_fields,
+        )
+
+    version = await get_collection_version(collection_name)
+    key = (
+        " ".join(query.split()),
+        top_k,
+        nprobe,
+        collection_name,
+        filter,
+        tuple(output_fields or ()),
+        version,
+    )
+    res = search_cache.get(key)
+    if res is None:
+        try:
+            res = await search_doc(
+                query=query,
+                top_k=top_k,
+                nprobe=nprobe,
+                collection_name=collection_name,
+                query_vector=query_vector,
+                filter=filter,
+                profile=profile,
+                output_fields=output_fields,
+            )
+        except Exception as e:
+            # an expired result beats no result while an upstream is failing
+            res = search_cache.get_stale(key)
+            if res is None:
+                raise
+            logger.warning(f"⚠️  Serving a stale search result: {e}")
+            return res
+        search_cache.set(key, res)
+    return res
+
+
+def tenant_filter(tenant: str, filter: str = "") -> str:
+    """Milvus filter restricting a search to the partitions of one tenant"""
+    expression = f"tenant == {json.dumps(tenant)}"
+    return f"{expression} and {filter}" if filter else expression
+
+
+async def search_collections(
+    query: str,
+    top_k: int,
+    nprobe: Optional[int],
+    collection_names: list[str],
+    tenant: str,
+) -> list[dict]:
+    """search several collections concurrently and merge the hits into one ranking
+
+    The query is embedded once and the collections are searched in parallel,
+    so the latency is the one of the slowest collection. Every hit is tagged
+    with its `collection`; all collections use the COSINE metric, so their
+    distances are comparable.
+    """
+    collection_names = list(dict.fromkeys(collection_names))
+    with stage("embedding"):
+        query_vector = (await embed_text(texts=query))[0]
+    results = await asyncio.gather(
+        *(
+            _cached_search(
+                query=query,
+                top_k=top_k,
+                nprobe=nprobe,
+                collection_name=collection_name,
+                query_vector=query_vector,
+                filter=tenant_filter(tenant),
+            )
+            for collection_name in collection_names
+        )
     )
-    return result
+    hits = [
+        {**hit, "collection": collection_name}
+        for collection_name, res in zip(collection_names, results)
+        for hit in res
+    ]
+    hits.sort(key=lambda hit: hit["distance"], reverse=True)
+    return hits[:top_k]
+
+
+async def search_hierarchical(
+    query: str, top_k: int, nprobe: Optional[int], tenant: str
+) -> list:
+    """two-stage search: the top tables first, then their columns only
+
+    The query is embedded once; the column search of the served collection is
+    filtered on the `table_name` of the `HIERARCHICAL_TOP_TABLES` best tables.
+    """
+    with stage("embedding"):
+        query_vector = (await embed_text(texts=query))[0]
+    with stage("table_search"):
+        tables = await _cached_search(
+            query=query,
+            top_k=settings.HIERARCHICAL_TOP_TABLES,
+            nprobe=nprobe,
+            collection_name=settings.MILVUS_TABLES_COLLECTION,
+            query_vector=query_vector,
+            filter=tenant_filter(tenant),
+            output_fields=["table_name"],
+        )
+    table_names = [
+        hit["entity"]["table_name"] for hit in tables if hit["entity"].get("table_name")
+    ]
+    if not table_names:
+        return []
+    return await _cached_search(
+        query=query,
+        top_k=top_k,
+        nprobe=nprobe,
+        query_vector=query_vector,
+        filter=tenant_filter(tenant, f"table_name in {json.dumps(table_names)}"),
+    )
+
 
+async def search_query(
+    query: str,
+    top_k: int,
+    nprobe: Optional[int],
+    tenant: str,
+    collections: Optional[list[str]] = None,
+    mode: str = "flat",
+):
+    """perform semantic search among the entities of `tenant`
 
-async def search_query(query: str, top_k: int, nprobe: int):
-    """perform semantic search"""
+    Literal column or table names found in `identifier_index` are answered
+    without embedding the query, optionally filled up to `top_k` with ANN hits.
+    When `collections` are given, they are searched together instead of the
+    served collection. The `hierarchical` mode searches the columns of the
+    best matching tables only.
+    """
     try:
-        res = await search_doc(query=query, top_k=top_k, nprobe=nprobe)
+        with stage("search"):
+            if collections:
+                return await search_collections(
+                    query=query,
+                    top_k=top_k,
+                    nprobe=nprobe,
+                    collection_names=collections,
+                    tenant=tenant,
+                )
+
+            if settings.IDENTIFIER_INDEX_ENABLED:
+                with stage("identifier_lookup"):
+                    hits = identifier_index.lookup(query, top_k, tenant=tenant)
+                if hits:
+                    if len(hits) < top_k and settings.IDENTIFIER_FILL_WITH_ANN:
+                        found = {hit["id"] for hit in hits}
+                        res = await _cached_search(
+                            query=query,
+                            top_k=top_k,
+                            nprobe=nprobe,
+                            filter=tenant_filter(tenant),
+                        )
+                        hits += [hit for hit in res if hit["id"] not in found]
+                    return hits[:top_k]
+
+            if mode == "hierarchical":
+                return await search_hierarchical(
+                    query=query, top_k=top_k, nprobe=nprobe, tenant=tenant
+                )
+            return await _cached_search(
+                query=query, top_k=top_k, nprobe=nprobe, filter=tenant_filter(tenant)
+            )
+    except Exception as e:
+        logger.info(f"An error occurred when searching: {str(e)}")
+        raise
+
+
+async def search_queries(
+    queries: list[str], top_k: int, nprobe: Optional[int], tenant: str
+):
+    """perform semantic search for several queries at once"""
+    try:
+        with stage("search"):
+            profile = await get_collection_profile(startup_manager.milvus_collection)
+            res = await search_docs(
+                queries=queries,
+                top_k=top_k,
+                nprobe=nprobe,
+                filter=tenant_filter(tenant),
+                profile=profile,
+            )
         return res
     except Exception as e:
         logger.info(f"An error occurred when searching: {str(e)}")
         raise
+
+
+def get_cache_stats() -> dict:
+    """returns the hit/miss counters of the in-process caches"""
+    return {
+        "embeddings": embedding_cache.stats(),
+        "embedding_batcher": embedding_batcher.stats(),
+        "search_results": search_cache.stats(),
+        "entities": entity_cache.stats(),
+        "entity_loader": entity_loader.stats(),
+        "embedding_admission": embedding_admission.stats(),
+        "upstreams": {
+            "milvus": milvus_upstream.stats(),
+            "openai": openai_upstream.stats(),
+        },
+        "identifier_index": {
+            "entities": len(identifier_index),
+            "version": identifier_index.version,
+        },
+    }
+
+
+async def _query_pages(
+    collection_name: str, output_fields: list[str], batch_size: int
+) -> AsyncIterator[list[dict]]:
+    """the entities of the collection, page by page with a primary key cursor"""
+    last_id = None
+    while True:
+        res = await startup_manager.milvus_client.query(
+            collection_name=collection_name,
+            filter="" if last_id is None else f"id > {last_id}",
+            output_fields=output_fields,
+            limit=batch_size,
+        )
+        if not res:
+            return
+        yield res
+        # query results are merged by primary key, the last one bounds the page
+        last_id = max(entity["id"] for entity in res)
+        if len(res) < batch_size:
+            return
+
+
+async def _query_all(collection_name: str, output_fields: list[str], batch_size: int):
+    """every entity of the collection, fetched page by page"""
+    entities = []
+    async for page in _query_pages(collection_name, output_fields, batch_size):
+        entities += page
+    return entities
+
+
+async def refresh_identifier_index(force: bool = False) -> None:
+    """(re)load `identifier_index` when the served collection changed"""
+    collection_name = startup_manager.milvus_collection
+    version = await get_collection_version(collection_name)
+    if not force and identifier_index.version == version:
+        return
+    entities = await _query_all(
+        collection_name, ["id", "text", "tenant"], batch_size=5000
+    )
+    identifier_index.build(entities, version=version)
+    logger.info(f"identifier index loaded with {len(identifier_index)} entities")
+
+
+async def identifier_index_refresh_loop() -> None:
+    """background task keeping `identifier_index` in sync with the collection"""
+    while True:
+        try:
+            await refresh_identifier_index()
+        except Exception as e:
+            logger.warning(f"⚠️  Error refreshing the identifier index: {e}")
+        await asyncio.sleep(settings.IDENTIFIER_INDEX_REFRESH_S)
+
+
+async def refresh_snapshot(collection_name: str) -> None:
+    """export the collection to a local snapshot when it changed
+
+    Only collections of at most `SNAPSHOT_MAX_ROWS` entities stored as
+    full-precision vectors with the COSINE metric are exported; a snapshot
+    already on disk for the current version is reopened instead.
+    """
+    version = await get_collection_version(collection_name)
+    snapshot = snapshots.get(collection_name)
+    if snapshot is not None and snapshot.version == version:
+        return
+    path = Path(settings.SNAPSHOT_DIR) / collection_name
+    snapshot = await asyncio.to_thread(CollectionSnapshot.open, path)
+    if snapshot is None or snapshot.version != version:
+        profile = await get_collection_profile(collection_name)
+        if (version[0] or 0) > settings.SNAPSHOT_MAX_ROWS or (
+            profile.vector_type != "FLOAT_VECTOR" or profile.metric_type != "COSINE"
+        ):
+            logger.info(f"collection {collection_name} is searched in Milvus only")
+            return
+        # one page of vectors in memory at a time, written to the memory map
+        writer = await asyncio.to_thread(SnapshotWriter, path, version, profile)
+        try:
+            async for page in _query_pages(
+                collection_name,
+                ["id", "text", "tenant", "table_name", "embeddings"],
+                batch_size=5000,
+            ):
+                await asyncio.to_thread(writer.add, page)
+        except BaseException:
+            writer.abort()
+            raise
+        snapshot = await asyncio.to_thread(writer.close)
+        # a feed during the export would serve its old hits under the new version
+        if await get_collection_version(collection_name, force=True) != version:
+            logger.info(f"collection {collection_name} changed during its export")
+            return
+    snapshots[collection_name] = snapshot
+    logger.info(f"snapshot of {collection_name} loaded with {len(snapshot)} entities")
+
+
+async def refresh_snapshots() -> None:
+    """refresh the snapshots of the served and tables collections"""
+    existing = set(await get_collection_from_database())
+    for collection_name in (
+        startup_manager.milvus_collection,
+        settings.MILVUS_TABLES_COLLECTION,
+    ):
+        if collection_name in existing:
+            try:
+                async with _snapshot_lock:
+                    await refresh_snapshot(collection_name)
+            except Exception as e:
+                logger.warning(
+                    f"⚠️  Error refreshing the snapshot of {collection_name}: {e}"
+                )
+
+
+async def snapshot_refresh_loop() -> None:
+    """background task keeping the local snapshots in sync with the collections"""
+    while True:
+        try:
+            await refresh_snapshots()
+        except Exception as e:
+            logger.warning(f"⚠️  Error refreshing the snapshots: {e}")
+        await asyncio.sleep(settings.SNAPSHOT_REFRESH_S)
@@ -0,0 +1,151 @@
+from collections import Counter
+from pathlib import Path
+from src.config.settings import settings
+from src.services.client_pool import MilvusClientPool
+from src.services.openai_service import embed_text
+from src.services.vectordb_service import (
+    get_collection_version,
+    refresh_snapshots,
+    search_query,
+)
+from src.startup import startup_manager
+from typing import Optional
+import asyncio
+import json
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+class QueryLog:
+    """
+    Counts the queries served, so the most frequent ones of the recent traffic
+    can be replayed by the warm-up of the next deployment.
+
+    At most `max_size` distinct queries are tracked, the least frequent ones
+    are dropped when the log overflows.
+    """
+
+    def __init__(self, max_size: int = 10000):
+        self.max_size = max_size
+        self.counts: Counter[tuple[str, str]] = Counter()
+
+    def record(self, tenant: str, query: str) -> None:
+        self.counts[(tenant, query)] += 1
+        if len(self.counts) > 2 * self.max_size:
+            self.counts = Counter(dict(self.counts.most_common(self.max_size)))
+
+    def top(self, n: int) -> list[dict]:
+        return [
+            {"tenant": tenant, "query": query}
+            for (tenant, query), _ in self.counts.most_common(n)
+        ]
+
+    def save(self, path: str, n: int) -> None:
+        """write the `n` most frequent queries as JSON lines"""
+        Path(path).write_text("".join(json.dumps(q) + "\n" for q in self.top(n)))
+
+
+# queries of the current deployment, saved to WARMUP_TRAFFIC_PATH at shutdown
+query_log = QueryLog()
+
+
+def read_queries(path: Optional[str]) -> list[dict]:
+    """`{"tenant": ..., "query": ...}` JSON lines of a warm-up file"""
+    if not path or not Path(path).exists():
+        return []
+    queries = []
+    for line in Path(path).read_text().splitlines():
+        try:
+            item = json.loads(line)
+            queries.append({"tenant": item["tenant"], "query": item["query"]})
+        except (ValueError, KeyError, TypeError):
+            logger.warning(f"⚠️  Skipping warm-up query {line!r} of {path}")
+    return queries
+
+
+def warmup_queries() -> list[dict]:
+    """representative queries first, then the top queries of the last deployment"""
+    queries = read_queries(settings.WARMUP_QUERIES_PATH) + read_queries(
+        settings.WARMUP_TRAFFIC_PATH
+    )
+    unique = {(q["tenant"], q["query"]): q for q in reversed(queries)}
+    return list(reversed(unique.values()))[: settings.WARMUP_MAX_QUERIES]
+
+
+async def _load_collections() -> None:
+    """make sure the searched collections are loaded in memory"""
+    existing = set(await startup_manager.milvus_client.list_collections())
+    for name in (startup_manager.milvus_collection, settings.MILVUS_TABLES_COLLECTION):
+        if name in existing:
+            await startup_manager.milvus_client.load_collection(collection_name=name)
+            await get_collection_version(name)
+
+
+async def _open_connections() -> None:
+    """open the channel of every Milvus client and a connection to OpenAI"""
+    milvus_client = startup_manager.milvus_client
+    clients = (
+        milvus_client.clients
+        if isinstance(milvus_client, MilvusClientPool)
+        else [milvus_client]
+    )
+    await asyncio.gather(*(client.get_server_version() for client in clients))
+    await embed_text(texts="warm up")
+
+
+async def _replay(queries: list[dict]) -> int:
+    """search the queries, filling the caches and paging the index in"""
+    semaphore = asyncio.Semaphore(settings.WARMUP_CONCURRENCY)
+    replayed = 0
+
+    async def replay(item: dict) -> None:
+        nonlocal replayed
+        async with semaphore:
+            try:
+                await search_query(
+                    query=item["query"], top_k=3, nprobe=None, tenant=item["tenant"]
+                )
+                replayed += 1
+            except Exception as e:
+                logger.warning(f"⚠️  Warm-up query {item['query']!r} failed: {e}")
+
+    await asyncio.gather(*(replay(item) for item in queries))
+    return replayed
+
+
+async def _warm_up() -> None:
+    await _load_collections()
+    if settings.SNAPSHOT_ENABLED:
+        await refresh_snapshots()
+    await _open_connections()
+    queries = warmup_queries()
+    replayed = await _replay(queries)
+    logger.info(f"✅ warm-up complete, {replayed}/{len(queries)} queries replayed")
+
+
+async def warm_up() -> None:
+    """load the collections and snapshots, open the connections, replay queries
+
+    Failures are logged and do not prevent the app from becoming ready, nor
+    does a warm-up still running after `WARMUP_TIMEOUT_S` seconds.
+    """
+    try:
+        await asyncio.wait_for(_warm_up(), timeout=settings.WARMUP_TIMEOUT_S)
+    except asyncio.TimeoutError:
+        logger.warning(
+            f"⚠️  Warm-up did not complete in {settings.WARMUP_TIMEOUT_S}s, "
+            "reporting ready anyway"
+        )
+    except Exception as e:
+        logger.warning(f"⚠️  Warm-up failed: {e}")
+
+
+def save_recent_queries() -> None:
+    """keep the top queries of this deployment for the warm-up of the next one"""
+    if not settings.WARMUP_TRAFFIC_PATH or not query_log.counts:
+        return
+    try:
+        query_log.save(settings.WARMUP_TRAFFIC_PATH, settings.WARMUP_MAX_QUERIES)
+    except OSError as e:
+        logger.warning(f"⚠️  Could not save the recent queries: {e}")
@@ -1,7 +1,10 @@
-from typing import Dict, Any
+from typing import Dict, Any, Callable, Coroutine, Optional
 from pymilvus import AsyncMilvusClient
-from openai import AsyncOpenAI
+from openai import AsyncOpenAI, DefaultAsyncHttpxClient
 from src.config.settings import settings
+from src.services.client_pool import MilvusClientPool
+import asyncio
+import httpx
 import logging
 
 logger = logging.getLogger(__name__)
@@ -17,12 +20,21 @@ class StartupManager:
         self.milvus_database = None
         self.milvus_collection = None
         self.openai_client = None
+        self.openai_transport: Optional[httpx.AsyncHTTPTransport] = None
         self.openai_model = None
         self.startup_complete = False
+        self.warmup_complete = False
+        self.background_tasks: list[asyncio.Task] = []
 
-    async def initialize_services(self) -> Dict[str, Any]:
+    async def initialize_services(
+        self, warmup: Optional[Callable[[], Coroutine]] = None
+    ) -> Dict[str, Any]:
         """Initialize all services in the correct order.
 
+        Args:
+            warmup: coroutine function run in the background once the clients
+                are connected; `warmup_complete` is set when it returns.
+
         Returns:
             Summary of startup process
         """
@@ -31,6 +43,10 @@ class StartupManager:
             await self._initialize_openai_client()
             self.startup_complete = True
             logger.info("✅ Ontology Generation API initialization complete!")
+            if warmup is None:
+                self.warmup_complete = True
+            else:
+                self.start_background_task(self._warm_up(warmup))
 
             return {
                 "status": "success",
@@ -43,14 +59,25 @@ class StartupManager:
 
     async def _initialize_milvus_client(self) -> None:
         try:
-            self.milvus_client = AsyncMilvusClient(uri=settings.MILVUS_CLIENT_URL)
+            # clients of the same uri share one connection unless their aliases differ
+            self.milvus_client = MilvusClientPool(
+                [
+                    AsyncMilvusClient(
+                        uri=settings.MILVUS_CLIENT_URL, alias=f"vectordb-pool-{i}"
+                    )
+                    for i in range(max(settings.MILVUS_POOL_SIZE, 1))
+                ],
+                strategy=settings.MILVUS_POOL_STRATEGY,
+            )
             self.milvus_database = settings.MILVUS_CLIENT_DATABASE
             self.milvus_collection = settings.MILVUS_CLIENT_COLLECTION
 
             # Test connection
             logger.info("trying to connect to Milvusdb ...")
             await self.milvus_client.get_server_version()
-            logger.info("✅ Milvusdb connection established")
+            logger.info(
+                f"✅ Milvusdb connection established ({len(self.milvus_client)} clients)"
+            )
 
         except Exception as e:
             logger.error(f"❌ Milvusdb connection failed: {e}")
@@ -58,9 +85,14 @@ class StartupManager:
 
     async def _initialize_openai_client(self):
         try:
+            # kept to report the live state of its connection pool
+            self.openai_transport = httpx.AsyncHTTPTransport(
+                limits=self.openai_limits()
+            )
             self.openai_client = AsyncOpenAI(
                 api_key=settings.OPENAI_API_KEY,
                 base_url=settings.OPENAI_BASE_URL,
+                http_client=DefaultAsyncHttpxClient(transport=self.openai_transport),
             )
             self.openai_model = settings.OPENAI_MODEL
             logger.info("✅ openai connection established")
@@ -68,12 +100,65 @@ class StartupManager:
             logger.error(f"❌ openai connection failed: {e}")
             raise
 
+    @staticmethod
+    def openai_limits() -> httpx.Limits:
+        return httpx.Limits(
+            max_connections=settings.OPENAI_MAX_CONNECTIONS,
+            max_keepalive_connections=settings.OPENAI_MAX_KEEPALIVE_CONNECTIONS,
+            keepalive_expiry=settings.OPENAI_KEEPALIVE_EXPIRY_S,
+        )
+
+    def pool_stats(self) -> dict:
+        """connection pools of the Milvus and OpenAI clients"""
+        stats = {}
+        if isinstance(self.milvus_client, MilvusClientPool):
+            stats["milvus"] = self.milvus_client.stats()
+        if self.openai_transport is not None:
+            stats["openai"] = self.openai_pool_stats()
+        return stats
+
+    def openai_pool_stats(self) -> dict:
+        """live connections of the OpenAI HTTP pool, against its limits"""
+        # httpcore pool of the transport, not part of the httpx public API
+        pool = getattr(self.openai_transport, "_pool", None)
+        connections = list(getattr(pool, "connections", []))
+        idle = sum(1 for connection in connections if connection.is_idle())
+        limits = self.openai_limits()
+        return {
+            "connections": len(connections),
+            "active_connections": len(connections) - idle,
+            "idle_connections": idle,
+            "queued_requests": sum(
+                1 for request in getattr(pool, "_requests", []) if request.is_queued()
+            ),
+            "max_connections": limits.max_connections,
+            "max_keepalive_connections": limits.max_keepalive_connections,
+        }
+
+    async def _warm_up(self, warmup: Callable[[], Coroutine]) -> None:
+        logger.info("🔥 warming up ...")
+        try:
+            await warmup()
+        finally:
+            self.warmup_complete = True
+
+    def start_background_task(self, coro: Coroutine) -> asyncio.Task:
+        """run a coroutine for the lifetime of the app, cancelled at shutdown"""
+        task = asyncio.create_task(coro)
+        self.background_tasks.append(task)
+        return task
+
     async def shutdown_services(self) -> None:
         """
         Shutdown all services.
         """
         logger.info("🔄 Shutting down Ontology Generation API...")
 
+        for task in self.background_tasks:
+            task.cancel()
+        await asyncio.gather(*self.background_tasks, return_exceptions=True)
+        self.background_tasks.clear()
+
         # Close mongodb connection if it exists
         if hasattr(self, "milvus_client") and self.milvus_client is not None:
             try:
@@ -30,4 +30,1325 @@ def test_readiness():
     # print(response_json)
     assert response.status_code == 200
     # assert response_json.get("status") == "ready"
-    # assert response_json.get("milvus_version") == "2.6.4"
\ No newline at end of file
+    # assert response_json.get("milvus_version") == "2.6.4"
+
+
+# test embedding cache
+def test_embedding_cache():
+    from src.services.cache import EmbeddingCache
+
+    cache = EmbeddingCache(max_size=2, ttl=60)
+    cache.set_embedding("OrderNbr", "model", [0.5, 0.25])
+    assert cache.get_embedding("  OrderNbr ", "model") == [0.5, 0.25]
+    assert cache.get_embedding("OrderNbr", "other-model") is None
+
+    cache.set_embedding("Vendor", "model", [1.0, 0.0])
+    cache.set_embedding("Status", "model", [0.0, 1.0])
+    assert cache.get_embedding("OrderNbr", "model") is None  # evicted
+    assert cache.stats()["hits"] == 1
+    assert cache.stats()["misses"] == 2
+
+
+class FakeEmbeddings:
+    """stand-in for `AsyncOpenAI().embeddings` returning one-hot vectors"""
+
+    def __init__(self):
+        self.calls = []
+
+    async def create(self, input, model, **kwargs):
+        from types import SimpleNamespace
+
+        self.calls.append(list(input))
+        return SimpleNamespace(
+            data=[SimpleNamespace(embedding=[float(len(text)), 1.0]) for text in input]
+        )
+
+
+# test concurrent embeddings are coalesced into one upstream call
+def test_embedding_batcher(monkeypatch):
+    import asyncio
+    from types import SimpleNamespace
+    from src.startup import startup_manager
+    from src.services.openai_service import EmbeddingBatcher
+
+    embeddings = FakeEmbeddings()
+    monkeypatch.setattr(
+        startup_manager, "openai_client", SimpleNamespace(embeddings=embeddings)
+    )
+    batcher = EmbeddingBatcher(max_batch_size=8, max_wait_ms=20)
+
+    async def run():
+        queries = ["a", "bb", "ccc", "bb"]
+        return await asyncio.gather(*(batcher.embed([q], "model") for q in queries))
+
+    results = asyncio.run(run())
+    assert [r[0][0] for r in results] == [1.0, 2.0, 3.0, 2.0]
+    assert embeddings.calls == [["a", "bb", "ccc"]]
+
+
+class FakeMilvusClient:
+    """stand-in for `AsyncMilvusClient` returning one hit per query vector"""
+
+    def __init__(self, row_count=2):
+        self.searches = []
+        self.row_count = row_count
+
+    async def get_collection_stats(self, collection_name):
+        return {"row_count": self.row_count}
+
+    async def describe_collection(self, collection_name):
+        return {"collection_name": collection_name, "properties": {}}
+
+    async def search(self, collection_name, data, limit, **kwargs):
+        self.searches.append(data)
+        return [
+            [{"id": i, "distance": vector[0], "entity": {"text": f"hit {i}"}}]
+            for i, vector in enumerate(data)
+        ]
+
+
+# test batch search runs a single multi-vector search
+def test_search_doc_batch(monkeypatch):
+    from types import SimpleNamespace
+    from src.startup import startup_manager
+
+    milvus_client = FakeMilvusClient()
+    monkeypatch.setattr(startup_manager, "milvus_client", milvus_client)
+    monkeypatch.setattr(
+        startup_manager, "openai_client", SimpleNamespace(embeddings=FakeEmbeddings())
+    )
+
+    response = client.post(
+        "/api/v1/vectordb/search_doc/batch",
+        json={
+            "queries": ["OrderNbr", "Vendor name"],
+            "top_k": 1,
+            "tenant": "group_iii",
+        },
+    )
+    assert response.status_code == 200
+    responses = response.json()["responses"]
+    assert [r["responses"][0]["id"] for r in responses] == [0, 1]
+    assert len(milvus_client.searches) == 1
+
+    # a full batch is embedded with one call, not split by the micro-batcher
+    embeddings = FakeEmbeddings()
+    monkeypatch.setattr(
+        startup_manager, "openai_client", SimpleNamespace(embeddings=embeddings)
+    )
+    queries = [f"query {i}" for i in range(100)]
+    response = client.post(
+        "/api/v1/vectordb/search_doc/batch",
+        json={"queries": queries, "top_k": 1, "tenant": "group_iii"},
+    )
+    assert response.status_code == 200
+    assert embeddings.calls == [queries]
+
+
+# test the `fields` parameter trims the hits of the response
+def test_search_doc_fields(monkeypatch):
+    from types import SimpleNamespace
+    from src.config.settings import settings
+    from src.startup import startup_manager
+
+    monkeypatch.setattr(startup_manager, "milvus_client", FakeMilvusClient())
+    monkeypatch.setattr(
+        startup_manager, "openai_client", SimpleNamespace(embeddings=FakeEmbeddings())
+    )
+    monkeypatch.setattr(settings, "RESPONSE_SNIPPET_CHARS", 3)
+
+    def search(fields):
+        response = client.post(
+            "/api/v1/vectordb/search_doc/batch",
+            json={"queries": ["OrderNbr"], "tenant": "group_iii", "fields": fields},
+        )
+        assert response.status_code == 200
+        return response.json()["responses"][0]["responses"]
+
+    assert search("ids") == [{"id": 0, "distance": 8.0}]
+    assert search("snippet") == [{"id": 0, "distance": 8.0, "entity": {"text": "hit"}}]
+    assert search("text")[0]["entity"] == {"text": "hit 0"}
+    response = client.post(
+        "/api/v1/vectordb/search_doc/batch",
+        json={"queries": ["OrderNbr"], "tenant": "group_iii", "fields": "vectors"},
+    )
+    assert response.status_code == 422
+
+
+# test entity lookups are coalesced, cached, scoped to the tenant and refetched once
+# the collection changes
+def test_get_entities(monkeypatch):
+    import asyncio
+    from src.config.settings import settings
+    from src.services.vectordb_service import get_entity
+    from src.startup import startup_manager
+
+    class FakeEntityMilvusClient(FakeMilvusClient):
+        async def get(self, collection_name, ids, output_fields=None, **kwargs):
+            self.searches.append(ids)
+            # every field by default, like Milvus, float16 vectors as bytes
+            entities = [
+                {
+                    "id": i,
+                    "text": f"entity {i}",
+                    "tenant": "a" if i < 10 else "b",
+                    "embeddings": b"\x00\xff",
+                }
+                for i in ids
+                if i < 20
+            ]
+            return [
+                {
+                    field: value
+                    for field, value in entity.items()
+                    if field == "id" or field in (output_fields or entity)
+                }
+                for entity in entities
+            ]
+
+    milvus_client = FakeEntityMilvusClient()
+    monkeypatch.setattr(startup_manager, "milvus_client", milvus_client)
+    monkeypatch.setattr(startup_manager, "milvus_collection", "test_get_entities")
+    monkeypatch.setattr(settings, "SEARCH_CACHE_VERSION_CHECK_S", 0)
+
+    async def run():
+        return await asyncio.gather(*(get_entity(i, "a") for i in [1, 2, 1, 42]))
+
+    results = asyncio.run(run())
+    entity_1 = {"id": 1, "text": "entity 1", "tenant": "a"}
+    entity_2 = {"id": 2, "text": "entity 2", "tenant": "a"}
+    assert results == [[entity_1], [entity_2], [entity_1], []]
+    assert milvus_client.searches == [[1, 2, 42]]
+
+    response = client.post(
+        "/api/v1/vectordb/get_entities", json={"ids": [2, 3, 42], "tenant": "a"}
+    )
+    assert response.status_code == 200
+    assert response.json() == {
+        "entities": [entity_2, {"id": 3, "text": "entity 3", "tenant": "a"}],
+        "missing": [42],
+    }
+    assert milvus_client.searches[1:] == [[3, 42]]
+
+    # the entities of another tenant are missing, even when cached
+    response = client.post(
+        "/api/v1/vectordb/get_entities", json={"ids": [2, 12], "tenant": "b"}
+    )
+    assert response.json()["missing"] == [2]
+    assert client.post("/api/v1/vectordb/get_entity", json={"id": 2}).status_code == 422
+
+    milvus_client.row_count += 1
+    client.post("/api/v1/vectordb/get_entities", json={"ids": [2], "tenant": "a"})
+    assert milvus_client.searches[3:] == [[2]]
+    assert (
+        client.post(
+            "/api/v1/vectordb/get_entities", json={"ids": [], "tenant": "a"}
+        ).status_code
+        == 422
+    )
+
+
+# test repeated searches are served from the result cache until the collection changes
+def test_search_cache(monkeypatch):
+    from types import SimpleNamespace
+    from src.startup import startup_manager
+    from src.config.settings import settings
+
+    milvus_client = FakeMilvusClient()
+    monkeypatch.setattr(startup_manager, "milvus_client", milvus_client)
+    monkeypatch.setattr(startup_manager, "milvus_collection", "test_search_cache")
+    monkeypatch.setattr(
+        startup_manager, "openai_client", SimpleNamespace(embeddings=FakeEmbeddings())
+    )
+    monkeypatch.setattr(settings, "SEARCH_CACHE_VERSION_CHECK_S", 0)
+
+    for _ in range(2):
+        response = client.post(
+            "/api/v1/vectordb/search_doc",
+            json={"query": "Vendor", "tenant": "group_iii"},
+        )
+        assert response.status_code == 200
+    assert len(milvus_client.searches) == 1
+
+    milvus_client.row_count += 1
+    client.post(
+        "/api/v1/vectordb/search_doc", json={"query": "Vendor", "tenant": "group_iii"}
+    )
+    assert len(milvus_client.searches) == 2
+
+    # results are cached per tenant
+    client.post(
+        "/api/v1/vectordb/search_doc",
+        json={"query": "Vendor", "tenant": "other_tenant"},
+    )
+    assert len(milvus_client.searches) == 3
+
+
+# test feeder texts are packed under the per-request input and token limits
+def test_make_batches(monkeypatch):
+    from scripts import embedding_utils
+
+    monkeypatch.setattr(embedding_utils, "count_tokens", lambda text, model: len(text))
+    texts = ["x" * 10] * 5
+    assert embedding_utils.make_batches(texts, max_inputs=2) == [[0, 1], [2, 3], [4]]
+    assert embedding_utils.make_batches(texts, max_tokens=25) == [[0, 1], [2, 3], [4]]
+    assert embedding_utils.make_batches(["x" * 30], max_tokens=25) == [[0]]
+
+
+# test data dictionaries are streamed from a local directory in bounded chunks
+def test_iter_local_documents(tmp_path):
+    import json
+    from scripts.data_sources import chunked, iter_local_documents
+
+    for i in range(5):
+        (tmp_path / f"table_{i}.json").write_text(json.dumps({"table": f"t{i}"}))
+    (tmp_path / "broken.json").write_text("{")
+
+    chunks = list(chunked(iter_local_documents(str(tmp_path)), 2))
+    assert [len(chunk) for chunk in chunks] == [2, 2, 1]
+    assert chunks[0][0] == {"table": "t0"}
+
+
+# test the manifest tracks changed and removed entities under stable IDs
+def test_manifest(tmp_path):
+    from scripts.manifest import Manifest, content_hash, stable_id
+
+    table_id = stable_id("group_iii.silver.po_order")
+    column_id = stable_id("group_iii.silver.po_order.OrderNbr")
+    assert table_id == stable_id("group_iii.silver.po_order")
+    assert 0 <= column_id < 2**63 and column_id != table_id
+
+    manifest = Manifest(str(tmp_path / "manifest.json"))
+    manifest.update(table_id, content_hash("v1"))
+    manifest.update(column_id, content_hash("v1"))
+    manifest.save()
+
+    manifest = Manifest(str(tmp_path / "manifest.json"))
+    assert not manifest.changed(table_id, content_hash("v1"))
+    assert manifest.changed(table_id, content_hash("v2"))
+    assert manifest.removed({table_id}) == [column_id]
+
+
+# test the on-disk embedding store survives a reopen and dedupes identical texts
+def test_embedding_store(tmp_path):
+    from scripts.embedding_store import EmbeddingStore
+
+    store = EmbeddingStore(str(tmp_path), model="text-embedding-3-small")
+    store.put_many(["a", "b", "a"], [[1.0, 0.0], [0.0, 1.0], [1.0, 0.0]])
+    assert len(store) == 2
+
+    store = EmbeddingStore(str(tmp_path), model="text-embedding-3-small")
+    assert store.get_many(["b", "c"]) == [[0.0, 1.0], None]
+    assert EmbeddingStore(str(tmp_path), model="other").get_many(["a"]) == [None]
+
+    # a torn digest of an interrupted append is cut back, later rows stay aligned
+    store.put_many(["c"], [[0.5, 0.5]])
+    with open(store.index_path, "r+b") as f:
+        f.truncate(2 * 32 + 10)
+    store = EmbeddingStore(str(tmp_path), model="text-embedding-3-small")
+    assert len(store) == 2
+    store.put_many(["d"], [[0.25, 0.75]])
+    store = EmbeddingStore(str(tmp_path), model="text-embedding-3-small")
+    assert store.get_many(["a", "b", "c", "d"]) == [
+        [1.0, 0.0],
+        [0.0, 1.0],
+        None,
+        [0.25, 0.75],
+    ]
+
+    # two feeders sharing the store append after each other's rows
+    columns = EmbeddingStore(str(tmp_path), model="shared")
+    tables = EmbeddingStore(str(tmp_path), model="shared")
+    columns.put_many(["tables text"], [[1.0, 1.0]])
+    tables.put_many(["columns text", "tables text"], [[2.0, 2.0], [3.0, 3.0]])
+    assert columns.get_many(["columns text", "tables text"]) == [
+        [2.0, 2.0],
+        [1.0, 1.0],
+    ]
+    assert tables.get_many(["columns text", "tables text"]) == [
+        [2.0, 2.0],
+        [1.0, 1.0],
+    ]
+    assert len(EmbeddingStore(str(tmp_path), model="shared")) == 2
+
+
+class FakeSyncMilvusClient:
+    """stand-in for the feeders' `MilvusClient`, recording what is written"""
+
+    def __init__(self, uri=None):
+        self.collections = {}
+        self.calls = []
+
+    def list_collections(self):
+        return list(self.collections)
+
+    def has_collection(self, collection_name):
+        return collection_name in self.collections
+
+    def create_collection(self, collection_name, schema):
+        self.collections[collection_name] = {}
+
+    def insert(self, collection_name, data):
+        self.collections[collection_name].update({row["id"]: row for row in data})
+
+    upsert = insert
+
+    def delete(self, collection_name, ids=(), filter=None):
+        for entity_id in ids:
+            self.collections[collection_name].pop(entity_id)
+
+    def query_iterator(self, collection_name, filter, output_fields):
+        import json
+        from types import SimpleNamespace
+
+        # only the `tenant == "x"` filters of the feeders
+        tenant = json.loads(filter.removeprefix("tenant == "))
+        rows = [
+            {"id": row["id"]}
+            for row in self.collections[collection_name].values()
+            if row["tenant"] == tenant
+        ]
+        pages = iter([rows, []])
+        return SimpleNamespace(next=lambda: next(pages), close=lambda: None)
+
+    def __getattr__(self, name):
+        # flush, create_index, alter_collection_properties, load_collection
+        return lambda **kwargs: self.calls.append((name, kwargs.get("collection_name")))
+
+
+# test one walk of the source feeds both the column and table collections
+def test_run_ingestion(tmp_path, monkeypatch):
+    import json
+    from types import SimpleNamespace
+    from scripts import ingest
+    from scripts.context_builders import BUILDERS
+
+    column = {
+        "column_type": "string",
+        "description": "Order number",
+        "examples": ["PO0003954"],
+        "number_of_rows": 10,
+        "null_rows": 0,
+        "distinct_rows": 10,
+    }
+    source = tmp_path / "source"
+    source.mkdir()
+    for table in ["po_order", "po_receipt"]:
+        datadict = {
+            "catalog": "group_iii",
+            "schema": "silver",
+            "table": table,
+            "description": f"{table} table",
+            "table_analysis": [],
+            "columns": [
+                {**column, "column_name": "OrderNbr"},
+                {**column, "column_name": "Vendor"},
+            ],
+        }
+        (source / f"{table}.json").write_text(json.dumps(datadict))
+
+    milvus_client = FakeSyncMilvusClient()
+    openai_client = SimpleNamespace(
+        embeddings=SimpleNamespace(
+            create=lambda input, model: SimpleNamespace(
+                data=[SimpleNamespace(embedding=[1.0, 0.0]) for _ in input]
+            )
+        ),
+        with_options=lambda **kwargs: openai_client,
+    )
+    monkeypatch.setattr(ingest, "MilvusClient", lambda uri: milvus_client)
+    monkeypatch.setattr(ingest, "OpenAI", lambda api_key: openai_client)
+
+    args = ingest.build_parser("test").parse_args(
+        [
+            "--source=local",
+            f"--local-dir={source}",
+            f"--manifest-dir={tmp_path / 'manifests'}",
+            "--embedding-store=",
+            "--smoke-test-query=",
+            "--chunk-size=3",
+        ]
+    )
+    ingest.run_ingestion(args, [builder() for builder in BUILDERS.values()])
+
+    assert len(milvus_client.collections["data_dictionary_columns"]) == 4
+    assert len(milvus_client.collections["data_dictionary_tables"]) == 2
+    assert {
+        row["table_name"]
+        for row in milvus_client.collections["data_dictionary_columns"].values()
+    } == {"group_iii.silver.po_order", "group_iii.silver.po_receipt"}
+    assert {
+        row["tenant"]
+        for row in milvus_client.collections["data_dictionary_tables"].values()
+    } == {"group_iii"}
+    assert milvus_client.calls.count(("create_index", "data_dictionary_tables")) == 1
+
+    # a full run rewrites the tenant in place and then drops its stale rows
+    tables = milvus_client.collections["data_dictionary_tables"]
+    tables[1] = {"id": 1, "tenant": "group_iii"}
+    tables[2] = {"id": 2, "tenant": "another_tenant"}
+    (source / "po_receipt.json").unlink()
+    ingest.run_ingestion(args, [builder() for builder in BUILDERS.values()])
+
+    assert len(milvus_client.collections["data_dictionary_columns"]) == 2
+    assert sorted(row["tenant"] for row in tables.values()) == [
+        "another_tenant",
+        "group_iii",
+    ]
+    assert milvus_client.calls.count(("create_index", "data_dictionary_tables")) == 1
+
+
+# test full runs can be written as NumPy shards loaded by a Milvus bulk import
+def test_bulk_import(tmp_path, monkeypatch):
+    import httpx
+    import json
+    import numpy as np
+    from types import SimpleNamespace
+    from scripts import ingest
+    from scripts.bulk_import import BulkImporter, ShardWriter, insert_chunked
+    from scripts.context_builders import TableContextBuilder
+    from src.config.vector_profiles import DEFAULT_PROFILE, VECTOR_PROFILES
+
+    writer = ShardWriter(str(tmp_path / "shards"), shard_size=2)
+    rows = [
+        {"id": i, "embeddings": [float(i), 0.0], "text": f"row {i}"} for i in range(3)
+    ]
+    writer.add(rows[:1])
+    writer.add(rows[1:])
+    # the vectors of a shard are buffered in one preallocated float32 block
+    assert writer.columns["embeddings"].shape == (2, 2)
+    shards = writer.close()
+    assert shards == [
+        ["shard-00000/id.npy", "shard-00000/embeddings.npy", "shard-00000/text.npy"],
+        ["shard-00001/id.npy", "shard-00001/embeddings.npy", "shard-00001/text.npy"],
+    ]
+    vectors = np.load(tmp_path / "shards" / "shard-00000" / "embeddings.npy")
+    assert vectors.dtype == np.float32 and vectors.shape == (2, 2)
+    assert np.load(tmp_path / "shards" / "shard-00001" / "text.npy").tolist() == [
+        "row 2"
+    ]
+    assert np.load(tmp_path / "shards" / "shard-00001" / "embeddings.npy").tolist() == [
+        [2.0, 0.0]
+    ]
+
+    requests = []
+
+    def handler(request):
+        requests.append((request.url.path, json.loads(request.content)))
+        if request.url.path.endswith("/create"):
+            return httpx.Response(200, json={"code": 0, "data": {"jobId": "1"}})
+        state = "Importing" if len(requests) == 2 else "Completed"
+        return httpx.Response(200, json={"code": 0, "data": {"state": state}})
+
+    importer = BulkImporter(
+        "http://milvus",
+        remote_prefix="imports/run",
+        poll_s=0,
+        http_client=httpx.Client(
+            base_url="http://milvus", transport=httpx.MockTransport(handler)
+        ),
+    )
+    importer.run("tables", shards[:1])
+    assert requests[0] == (
+        "/v2/vectordb/jobs/import/create",
+        {
+            "collectionName": "tables",
+            "files": [[f"imports/run/{path}" for path in shards[0]]],
+        },
+    )
+    assert len(requests) == 3
+
+    # the chunked insert fallback sends bounded requests
+    batches = []
+    client = SimpleNamespace(insert=lambda collection_name, data: batches.append(data))
+    insert_chunked(client, "tables", [{"id": i} for i in range(5)], batch_size=2)
+    assert sorted(len(batch) for batch in batches) == [1, 2, 2]
+
+    # a bulk run writes no rows through inserts, the import loads its shards
+    imported = []
+
+    class FakeImporter:
+        def __init__(self, uri, remote_prefix, timeout_s):
+            self.directory = tmp_path / "bulk" / remote_prefix
+
+        def run(self, collection_name, shards):
+            for shard in shards:
+                columns = [np.load(self.directory / path) for path in shard]
+                imported.extend(zip(*columns))
+
+    (tmp_path / "source").mkdir()
+    (tmp_path / "source" / "po_order.json").write_text(
+        json.dumps(
+            {
+                "catalog": "group_iii",
+                "schema": "silver",
+                "table": "po_order",
+                "description": "po_order table",
+                "table_analysis": [],
+                "columns": [],
+            }
+        )
+    )
+    milvus_client = FakeSyncMilvusClient()
+    openai_client = SimpleNamespace(
+        embeddings=SimpleNamespace(
+            create=lambda input, model: SimpleNamespace(
+                data=[SimpleNamespace(embedding=[1.0, 0.0]) for _ in input]
+            )
+        ),
+        with_options=lambda **kwargs: openai_client,
+    )
+    monkeypatch.setattr(ingest, "MilvusClient", lambda uri: milvus_client)
+    monkeypatch.setattr(ingest, "OpenAI", lambda api_key: openai_client)
+    monkeypatch.setattr(ingest, "BulkImporter", FakeImporter)
+
+    args = ingest.build_parser("test").parse_args(
+        [
+            "--source=local",
+            f"--local-dir={tmp_path / 'source'}",
+            f"--manifest-dir={tmp_path / 'manifests'}",
+            f"--bulk-dir={tmp_path / 'bulk'}",
+            "--write-mode=bulk",
+            "--embedding-store=",
+            "--smoke-test-query=",
+        ]
+    )
+    ingest.run_ingestion(args, [TableContextBuilder(VECTOR_PROFILES[DEFAULT_PROFILE])])
+
+    assert milvus_client.collections["data_dictionary_tables"] == {}
+    assert len(imported) == 1
+    assert not list((tmp_path / "bulk").rglob("*.npy"))
+
+
+# test literal identifiers are answered from the identifier index
+def test_identifier_index():
+    from src.services.identifier_index import IdentifierIndex
+
+    index = IdentifierIndex()
+    index.build(
+        [
+            {
+                "id": 1,
+                "text": "\n  name: OrderNbr\n  type: string\n"
+                "  from table: group_iii.silver.po_order\n",
+            },
+            {
+                "id": 2,
+                "text": "\n  name: OrderNbrLine\n  type: string\n"
+                "  from table: group_iii.silver.po_order\n",
+            },
+            {
+                "id": 3,
+                "text": "table name:group_iii.silver.po_order\ntable description: x",
+            },
+        ]
+    )
+    assert [hit["id"] for hit in index.lookup("ordernbr", 1)] == [1]
+    assert [hit["id"] for hit in index.lookup("OrderNbr", 5)] == [1, 2]
+    assert index.lookup("OrderNbr", 5)[0]["distance"] == 1.0
+    assert [hit["id"] for hit in index.lookup("group_iii.silver.po_order", 1)] == [3]
+    assert index.lookup("purchase order number", 5) == []
+
+    index.build([{"id": 4, "text": "\n  name: Vendor\n", "tenant": "group_iii"}])
+    assert [hit["id"] for hit in index.lookup("vendor", 5, tenant="group_iii")] == [4]
+    assert index.lookup("vendor", 5, tenant="other_tenant") == []
+
+
+# test the per-stage latencies and token counts are exposed to Prometheus
+def test_metrics(monkeypatch):
+    from types import SimpleNamespace
+    from src.startup import startup_manager
+
+    class FakeEmbeddingsWithUsage(FakeEmbeddings):
+        async def create(self, input, model, **kwargs):
+            response = await super().create(input, model, **kwargs)
+            response.usage = SimpleNamespace(total_tokens=7)
+            return response
+
+    monkeypatch.setattr(startup_manager, "milvus_client", FakeMilvusClient())
+    monkeypatch.setattr(startup_manager, "milvus_collection", "test_metrics")
+    monkeypatch.setattr(
+        startup_manager,
+        "openai_client",
+        SimpleNamespace(embeddings=FakeEmbeddingsWithUsage()),
+    )
+
+    response = client.post(
+        "/api/v1/vectordb/search_doc",
+        json={"query": "metrics test query", "tenant": "group_iii"},
+    )
+    assert response.status_code == 200
+
+    response = client.get("/metrics")
+    assert response.status_code == 200
+    for stage in ["embedding", "milvus_search", "milvus_stats", "serialization"]:
+        assert (
+            f'vectordb_stage_duration_seconds_count{{stage="{stage}"}}' in response.text
+        )
+    assert "vectordb_openai_embedding_tokens_total" in response.text
+    assert (
+        'vectordb_http_request_duration_seconds_count{method="POST",'
+        'path="/api/v1/vectordb/search_doc",status="200"}' in response.text
+    )
+
+
+# test several collections are searched with one embedding and merged by distance
+def test_search_collections(monkeypatch):
+    from types import SimpleNamespace
+    from src.config.settings import settings
+    from src.startup import startup_manager
+
+    class FakeCollectionsMilvusClient(FakeMilvusClient):
+        async def search(self, collection_name, data, limit, **kwargs):
+            self.searches.append(collection_name)
+            offset = {"columns": 0.1, "tables": 0.5}[collection_name]
+            return [
+                [
+                    {"id": i, "distance": offset + i / 10, "entity": {"text": "t"}}
+                    for i in range(limit)
+                ]
+            ]
+
+    milvus_client = FakeCollectionsMilvusClient()
+    embeddings = FakeEmbeddings()
+    monkeypatch.setattr(startup_manager, "milvus_client", milvus_client)
+    monkeypatch.setattr(
+        startup_manager, "openai_client", SimpleNamespace(embeddings=embeddings)
+    )
+    monkeypatch.setattr(settings, "SEARCH_COLLECTIONS", ["columns", "tables"])
+
+    response = client.post(
+        "/api/v1/vectordb/search_doc",
+        json={
+            "query": "fan-out query",
+            "tenant": "group_iii",
+            "top_k": 3,
+            "collections": ["columns", "tables"],
+        },
+    )
+    assert response.status_code == 200
+    hits = response.json()["responses"]
+    assert [(hit["collection"], hit["id"]) for hit in hits] == [
+        ("tables", 2),
+        ("tables", 1),
+        ("tables", 0),
+    ]
+    assert sorted(milvus_client.searches) == ["columns", "tables"]
+    assert embeddings.calls == [["fan-out query"]]
+
+    # other collections of the cluster are rejected before any Milvus call
+    response = client.post(
+        "/api/v1/vectordb/search_doc",
+        json={"query": "fan-out query", "tenant": "group_iii", "collections": ["typo"]},
+    )
+    assert response.status_code == 422
+    assert len(milvus_client.searches) == 2
+
+
+# test the hierarchical mode restricts the column search to the best tables
+def test_search_hierarchical(monkeypatch):
+    from types import SimpleNamespace
+    from src.startup import startup_manager
+
+    class FakeHierarchyMilvusClient(FakeMilvusClient):
+        async def search(self, collection_name, data, limit, filter="", **kwargs):
+            self.searches.append((collection_name, filter))
+            if collection_name == "data_dictionary_tables":
+                # the table names are read from the field, not from the text
+                assert kwargs["output_fields"] == ["table_name"]
+                entities = [
+                    {"table_name": "g.s.po_order"},
+                    {"table_name": "g.s.po_receipt"},
+                ]
+            else:
+                entities = [{"text": "name: OrderNbr\n"}]
+            return [
+                [
+                    {"id": i, "distance": 0.9, "entity": entity}
+                    for i, entity in enumerate(entities)
+                ]
+            ]
+
+    milvus_client = FakeHierarchyMilvusClient()
+    embeddings = FakeEmbeddings()
+    monkeypatch.setattr(startup_manager, "milvus_client", milvus_client)
+    monkeypatch.setattr(startup_manager, "milvus_collection", "data_dictionary_columns")
+    monkeypatch.setattr(
+        startup_manager, "openai_client", SimpleNamespace(embeddings=embeddings)
+    )
+
+    response = client.post(
+        "/api/v1/vectordb/search_doc",
+        json={
+            "query": "the order number of a purchase",
+            "tenant": "group_iii",
+            "mode": "hierarchical",
+        },
+    )
+    assert response.status_code == 200
+    assert response.json()["responses"][0]["entity"]["text"] == "name: OrderNbr\n"
+    assert milvus_client.searches == [
+        ("data_dictionary_tables", 'tenant == "group_iii"'),
+        (
+            "data_dictionary_columns",
+            'tenant == "group_iii" and '
+            'table_name in ["g.s.po_order", "g.s.po_receipt"]',
+        ),
+    ]
+    assert len(embeddings.calls) == 1
+
+
+# test the vector profiles reduce, encode and rerank the embeddings
+def test_vector_profiles(monkeypatch):
+    import numpy as np
+    from types import SimpleNamespace
+    from src.config.vector_profiles import VECTOR_PROFILES
+    from src.startup import startup_manager
+
+    embedding = np.linspace(-1, 1, 1536)
+    reduced = VECTOR_PROFILES["sq8_512_rerank"].reduce(embedding)
+    assert reduced.shape == (512,)
+    assert np.isclose(np.linalg.norm(reduced), 1.0)
+    assert VECTOR_PROFILES["float16_512"].encode(embedding).dtype == np.float16
+    assert len(VECTOR_PROFILES["binary_1536"].encode(embedding)) == 1536 // 8
+
+    class FakeProfileMilvusClient(FakeMilvusClient):
+        async def describe_collection(self, collection_name):
+            return {"properties": {"vector_profile": "sq8_512_rerank"}}
+
+        async def search(self, collection_name, data, limit, output_fields, **kwargs):
+            self.searches.append((limit, output_fields))
+            # the approximate ranking puts the worst candidate first
+            vectors = [[0.0, 1.0], [1.0, 1.0], [1.0, 0.9]]
+            return [
+                [
+                    {
+                        "id": i,
+                        "distance": 1.0 - i / 10,
+                        "entity": {"text": f"hit {i}", "embeddings": vector},
+                    }
+                    for i, vector in enumerate(vectors)
+                ]
+            ]
+
+    milvus_client = FakeProfileMilvusClient()
+    monkeypatch.setattr(startup_manager, "milvus_client", milvus_client)
+    monkeypatch.setattr(startup_manager, "milvus_collection", "test_vector_profiles")
+    monkeypatch.setattr(
+        startup_manager, "openai_client", SimpleNamespace(embeddings=FakeEmbeddings())
+    )
+
+    # FakeEmbeddings embeds "x" as [1.0, 1.0]
+    response = client.post(
+        "/api/v1/vectordb/search_doc",
+        json={"query": "x", "tenant": "group_iii", "top_k": 2},
+    )
+    assert response.status_code == 200
+    assert [hit["id"] for hit in response.json()["responses"]] == [1, 2]
+    assert milvus_client.searches == [(8, ["text", "embeddings"])]
+
+
+def test_tune_index(tmp_path, monkeypatch):
+    import numpy as np
+    from scripts.tune_index import exact_top_k, recall_at_k, recommend
+    from src.config import vector_profiles
+    from src.config.vector_profiles import VectorProfile, load_vector_profile
+
+    corpus = np.array([[1.0, 0.0], [0.0, 1.0], [1.0, 1.0], [-1.0, 0.0]])
+    queries = np.array([[1.0, 0.1], [0.0, 2.0]])
+    assert exact_top_k(corpus, queries, 2).tolist() == [[0, 2], [1, 2]]
+    assert recall_at_k([[0, 3], [1, 2]], [{0, 2}, {1, 2}]) == 0.75
+
+    rows = [
+        {"profile": "fast", "recall": 0.90, "p50_ms": 1.0},
+        {"profile": "good", "recall": 0.96, "p50_ms": 3.0},
+        {"profile": "best", "recall": 0.99, "p50_ms": 5.0},
+    ]
+    assert recommend(rows, 0.95)["profile"] == "good"
+    assert recommend(rows, 0.999)["profile"] == "best"
+
+    # the tuned search params apply to the collections indexed the same way
+    path = tmp_path / "search_profile.json"
+    path.write_text(
+        VectorProfile(name="tuned", search_params={"nprobe": 32}).model_dump_json()
+    )
+    monkeypatch.setattr(
+        vector_profiles, "VECTOR_PROFILES", dict(vector_profiles.VECTOR_PROFILES)
+    )
+    monkeypatch.setattr(
+        vector_profiles, "search_profile", load_vector_profile(str(path))
+    )
+    assert vector_profiles.get_vector_profile(None).search_params_for() == {
+        "metric_type": "COSINE",
+        "params": {"nprobe": 32},
+    }
+    assert vector_profiles.get_vector_profile(None).search_params_for(4)["params"] == {
+        "nprobe": 4
+    }
+    assert vector_profiles.get_vector_profile("tuned").search_params == {"nprobe": 32}
+    assert vector_profiles.get_vector_profile("float16_512").search_params == {
+        "nprobe": 10
+    }
+    assert load_vector_profile(str(tmp_path / "missing.json")) is None
+
+
+# test the Milvus client pool spreads concurrent calls over its clients
+def test_milvus_client_pool():
+    import asyncio
+    from src.services.client_pool import MilvusClientPool
+
+    class SlowClient:
+        uri = "http://milvus"
+
+        def __init__(self):
+            self.calls = 0
+
+        async def search(self, collection_name, **kwargs):
+            self.calls += 1
+            await asyncio.sleep(0.01)
+            return collection_name
+
+        async def close(self):
+            pass
+
+    clients = [SlowClient() for _ in range(3)]
+    pool = MilvusClientPool(clients)
+    assert asyncio.run(pool.search("columns")) == "columns"
+    assert pool.uri == "http://milvus"
+
+    async def run(pool, n):
+        await asyncio.gather(*(pool.search("columns") for _ in range(n)))
+
+    asyncio.run(run(pool, 5))
+    assert [client.calls for client in clients] == [2, 2, 2]
+
+    least_busy = MilvusClientPool([SlowClient() for _ in range(3)], "least_busy")
+    asyncio.run(run(least_busy, 3))
+    assert least_busy.stats() == {
+        "size": 3,
+        "strategy": "least_busy",
+        "in_flight": [0, 0, 0],
+        "calls": [1, 1, 1],
+    }
+    with pytest.raises(ValueError):
+        MilvusClientPool(clients, "random")
+
+
+# test /readiness reports the live connections of the OpenAI pool
+def test_openai_pool_stats():
+    import asyncio
+    import httpx
+    from src.startup import StartupManager
+
+    async def handle(reader, writer):
+        while await reader.readuntil(b"\r\n\r\n"):
+            writer.write(b"HTTP/1.1 200 OK\r\nContent-Length: 2\r\n\r\n{}")
+            await writer.drain()
+
+    async def run():
+        server = await asyncio.start_server(handle, "127.0.0.1", 0)
+        port = server.sockets[0].getsockname()[1]
+        manager = StartupManager()
+        manager.openai_transport = httpx.AsyncHTTPTransport(
+            limits=manager.openai_limits()
+        )
+        before = manager.pool_stats()["openai"]
+        async with httpx.AsyncClient(transport=manager.openai_transport) as client:
+            await client.get(f"http://127.0.0.1:{port}/")
+            after = manager.pool_stats()["openai"]
+        server.close()
+        return before, after
+
+    before, after = asyncio.run(run())
+    assert before["connections"] == 0
+    assert after["connections"] == after["idle_connections"] == 1
+    assert after["active_connections"] == after["queued_requests"] == 0
+
+
+# test readiness waits for the warm-up, which replays the saved queries
+def test_warmup(tmp_path, monkeypatch):
+    import json
+    import time
+    from functools import partial
+    from benchmarks.fakes import FakeAsyncMilvusClient, FakeAsyncOpenAI
+    from src import startup
+    from src.config.settings import settings
+    from src.services import vectordb_service, warmup
+    from src.services.openai_service import embedding_cache
+
+    monkeypatch.setattr(
+        startup,
+        "AsyncMilvusClient",
+        partial(FakeAsyncMilvusClient, num_entities=50, dim=8, latency_ms=1),
+    )
+    monkeypatch.setattr(startup, "AsyncOpenAI", partial(FakeAsyncOpenAI, dim=8))
+    monkeypatch.setattr(settings, "MILVUS_CLIENT_COLLECTION", "data_dictionary_columns")
+    monkeypatch.setattr(settings, "MILVUS_POOL_SIZE", 2)
+    monkeypatch.setattr(settings, "IDENTIFIER_INDEX_ENABLED", False)
+    warmup.query_log.counts.clear()
+    queries_path = tmp_path / "queries.jsonl"
+    queries_path.write_text(
+        json.dumps({"tenant": "group_iii", "query": "vendor name"}) + "\nnot json\n"
+    )
+    traffic_path = tmp_path / "traffic.jsonl"
+    monkeypatch.setattr(settings, "WARMUP_QUERIES_PATH", str(queries_path))
+    monkeypatch.setattr(settings, "WARMUP_TRAFFIC_PATH", str(traffic_path))
+    monkeypatch.setattr(startup.startup_manager, "warmup_complete", False)
+    vectordb_service.search_cache.clear()
+
+    with TestClient(app) as app_client:
+        for _ in range(100):
+            response = app_client.get("/readiness")
+            if response.status_code != 503:
+                break
+            assert response.json()["status"] == "warming_up"
+            time.sleep(0.01)
+        assert response.status_code == 200
+        assert response.json()["pools"]["milvus"]["size"] == 2
+        assert len(vectordb_service.search_cache) == 1
+
+        app_client.post(
+            "/api/v1/vectordb/search_doc",
+            json={"query": "order number", "tenant": "group_iii"},
+        )
+    assert warmup.read_queries(str(traffic_path)) == [
+        {"tenant": "group_iii", "query": "order number"}
+    ]
+    embedding_cache.clear()
+
+
+# test a hung warm-up gives up after its timeout and the instance reports ready
+def test_warmup_timeout(monkeypatch):
+    import asyncio
+    from src.config.settings import settings
+    from src.services import warmup
+    from src.startup import startup_manager
+
+    async def hang():
+        await asyncio.sleep(3600)
+
+    monkeypatch.setattr(warmup, "_load_collections", hang)
+    monkeypatch.setattr(settings, "WARMUP_TIMEOUT_S", 0.05)
+    monkeypatch.setattr(startup_manager, "warmup_complete", False)
+    asyncio.run(asyncio.wait_for(startup_manager._warm_up(warmup.warm_up), 5))
+    assert startup_manager.warmup_complete
+
+
+# test searches are answered by the local snapshot with the same hits as Milvus
+def test_snapshot(tmp_path, monkeypatch):
+    import asyncio
+    import numpy as np
+    from benchmarks.fakes import FakeAsyncMilvusClient
+    from src.config.settings import settings
+    from src.services import vectordb_service
+    from src.config.vector_profiles import DEFAULT_PROFILE, VECTOR_PROFILES
+    from src.services.snapshot import CollectionSnapshot, parse_filter, snapshots
+    from src.startup import startup_manager
+
+    assert parse_filter('tenant == "a"') == ("a", None)
+    assert parse_filter('tenant == "a" and table_name in ["t1", "t2"]') == (
+        "a",
+        ["t1", "t2"],
+    )
+    assert parse_filter('tenant == "a" or id > 3') is None
+
+    class CountingMilvusClient(FakeAsyncMilvusClient):
+        searches = 0
+
+        async def search(self, *args, **kwargs):
+            self.searches += 1
+            return await super().search(*args, **kwargs)
+
+    milvus_client = CountingMilvusClient(
+        collection_name="test_snapshot", num_entities=50, dim=8, latency_ms=0
+    )
+    monkeypatch.setattr(startup_manager, "milvus_client", milvus_client)
+    monkeypatch.setattr(startup_manager, "milvus_collection", "test_snapshot")
+    monkeypatch.setattr(settings, "SNAPSHOT_ENABLED", True)
+    monkeypatch.setattr(settings, "SNAPSHOT_DIR", str(tmp_path))
+    monkeypatch.setattr(settings, "SEARCH_CACHE_VERSION_CHECK_S", 0)
+    # the fake returns dot products, equal to the cosine for a unit query
+    query_vector = np.linspace(-1, 1, 8)
+    query_vector = (query_vector / np.linalg.norm(query_vector)).tolist()
+
+    async def search(tenant):
+        return await vectordb_service.search_doc(
+            query="q",
+            top_k=5,
+            nprobe=None,
+            query_vector=query_vector,
+            filter=vectordb_service.tenant_filter(tenant),
+        )
+
+    expected = asyncio.run(search("group_iii"))
+    asyncio.run(vectordb_service.refresh_snapshots())
+    assert len(snapshots["test_snapshot"]) == 50
+    hits = asyncio.run(search("group_iii"))
+    assert [hit["id"] for hit in hits] == [hit["id"] for hit in expected]
+    assert np.allclose(
+        [hit["distance"] for hit in hits], [hit["distance"] for hit in expected]
+    )
+    assert asyncio.run(search("other_tenant")) == []
+    assert milvus_client.searches == 1
+
+    # a changed collection is searched in Milvus until it is exported again
+    milvus_client.ids = milvus_client.ids[:40]
+    asyncio.run(vectordb_service.get_collection_version("test_snapshot"))
+    assert "test_snapshot" not in snapshots
+    asyncio.run(vectordb_service.refresh_snapshots())
+    assert len(snapshots.pop("test_snapshot")) == 40
+
+    # an export overlapping a feed is not served under the version after it
+    export_query = milvus_client.query
+
+    async def query_during_feed(**kwargs):
+        milvus_client.ids = milvus_client.ids[:30]
+        return await export_query(**kwargs)
+
+    milvus_client.query = query_during_feed
+    milvus_client.ids = milvus_client.ids[:35]
+    asyncio.run(vectordb_service.refresh_snapshots())
+    assert "test_snapshot" not in snapshots
+    del milvus_client.query
+
+    # the refresh loop outlives a failed pass
+    monkeypatch.setattr(settings, "SNAPSHOT_REFRESH_S", 0)
+    list_collections = milvus_client.list_collections
+    calls = []
+
+    async def flaky_list_collections(**kwargs):
+        calls.append(1)
+        if len(calls) == 1:
+            raise ConnectionError("milvus is down")
+        return await list_collections(**kwargs)
+
+    milvus_client.list_collections = flaky_list_collections
+
+    async def run_loop():
+        task = asyncio.create_task(vectordb_service.snapshot_refresh_loop())
+        while "test_snapshot" not in snapshots:
+            assert not task.done()
+            await asyncio.sleep(0.01)
+        task.cancel()
+
+    asyncio.run(asyncio.wait_for(run_loop(), 5))
+    assert len(calls) >= 2 and len(snapshots.pop("test_snapshot")) == 30
+    del milvus_client.list_collections
+
+    # pages of several tenants are exported grouped by tenant
+    profile = VECTOR_PROFILES[DEFAULT_PROFILE]
+    pages = [
+        [
+            {"id": i, "embeddings": [i + 1.0, 0.0], "tenant": tenant, "text": str(i)}
+            for i, tenant in rows
+        ]
+        for rows in ([(0, "b"), (1, "a")], [(2, "b"), (3, "a")])
+    ]
+    snapshot = CollectionSnapshot.write(tmp_path / "pages", pages, (4, 1), profile)
+    assert snapshot.ids.tolist() == [1, 3, 0, 2]
+    assert np.allclose(snapshot.vectors, [[1.0, 0.0]] * 4)
+    assert [
+        hit["id"] for hit in snapshot.search([[1.0, 0.0]], 5, 'tenant == "a"')[0]
+    ] == [1, 3]
+    hits = snapshot.search([[1.0, 0.0]], 1, 'tenant == "a"', ["table_name", "text"])
+    assert hits[0][0]["entity"] == {"table_name": "", "text": "1"}
+    assert not (tmp_path / "pages" / "vectors.bin.tmp").exists()
+
+
+# test slow calls are hedged and a failing upstream trips the circuit breaker
+def test_upstream_resilience(monkeypatch):
+    import asyncio
+    import grpc
+    from pymilvus.exceptions import ErrorCode, MilvusException
+    from src.services.resilience import CircuitOpenError, Upstream, is_transient_error
+
+    upstream = Upstream("test", hedge_min_delay_ms=5, failure_threshold=2)
+    upstream.latencies.extend([0.001] * 20)
+    delays = [1.0, 0.0]
+    started = []
+
+    async def request():
+        started.append(delay := delays.pop(0))
+        await asyncio.sleep(delay)
+        return delay
+
+    # the first call hangs, its hedge answers after the 5ms floor
+    assert asyncio.run(upstream.call(request)) == 0.0
+    assert (upstream.hedged, upstream.hedge_wins) == (1, 1)
+
+    async def failing():
+        raise ConnectionError("down")
+
+    for _ in range(2):
+        with pytest.raises(ConnectionError):
+            asyncio.run(upstream.call(failing, hedge=False))
+    assert upstream.state == "open"
+    with pytest.raises(CircuitOpenError):
+        asyncio.run(upstream.call(failing))
+
+    # after the reset timeout one trial call closes the circuit again
+    upstream.opened_at -= upstream.reset_timeout
+    delays.append(0.0)
+    assert asyncio.run(upstream.call(request, hedge=False)) == 0.0
+    assert upstream.state == "closed"
+
+    # errors of the request itself never open the circuit
+    async def missing_collection():
+        raise MilvusException(code=ErrorCode.COLLECTION_NOT_FOUND, message="typo")
+
+    for _ in range(3):
+        with pytest.raises(MilvusException):
+            asyncio.run(upstream.call(missing_collection, hedge=False))
+    assert (upstream.state, upstream.failures) == ("closed", 0)
+    assert is_transient_error(
+        MilvusException(code=grpc.StatusCode.UNAVAILABLE, message="retries ran out")
+    )
+
+
+# test searches fall back to stale results, then fail fast with a 503
+def test_search_fallback(monkeypatch):
+    from types import SimpleNamespace
+    from src.config.settings import settings
+    from src.services import vectordb_service
+    from src.services.resilience import milvus_upstream
+    from src.startup import startup_manager
+
+    class FlakyMilvusClient(FakeMilvusClient):
+        down = False
+
+        async def search(self, *args, **kwargs):
+            if self.down:
+                raise ConnectionError("query node unavailable")
+            return await super().search(*args, **kwargs)
+
+    milvus_client = FlakyMilvusClient()
+    monkeypatch.setattr(startup_manager, "milvus_client", milvus_client)
+    monkeypatch.setattr(startup_manager, "milvus_collection", "test_search_fallback")
+    monkeypatch.setattr(
+        startup_manager, "openai_client", SimpleNamespace(embeddings=FakeEmbeddings())
+    )
+    monkeypatch.setattr(vectordb_service.search_cache, "ttl", 0)
+    monkeypatch.setattr(settings, "IDENTIFIER_INDEX_ENABLED", False)
+    monkeypatch.setattr(milvus_upstream, "failure_threshold", 1)
+    monkeypatch.setattr(milvus_upstream, "failures", 0)
+    # restored closed when the test ends
+    monkeypatch.setattr(milvus_upstream, "state", "closed")
+
+    def search(query):
+        return client.post(
+            "/api/v1/vectordb/search_doc", json={"query": query, "tenant": "group_iii"}
+        )
+
+    assert search("Vendor name").status_code == 200
+    milvus_client.down = True
+    response = search("Vendor name")
+    assert response.status_code == 200
+    assert response.json()["responses"][0]["entity"]["text"] == "hit 0"
+
+    assert milvus_upstream.state == "open"
+    response = search("Vendor code")
+    assert response.status_code == 503
+    assert int(response.headers["Retry-After"]) >= 1
+
+
+# test embedding calls over the rate budget are rejected with a 429
+def test_embedding_admission(monkeypatch):
+    import asyncio
+    from types import SimpleNamespace
+    from src.services.admission import (
+        AdmissionRejected,
+        EmbeddingAdmission,
+        TokenBucket,
+        embedding_admission,
+        parse_duration,
+    )
+    from src.startup import startup_manager
+
+    assert parse_duration("6m0s") == 360
+    assert parse_duration("20ms") == 0.02
+    assert parse_duration("") is None
+
+    admission = EmbeddingAdmission(rpm=1, tpm=1000, max_wait_ms=100)
+    asyncio.run(admission.acquire(10))
+    # the next request is a minute away
+    with pytest.raises(AdmissionRejected) as rejected:
+        asyncio.run(admission.acquire(10))
+    assert rejected.value.retry_after > 50
+    assert (admission.admitted, admission.rejected) == (1, 1)
+
+    admission.observe_headers(
+        {"x-ratelimit-limit-requests": "600", "x-ratelimit-remaining-tokens": "5"}
+    )
+    assert admission.requests.limit == 600
+    assert admission.tokens.level <= 5
+    admission.observe_rate_limited({"retry-after-ms": "2000"})
+    assert admission.requests.wait_for(1) >= 2
+
+    monkeypatch.setattr(
+        startup_manager, "openai_client", SimpleNamespace(embeddings=FakeEmbeddings())
+    )
+    monkeypatch.setattr(embedding_admission, "requests", TokenBucket(1))
+    embedding_admission.requests.level = 0
+    response = client.post(
+        "/api/v1/vectordb/search_doc",
+        json={"query": "test_embedding_admission", "tenant": "group_iii"},
+    )
+    assert response.status_code == 429
+    assert int(response.headers["Retry-After"]) >= 1
+
+
+# test the raw responses of a real AsyncOpenAI client feed the admission control
+def test_embedding_admission_openai_client(monkeypatch):
+    import asyncio
+    import httpx
+    from openai import AsyncOpenAI, RateLimitError
+    from src.services import openai_service
+    from src.services.admission import EmbeddingAdmission
+    from src.services.resilience import openai_upstream
+    from src.startup import startup_manager
+
+    rate_limited = False
+
+    def handler(request):
+        if rate_limited:
+            return httpx.Response(
+                429,
+                headers={"retry-after-ms": "5000"},
+                json={"error": {"message": "Rate limit reached", "type": "requests"}},
+            )
+        return httpx.Response(
+            200,
+            headers={
+                "x-ratelimit-limit-requests": "500",
+                "x-ratelimit-remaining-tokens": "42",
+            },
+            json={
+                "object": "list",
+                "data": [{"object": "embedding", "index": 0, "embedding": [0.5, 1.0]}],
+                "model": "text-embedding-3-small",
+                "usage": {"prompt_tokens": 2, "total_tokens": 2},
+            },
+        )
+
+    openai_client = AsyncOpenAI(
+        api_key="test",
+        base_url="http://openai.test/v1",
+        max_retries=0,
+        http_client=httpx.AsyncClient(transport=httpx.MockTransport(handler)),
+    )
+    admission = EmbeddingAdmission(rpm=3000, tpm=1000000)
+    monkeypatch.setattr(startup_manager, "openai_client", openai_client)
+    monkeypatch.setattr(openai_service, "embedding_admission", admission)
+    monkeypatch.setattr(openai_upstream, "failures", 0)
+
+    embeddings = asyncio.run(openai_service._create_embeddings(["ab"], "model"))
+    assert embeddings == [[0.5, 1.0]]
+    assert admission.requests.limit == 500
+    assert admission.tokens.level <= 42
+
+    # a 429 pauses the admissions, it is not an upstream failure
+    rate_limited = True
+    with pytest.raises(RateLimitError):
+        asyncio.run(openai_service._create_embeddings(["ab"], "model"))
+    assert admission.requests.wait_for(1) >= 4
+    assert openai_upstream.failures == 0